@@ -3,14 +3,22 @@ ASGI config for app project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The Django WSGI application runs on a bounded thread pool of
+settings.ASGI_THREADS threads, see core.asgi.
+
+    gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker \
+        app.asgi:application
+
 For more information on this file, see
 https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
 """
 
 import os
 
-from django.core.asgi import get_asgi_application
+from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
 
-application = get_asgi_application()
+from core.asgi import ThreadPoolASGIHandler  # noqa: E402
+
+application = ThreadPoolASGIHandler(get_wsgi_application())
@@ -23,9 +23,12 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = 'bmb1=+lbv-sg#lgy*n2-vfc281pham@+q%fq#(9$v96f#7fl20'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.environ.get('DJANGO_DEBUG', '0') == '1'
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = [
+    host for host in os.environ.get('DJANGO_ALLOWED_HOSTS', '').split(',')
+    if host
+]
 
 
 # Application definition
@@ -46,7 +49,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -86,9 +91,92 @@ DATABASES = {
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
         'PASSWORD': os.environ.get('DB_PASS'),
+        # Persistent connections, checked with is_usable() on their first
+        # use in a request, see core.signals.check_reused_connections
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': os.environ.get('DB_CONN_HEALTH_CHECKS',
+                                             '1') == '1',
+        'OPTIONS': {
+            'connect_timeout': int(os.environ.get('DB_CONNECT_TIMEOUT', 10)),
+        },
+    }
+}
+
+# Abort statements running longer than DB_STATEMENT_TIMEOUT milliseconds,
+# 0 keeps the server default
+DB_STATEMENT_TIMEOUT = int(os.environ.get('DB_STATEMENT_TIMEOUT', 0))
+if DB_STATEMENT_TIMEOUT:
+    DATABASES['default']['OPTIONS']['options'] = \
+        f'-c statement_timeout={DB_STATEMENT_TIMEOUT}'
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.1/topics/cache/
+# Local memory by default, set CACHE_BACKEND/CACHE_LOCATION to share the
+# cache between workers (e.g. memcached)
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
     }
 }
 
+RECIPE_CACHE_ALIAS = 'default'
+RECIPE_CACHE_TIMEOUT = int(os.environ.get('RECIPE_CACHE_TIMEOUT', 300))
+# Whether a single process serves the API (WEB_CONCURRENCY is exported by
+# gunicorn.conf.py). Otherwise a local memory cache is not shared between
+# the workers, and the list cache and ETags of recipe.cache are disabled
+RECIPE_CACHE_SINGLE_PROCESS = os.environ.get('WEB_CONCURRENCY', '1') == '1'
+
+
+# Password hashing, see core.hashers
+# The first hasher of the profile hashes new passwords, passwords hashed
+# by the others (or with other costs) are rehashed on the next sign in
+
+PASSWORD_HASHER_PROFILES = {
+    # Needs argon2-cffi
+    'argon2': (
+        'core.hashers.Argon2PasswordHasher',
+        'core.hashers.BCryptSHA256PasswordHasher',
+        'core.hashers.PBKDF2PasswordHasher',
+    ),
+    # Needs bcrypt
+    'bcrypt': (
+        'core.hashers.BCryptSHA256PasswordHasher',
+        'core.hashers.Argon2PasswordHasher',
+        'core.hashers.PBKDF2PasswordHasher',
+    ),
+    'pbkdf2': (
+        'core.hashers.PBKDF2PasswordHasher',
+        'core.hashers.Argon2PasswordHasher',
+        'core.hashers.BCryptSHA256PasswordHasher',
+    ),
+}
+PASSWORD_HASHERS = PASSWORD_HASHER_PROFILES[
+    os.environ.get('PASSWORD_HASHER_PROFILE', 'argon2')
+] + ('django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',)
+
+PASSWORD_ARGON2_TIME_COST = int(os.environ.get('PASSWORD_ARGON2_TIME_COST',
+                                               2))
+# KiB
+PASSWORD_ARGON2_MEMORY_COST = int(
+    os.environ.get('PASSWORD_ARGON2_MEMORY_COST', 19456)
+)
+PASSWORD_ARGON2_PARALLELISM = int(
+    os.environ.get('PASSWORD_ARGON2_PARALLELISM', 1)
+)
+PASSWORD_BCRYPT_ROUNDS = int(os.environ.get('PASSWORD_BCRYPT_ROUNDS', 12))
+PASSWORD_PBKDF2_ITERATIONS = int(
+    os.environ.get('PASSWORD_PBKDF2_ITERATIONS', 120000)
+)
+
+# Processes hashing passwords off the request threads, 0 hashes inline
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 0))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
@@ -133,4 +221,122 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = '/vol/web/media'
 STATIC_ROOT = 'vol/web/static'
 
-AUTH_USER_MODEL = 'core.User'
\ No newline at end of file
+# Threads running views under ASGI (app.asgi), each keeps its own
+# persistent database connection
+ASGI_THREADS = int(os.environ.get('ASGI_THREADS', 8))
+
+# Recipe image variants are generated by a local worker pool, see
+# recipe.images
+RECIPE_IMAGE_ASYNC = os.environ.get('RECIPE_IMAGE_ASYNC', '1') == '1'
+RECIPE_IMAGE_WORKERS = int(os.environ.get('RECIPE_IMAGE_WORKERS', 2))
+
+# Recipe image uploads are streamed to disk in chunks, see recipe.uploads
+RECIPE_IMAGE_MAX_UPLOAD_SIZE = int(
+    os.environ.get('RECIPE_IMAGE_MAX_UPLOAD_SIZE', 10 * 1024 * 1024)
+)
+RECIPE_IMAGE_UPLOAD_CHUNK_SIZE = 64 * 1024
+FILE_UPLOAD_MAX_MEMORY_SIZE = 1024 * 1024
+FILE_UPLOAD_TEMP_DIR = os.environ.get('FILE_UPLOAD_TEMP_DIR')
+
+# Largest request body core.asgi spools before running a view, an image
+# upload plus room for the multipart framing
+ASGI_MAX_BODY_SIZE = int(os.environ.get(
+    'ASGI_MAX_BODY_SIZE', RECIPE_IMAGE_MAX_UPLOAD_SIZE + 1024 * 1024
+))
+
+# Content addressed uploads are cached for life, see core.views.serve_media
+MEDIA_CACHE_MAX_AGE = int(
+    os.environ.get('MEDIA_CACHE_MAX_AGE', 365 * 24 * 60 * 60)
+)
+
+# Request metrics of core.middleware.InstrumentationMiddleware, served in
+# the Prometheus format at /internal/metrics/
+METRICS_PATH_PREFIXES = ('/api/recipe/', '/api/user/')
+METRICS_SERVER_TIMING = os.environ.get('METRICS_SERVER_TIMING', '1') == '1'
+METRICS_ALLOWED_IPS = os.environ.get(
+    'METRICS_ALLOWED_IPS', '127.0.0.1'
+).split(',')
+# Directory where each worker writes its metrics every
+# METRICS_FLUSH_INTERVAL seconds, to be added up by whichever worker serves
+# the scrape. gunicorn.conf.py sets it, unset a process serves its own.
+METRICS_DIR = os.environ.get('METRICS_DIR') or None
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
+
+# Response compression of core.middleware.CompressionMiddleware, brotli is
+# negotiated when the brotli package is installed
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+COMPRESSION_GZIP_LEVEL = int(os.environ.get('COMPRESSION_GZIP_LEVEL', 6))
+COMPRESSION_BROTLI_QUALITY = int(
+    os.environ.get('COMPRESSION_BROTLI_QUALITY', 5)
+)
+COMPRESSION_CONTENT_TYPES = (
+    'application/json',
+    'text/html',
+    'text/plain',
+    'text/css',
+    'application/javascript',
+)
+
+AUTH_USER_MODEL = 'core.User'
+
+
+# Django REST framework
+# Lists are unpaginated unless the client opts in, see recipe.pagination
+
+REST_FRAMEWORK = {
+    'DEFAULT_PAGINATION_CLASS': 'recipe.pagination.OptInPagination',
+    'PAGE_SIZE': int(os.environ.get('API_PAGE_SIZE', 100)),
+    # orjson backed JSON when installed, stdlib json otherwise
+    'DEFAULT_RENDERER_CLASSES': (
+        'core.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'core.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
+    # Token auth only, so no default authenticator hashes passwords before
+    # the throttles run
+    'DEFAULT_AUTHENTICATION_CLASSES': (
+        'core.authentication.CachedTokenAuthentication',
+    ),
+    # Rates are named <view.throttle_scope>_<ip|email|token>, see
+    # core.throttling
+    'DEFAULT_THROTTLE_CLASSES': (
+        'core.throttling.IPRateThrottle',
+        'core.throttling.EmailRateThrottle',
+        'core.throttling.TokenRateThrottle',
+    ),
+    'DEFAULT_THROTTLE_RATES': {
+        'token_ip': os.environ.get('THROTTLE_TOKEN_IP', '30/min'),
+        'token_email': os.environ.get('THROTTLE_TOKEN_EMAIL', '10/min'),
+        'create_ip': os.environ.get('THROTTLE_CREATE_IP', '20/hour'),
+        'create_email': os.environ.get('THROTTLE_CREATE_EMAIL', '5/hour'),
+        'recipe_ip': os.environ.get('THROTTLE_RECIPE_IP', '1200/min'),
+        'recipe_token': os.environ.get('THROTTLE_RECIPE_TOKEN', '600/min'),
+    },
+    'NUM_PROXIES': int(os.environ['NUM_PROXIES'])
+    if os.environ.get('NUM_PROXIES') else None,
+}
+
+# Keys (scope and identity) held by the sliding window store of
+# core.throttling
+THROTTLE_STORE_MAX_SIZE = int(os.environ.get('THROTTLE_STORE_MAX_SIZE',
+                                             100000))
+
+API_MAX_PAGE_SIZE = int(os.environ.get('API_MAX_PAGE_SIZE', 1000))
+
+# Bulk endpoints ({prefix}/bulk/) of the recipe API
+API_MAX_BULK_SIZE = int(os.environ.get('API_MAX_BULK_SIZE', 5000))
+API_BULK_BATCH_SIZE = 500
+
+# Text search configuration of recipe.search on PostgreSQL
+RECIPE_SEARCH_CONFIG = 'english'
+
+# Number of most used tags and ingredients of the recipe stats endpoint
+RECIPE_STATS_TOP_SIZE = int(os.environ.get('RECIPE_STATS_TOP_SIZE', 5))
+
+# In-process token -> user cache of core.authentication
+TOKEN_CACHE_TTL = int(os.environ.get('TOKEN_CACHE_TTL', 60))
+TOKEN_CACHE_MAX_SIZE = int(os.environ.get('TOKEN_CACHE_MAX_SIZE', 10000))
@@ -0,0 +1,195 @@
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from tempfile import SpooledTemporaryFile
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+
+class ThreadPoolASGIHandler:
+    """
+    ASGI application running the Django WSGI application on a bounded
+    thread pool
+
+    The event loop reads the whole request body and writes the response,
+    so slow uploads and slow clients only hold a coroutine. A pool thread
+    (and with it a persistent database connection) is taken for the view
+    itself, at most settings.ASGI_THREADS at a time. Bodies larger than
+    settings.ASGI_MAX_BODY_SIZE are answered with 413, by Content-Length
+    before reading anything or as soon as the limit is crossed.
+    """
+    body_max_memory = 64 * 1024
+
+    def __init__(self, wsgi_application, max_threads=None,
+                 max_body_size=None):
+        self.wsgi_application = wsgi_application
+        self.max_body_size = max_body_size or settings.ASGI_MAX_BODY_SIZE
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_threads or settings.ASGI_THREADS,
+            thread_name_prefix='asgi',
+        )
+
+    def run_in_pool(self, func, *args):
+        return sync_to_async(
+            func, thread_sensitive=False, executor=self.executor
+        )(*args)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            raise ValueError(f'Unsupported ASGI scope {scope["type"]}')
+
+        if self.content_length(scope) > self.max_body_size:
+            await self.send_too_large(send)
+            return
+        with SpooledTemporaryFile(max_size=self.body_max_memory) as body:
+            size = 0
+            while True:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    return
+                chunk = message.get('body', b'')
+                size += len(chunk)
+                if size > self.max_body_size:
+                    await self.send_too_large(send)
+                    return
+                body.write(chunk)
+                if not message.get('more_body'):
+                    break
+            body.seek(0)
+
+            status, headers, content, response = await self.run_in_pool(
+                self.get_response, self.get_environ(scope, body)
+            )
+
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': headers,
+        })
+        if response is None:
+            await send({'type': 'http.response.body', 'body': content})
+            return
+        chunks = iter(response)
+        try:
+            while True:
+                chunk = await self.run_in_pool(next, chunks, None)
+                if chunk is None:
+                    break
+                await send({
+                    'type': 'http.response.body',
+                    'body': chunk,
+                    'more_body': True,
+                })
+        finally:
+            await self.run_in_pool(response.close)
+        await send({'type': 'http.response.body'})
+
+    def content_length(self, scope):
+        for name, value in scope.get('headers', []):
+            if name.lower() == b'content-length':
+                try:
+                    return int(value)
+                except ValueError:
+                    return 0
+        return 0
+
+    async def send_too_large(self, send):
+        body = b'{"detail":"Request body too large."}'
+        await send({
+            'type': 'http.response.start',
+            'status': 413,
+            'headers': [
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(body)).encode('latin1')),
+                (b'connection', b'close'),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                # Let running views finish
+                await sync_to_async(
+                    self.executor.shutdown, thread_sensitive=False
+                )(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def get_environ(self, scope, body):
+        """
+        Build the WSGI environ of an ASGI http scope
+        :param scope:
+        :param body: file with the request body
+        :return:
+        """
+        server = scope.get('server') or ('localhost', 80)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '')
+            .encode('utf8').decode('latin1'),
+            'PATH_INFO': scope['path'].encode('utf8').decode('latin1'),
+            'QUERY_STRING': scope['query_string'].decode('ascii'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': f'HTTP/{scope["http_version"]}',
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': body,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+        if scope.get('client'):
+            environ['REMOTE_ADDR'] = scope['client'][0]
+        for name, value in scope.get('headers', []):
+            name = name.decode('latin1')
+            if name == 'content-length':
+                key = 'CONTENT_LENGTH'
+            elif name == 'content-type':
+                key = 'CONTENT_TYPE'
+            else:
+                key = 'HTTP_' + name.upper().replace('-', '_')
+            value = value.decode('latin1')
+            if key in environ:
+                value = environ[key] + ',' + value
+            environ[key] = value
+        return environ
+
+    def get_response(self, environ):
+        """
+        Run the WSGI application in a pool thread
+
+        Regular responses are read and closed in the thread that handled
+        the request, streaming ones are returned to be read chunk by chunk.
+        :param environ:
+        :return: (status, headers, content, streaming response)
+        """
+        start = {}
+
+        def start_response(status, response_headers, exc_info=None):
+            start['status'] = int(status.split(' ', 1)[0])
+            start['headers'] = [
+                (name.lower().encode('latin1'), value.encode('latin1'))
+                for name, value in response_headers
+            ]
+
+        result = self.wsgi_application(environ, start_response)
+        if getattr(result, 'streaming', False):
+            return start['status'], start['headers'], None, result
+        try:
+            content = BytesIO()
+            for chunk in result:
+                content.write(chunk)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return start['status'], start['headers'], content.getvalue(), None
@@ -0,0 +1,106 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework.authentication import TokenAuthentication
+
+
+class TokenCache:
+    """
+    Thread safe in-process LRU cache of token key -> (user, token) with a TTL
+    """
+
+    def __init__(self, ttl, max_size):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Return the cached (user, token) of key or None
+        :param key:
+        :return:
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            user, token, expires = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        # Hand out a copy so requests never share a mutable user instance
+        return copy.copy(user), token
+
+    def set(self, key, user, token):
+        """
+        Cache the resolution of key, evicting the least recently used
+        entries beyond max_size
+        :param key:
+        :param user:
+        :param token:
+        :return:
+        """
+        with self._lock:
+            self._entries[key] = (
+                copy.copy(user), token, time.monotonic() + self.ttl
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def evict(self, key):
+        """
+        Remove key from the cache
+        :param key:
+        :return:
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def evict_user(self, user_id):
+        """
+        Remove every cached token of the user
+        :param user_id:
+        :return:
+        """
+        with self._lock:
+            keys = [
+                key for key, (user, _, _) in self._entries.items()
+                if user.pk == user_id
+            ]
+            for key in keys:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+token_cache = TokenCache(
+    ttl=settings.TOKEN_CACHE_TTL,
+    max_size=settings.TOKEN_CACHE_MAX_SIZE,
+)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication resolving token keys through the in-process
+    token_cache before hitting the database
+    """
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is not None:
+            return cached
+
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, user, token)
+        return user, token
@@ -0,0 +1,135 @@
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+_pool = None
+_pool_lock = threading.Lock()
+_in_worker = False
+
+
+def _init_worker():
+    """
+    Set up a hashing process, which must hash inline
+    :return:
+    """
+    global _in_worker
+    _in_worker = True
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+
+def _hash_in_worker(hasher_class, method, args):
+    hasher = hasher_class()
+    return getattr(super(OffloadedHasherMixin, hasher), method)(*args)
+
+
+def get_pool():
+    """
+    Return the process pool of settings.PASSWORD_HASH_WORKERS processes,
+    or None to hash on the calling thread
+    :return:
+    """
+    global _pool
+    if _in_worker or not settings.PASSWORD_HASH_WORKERS:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.PASSWORD_HASH_WORKERS,
+                initializer=_init_worker,
+            )
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
+
+
+def discard_pool(pool):
+    """
+    Drop a pool whose process died, the next get_pool() starts a new one
+    :param pool:
+    :return:
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+
+class OffloadedHasherMixin:
+    """
+    Run encode() and verify() in the hashing process pool when one is
+    configured
+
+    The request thread only waits on the result, so a burst of sign ins
+    uses at most PASSWORD_HASH_WORKERS cores and leaves the GIL to the
+    other requests.
+    """
+    def _offload(self, method, *args):
+        pool = get_pool()
+        if pool is None:
+            return getattr(super(), method)(*args)
+        try:
+            return pool.submit(_hash_in_worker, type(self), method, args) \
+                .result()
+        except BrokenProcessPool:
+            # A hashing process was killed (e.g. out of memory), which
+            # breaks the whole pool: replace it and hash this one inline
+            discard_pool(pool)
+            return getattr(super(), method)(*args)
+
+    def encode(self, password, salt, *args):
+        return self._offload('encode', password, salt, *args)
+
+    def verify(self, password, encoded):
+        return self._offload('verify', password, encoded)
+
+
+class Argon2PasswordHasher(OffloadedHasherMixin,
+                           hashers.Argon2PasswordHasher):
+    """
+    Argon2 with the costs of settings.PASSWORD_ARGON2_*, hashes made with
+    other costs are upgraded on the next successful sign in
+    """
+    @property
+    def time_cost(self):
+        return settings.PASSWORD_ARGON2_TIME_COST
+
+    @property
+    def memory_cost(self):
+        return settings.PASSWORD_ARGON2_MEMORY_COST
+
+    @property
+    def parallelism(self):
+        return settings.PASSWORD_ARGON2_PARALLELISM
+
+
+class BCryptSHA256PasswordHasher(OffloadedHasherMixin,
+                                 hashers.BCryptSHA256PasswordHasher):
+    """
+    bcrypt with settings.PASSWORD_BCRYPT_ROUNDS rounds
+    """
+    @property
+    def rounds(self):
+        return settings.PASSWORD_BCRYPT_ROUNDS
+
+
+class PBKDF2PasswordHasher(OffloadedHasherMixin,
+                           hashers.PBKDF2PasswordHasher):
+    """
+    PBKDF2-SHA256 with settings.PASSWORD_PBKDF2_ITERATIONS iterations
+    """
+    @property
+    def iterations(self):
+        return settings.PASSWORD_PBKDF2_ITERATIONS
@@ -0,0 +1,49 @@
+import timeit
+
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from rest_framework.renderers import JSONRenderer
+
+from core.management.commands.benchmark_json import sample_payload
+from core.middleware import brotli, compress_brotli, compress_gzip
+
+
+class Command(BaseCommand):
+    """
+    Django command reporting the bytes on the wire and compression time of
+    a recipe list response per content coding and level
+    """
+    help = 'Benchmark response compression of a recipe list'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=1000)
+        parser.add_argument('--iterations', type=int, default=50)
+
+    def run(self, label, compress, body, iterations):
+        size = len(compress(body))
+        seconds = min(timeit.repeat(
+            lambda: compress(body), number=iterations, repeat=3
+        ))
+        self.stdout.write(
+            f'{label:<16} {size:>10} bytes {size / len(body):>7.1%} '
+            f'{seconds / iterations * 1000:>8.2f} ms'
+        )
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        body = JSONRenderer().render(sample_payload(options['recipes']))
+        self.stdout.write(
+            f'{options["recipes"]} recipes, {len(body)} bytes uncompressed'
+        )
+
+        for level in (1, 6, 9):
+            with override_settings(COMPRESSION_GZIP_LEVEL=level):
+                self.run(f'gzip level {level}', compress_gzip, body,
+                         iterations)
+        if brotli is None:
+            self.stdout.write('brotli not installed')
+            return
+        for quality in (1, 5, 11):
+            with override_settings(COMPRESSION_BROTLI_QUALITY=quality):
+                self.run(f'br quality {quality}', compress_brotli, body,
+                         iterations)
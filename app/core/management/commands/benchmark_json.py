@@ -0,0 +1,78 @@
+import io
+import timeit
+from collections import OrderedDict
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from core.parsers import FastJSONParser
+from core.renderers import FastJSONRenderer, orjson
+
+
+def sample_payload(count):
+    """
+    Return a recipe list payload shaped like RecipeSerializer output
+    :param count:
+    :return:
+    """
+    return [
+        OrderedDict([
+            ('id', i),
+            ('title', f'Sample recipe {i}'),
+            ('ingredients', list(range(i % 12))),
+            ('tags', list(range(i % 5))),
+            ('time_minutes', i % 120),
+            ('price', Decimal(i % 5000) / 100),
+            ('link', f'https://example.com/recipes/{i}'),
+        ])
+        for i in range(count)
+    ]
+
+
+class Command(BaseCommand):
+    """
+    Django command comparing the throughput of the stdlib and the fast
+    JSON renderer and parser on a recipe list payload
+    """
+    help = 'Benchmark JSON rendering and parsing of a recipe list'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=1000)
+        parser.add_argument('--iterations', type=int, default=200)
+
+    def run(self, label, func, iterations):
+        seconds = min(timeit.repeat(func, number=iterations, repeat=3))
+        self.stdout.write(
+            f'{label:<30} {iterations / seconds:>10.1f} ops/s'
+        )
+        return seconds
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        data = sample_payload(options['recipes'])
+        body = JSONRenderer().render(data)
+        self.stdout.write(
+            f'{options["recipes"]} recipes, {len(body)} bytes, '
+            f'orjson {"available" if orjson else "not installed"}'
+        )
+
+        slow = self.run(
+            'JSONRenderer', lambda: JSONRenderer().render(data), iterations
+        )
+        fast = self.run(
+            'FastJSONRenderer',
+            lambda: FastJSONRenderer().render(data), iterations
+        )
+        self.stdout.write(f'render speedup {slow / fast:.1f}x')
+
+        slow = self.run(
+            'JSONParser',
+            lambda: JSONParser().parse(io.BytesIO(body)), iterations
+        )
+        fast = self.run(
+            'FastJSONParser',
+            lambda: FastJSONParser().parse(io.BytesIO(body)), iterations
+        )
+        self.stdout.write(f'parse speedup {slow / fast:.1f}x')
@@ -0,0 +1,89 @@
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from rest_framework.renderers import JSONRenderer
+
+from core import hashers
+from core.management.commands.benchmark_json import sample_payload
+
+
+class Command(BaseCommand):
+    """
+    Django command measuring sign in throughput per hasher profile, inline
+    and in the hashing process pool, together with the latency of other
+    requests served by the same process meanwhile
+    """
+    help = 'Benchmark password checks under concurrent sign ins'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', default='pbkdf2,argon2,bcrypt')
+        parser.add_argument('--workers', default='0,2',
+                            help='Comma separated PASSWORD_HASH_WORKERS')
+        parser.add_argument('--threads', type=int, default=8,
+                            help='Concurrent sign ins')
+        parser.add_argument('--duration', type=float, default=3)
+
+    def run(self, encoded, threads, duration):
+        deadline = time.monotonic() + duration
+        logins = []
+        latencies = []
+        # Small JSON responses stand in for the other requests
+        payload = sample_payload(20)
+
+        def sign_in():
+            count = 0
+            while time.monotonic() < deadline:
+                check_password('testpass', encoded)
+                count += 1
+            logins.append(count)
+
+        def other_requests():
+            while time.monotonic() < deadline:
+                start = time.monotonic()
+                JSONRenderer().render(payload)
+                latencies.append(time.monotonic() - start)
+                time.sleep(0.005)
+
+        workers = [threading.Thread(target=sign_in) for _ in range(threads)]
+        workers.append(threading.Thread(target=other_requests))
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        latencies.sort()
+        return (sum(logins) / duration,
+                latencies[len(latencies) // 2] * 1000,
+                latencies[int(len(latencies) * 0.99)] * 1000)
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f'{options["threads"]} concurrent sign ins, '
+            f'{options["duration"]:g}s per run'
+        )
+        self.stdout.write(
+            f'{"profile":<8} {"workers":>7} {"logins/s":>9} '
+            f'{"other p50":>10} {"other p99":>10}'
+        )
+        for name in options['profiles'].split(','):
+            with override_settings(
+                    PASSWORD_HASHERS=settings.PASSWORD_HASHER_PROFILES[name]):
+                try:
+                    encoded = make_password('testpass')
+                except ValueError as e:
+                    self.stdout.write(f'{name:<8} skipped: {e}')
+                    continue
+                for workers in options['workers'].split(','):
+                    with override_settings(PASSWORD_HASH_WORKERS=int(workers)):
+                        rate, p50, p99 = self.run(
+                            encoded, options['threads'], options['duration']
+                        )
+                        hashers.shutdown_pool()
+                    self.stdout.write(
+                        f'{name:<8} {workers:>7} {rate:>9.1f} '
+                        f'{p50:>8.2f}ms {p99:>8.2f}ms'
+                    )
@@ -0,0 +1,145 @@
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand
+
+
+def percentile(values, fraction):
+    """
+    Return the value below which the given fraction of values fall
+    :param values: sorted list
+    :param fraction:
+    :return:
+    """
+    if not values:
+        return float('nan')
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Command(BaseCommand):
+    """
+    Django command measuring how many concurrent clients a running server
+    keeps serving while other clients upload slowly
+
+    Reader connections repeatedly GET the url. Slow connections send the
+    headers of an upload to --slow-path and then trickle its body, as
+    mobile clients do, tying up the server while they are connected.
+    """
+    help = 'Load test a running server with fast readers and slow uploads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('url')
+        parser.add_argument('--token', default='')
+        parser.add_argument('--connections', type=int, default=50)
+        parser.add_argument('--duration', type=float, default=10)
+        parser.add_argument('--timeout', type=float, default=5,
+                            help='Seconds a response may take past the end')
+        parser.add_argument('--slow', type=int, default=0,
+                            help='Number of slow uploading connections')
+        parser.add_argument('--slow-path', default='/api/recipe/recipes/')
+        parser.add_argument('--slow-bytes-per-second', type=int,
+                            default=1024)
+
+    def headers(self, method, path, host, extra=''):
+        auth = f'Authorization: Token {self.token}\r\n' if self.token else ''
+        return (
+            f'{method} {path} HTTP/1.1\r\nHost: {host}\r\n{auth}{extra}\r\n'
+        ).encode('latin1')
+
+    async def read_response(self, reader):
+        status = int((await reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.decode('latin1').partition(':')
+            if name.lower() == 'content-length':
+                length = int(value)
+        await reader.readexactly(length)
+        return status
+
+    async def fast_client(self, deadline):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        request = self.headers('GET', self.path, self.host)
+        try:
+            while time.monotonic() < deadline:
+                start = time.monotonic()
+                writer.write(request)
+                status = await asyncio.wait_for(
+                    self.read_response(reader),
+                    max(deadline - time.monotonic(), 0) + self.timeout
+                )
+                self.latencies.append(time.monotonic() - start)
+                self.statuses[status] = self.statuses.get(status, 0) + 1
+        except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError,
+                ValueError, IndexError):
+            self.errors += 1
+        finally:
+            writer.close()
+
+    async def slow_client(self, deadline, path, rate):
+        while time.monotonic() < deadline:
+            try:
+                reader, writer = await asyncio.open_connection(
+                    self.host, self.port
+                )
+            except OSError:
+                await asyncio.sleep(0.1)
+                continue
+            length = int(rate * (deadline - time.monotonic() + 1))
+            writer.write(self.headers(
+                'POST', path, self.host,
+                'Content-Type: application/json\r\n'
+                f'Content-Length: {length}\r\n'
+            ))
+            try:
+                while length > 0 and time.monotonic() < deadline:
+                    writer.write(b' ' * min(rate // 10, length))
+                    length -= rate // 10
+                    await writer.drain()
+                    await asyncio.sleep(0.1)
+            except OSError:
+                pass
+            finally:
+                writer.close()
+
+    async def run(self, options):
+        deadline = time.monotonic() + options['duration']
+        slow = [
+            self.slow_client(deadline, options['slow_path'],
+                             options['slow_bytes_per_second'])
+            for _ in range(options['slow'])
+        ]
+        if slow:
+            # Let the slow uploads occupy the server first
+            slow = [asyncio.ensure_future(client) for client in slow]
+            await asyncio.sleep(1)
+        await asyncio.gather(*(
+            self.fast_client(deadline)
+            for _ in range(options['connections'])
+        ), *slow)
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['url'])
+        self.host, self.port = url.hostname, url.port or 80
+        self.path = url.path + (f'?{url.query}' if url.query else '')
+        self.token = options['token']
+        self.timeout = options['timeout']
+        self.latencies, self.statuses, self.errors = [], {}, 0
+
+        start = time.monotonic()
+        asyncio.run(self.run(options))
+        elapsed = time.monotonic() - start - (1 if options['slow'] else 0)
+
+        latencies = sorted(self.latencies)
+        self.stdout.write(
+            f'{options["connections"]} readers, {options["slow"]} slow '
+            f'uploads, {elapsed:.1f}s\n'
+            f'requests  {len(latencies)} ({len(latencies) / elapsed:.1f}/s)'
+            f', statuses {self.statuses}, errors {self.errors}\n'
+            f'latency   p50 {percentile(latencies, 0.5) * 1000:.0f} ms, '
+            f'p99 {percentile(latencies, 0.99) * 1000:.0f} ms, '
+            f'max {percentile(latencies, 1) * 1000:.0f} ms'
+        )
@@ -1,22 +1,65 @@
+import random
 import time
 
-from django.db import connections
+from django.db import DEFAULT_DB_ALIAS, connections
 from django.db.utils import OperationalError
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
 
 class Command(BaseCommand):
     """
     Django command to pause execution until database is available
     """
+    help = 'Wait until the database accepts connections and queries'
+
+    max_interval = 10
+
+    def add_arguments(self, parser):
+        parser.add_argument('--timeout', type=float, default=60,
+                            help='Seconds to wait before giving up')
+        parser.add_argument('--interval', type=float, default=0.5,
+                            help='Seconds before the first retry, doubled '
+                                 'after each failed attempt')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def probe(self, alias):
+        """
+        Open a connection and run a trivial query
+        :param alias:
+        :return:
+        """
+        connection = connections[alias]
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+                cursor.fetchone()
+        finally:
+            # Let the following command start with a fresh connection
+            connection.close()
 
     def handle(self, *args, **options):
         self.stdout.write('Waiting for database')
-        db_conn = None
-        while not db_conn:
+        deadline = time.monotonic() + options['timeout']
+        attempt = 0
+        while True:
             try:
-                db_conn = connections['default']
-            except OperationalError:
-                self.stdout.write('Database unavailable, waiting for 1 second...')
-                time.sleep(1)
-        self.stdout.write(self.style.SUCCESS('Database available!'))
\ No newline at end of file
+                self.probe(options['database'])
+                break
+            except OperationalError as e:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise CommandError(
+                        f'Database unavailable after {options["timeout"]:g} '
+                        f'seconds: {e}'
+                    )
+                # Exponential backoff with jitter, so containers started
+                # together do not retry in lockstep
+                delay = min(options['interval'] * 2 ** attempt,
+                            self.max_interval)
+                delay = min(random.uniform(delay / 2, delay), remaining)
+                attempt += 1
+                self.stdout.write(
+                    f'Database unavailable, waiting {delay:.1f} seconds...'
+                )
+                time.sleep(delay)
+        self.stdout.write(self.style.SUCCESS('Database available!'))
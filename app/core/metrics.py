@@ -0,0 +1,407 @@
+import bisect
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+SIZE_BUCKETS = (
+    256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304,
+)
+
+
+class Counter:
+    """
+    Prometheus counter with labels
+    """
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.values = {}
+
+    def inc(self, labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in self.values.items():
+            yield self.name, labels, value
+
+    def merge(self, values):
+        """
+        Add the values of the same metric of another process
+        :param values: labels -> value
+        :return:
+        """
+        for labels, value in values.items():
+            self.values[labels] = self.values.get(labels, 0) + value
+
+    def snapshot(self):
+        return [[labels, value] for labels, value in self.values.items()]
+
+
+class Histogram(Counter):
+    """
+    Prometheus histogram with labels
+    """
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames, buckets):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+
+    def observe(self, labels, value):
+        entry = self.values.get(labels)
+        if entry is None:
+            entry = self.values[labels] = [[0] * len(self.buckets), 0, 0]
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            entry[0][index] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def samples(self):
+        for labels, (counts, total, count) in self.values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield (self.name + '_bucket', labels + (('le', f'{bound:g}'),),
+                       cumulative)
+            yield self.name + '_bucket', labels + (('le', '+Inf'),), count
+            yield self.name + '_sum', labels, total
+            yield self.name + '_count', labels, count
+
+    def merge(self, values):
+        for labels, (counts, total, count) in values.items():
+            entry = self.values.get(labels)
+            if entry is None:
+                entry = self.values[labels] = [[0] * len(self.buckets), 0, 0]
+            entry[0] = [a + b for a, b in zip(entry[0], counts)]
+            entry[1] += total
+            entry[2] += count
+
+    def snapshot(self):
+        return [[labels, [list(counts), total, count]]
+                for labels, (counts, total, count) in self.values.items()]
+
+
+def escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"') \
+        .replace('\n', r'\n')
+
+
+class Registry:
+    """
+    In-process metrics of the requests served by this process
+
+    Every process keeps its own values. Under several workers each one
+    writes them to settings.METRICS_DIR, see flush() and collect().
+    """
+    labelnames = ('view', 'action', 'method', 'status')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        labels = self.labelnames
+        self.requests = Counter(
+            'api_requests_total', 'Requests served.', labels
+        )
+        self.duration = Histogram(
+            'api_request_duration_seconds', 'Request wall time.', labels,
+            DURATION_BUCKETS
+        )
+        self.db_queries = Counter(
+            'api_db_queries_total', 'Database queries run.', labels
+        )
+        self.db_duration = Counter(
+            'api_db_duration_seconds_total', 'Time spent in the database.',
+            labels
+        )
+        self.serialize_duration = Counter(
+            'api_serialize_duration_seconds_total',
+            'Time spent serializing and rendering responses.', labels
+        )
+        self.response_size = Histogram(
+            'api_response_size_bytes', 'Response body size.', labels,
+            SIZE_BUCKETS
+        )
+        self.list_cache = Counter(
+            'api_list_cache_lookups_total',
+            'Lookups of the per-user list cache, see recipe.cache.',
+            ('list', 'result')
+        )
+        self.metrics = (
+            self.requests, self.duration, self.db_queries, self.db_duration,
+            self.serialize_duration, self.response_size, self.list_cache,
+        )
+
+    def record(self, labels, request_metrics, size):
+        """
+        Record a finished request
+        :param labels: values of Registry.labelnames
+        :param request_metrics: RequestMetrics of the request
+        :param size: response body size
+        :return:
+        """
+        labels = tuple(zip(self.labelnames, labels))
+        with self.lock:
+            self.requests.inc(labels)
+            self.duration.observe(labels, request_metrics.total)
+            self.db_queries.inc(labels, request_metrics.queries)
+            self.db_duration.inc(labels, request_metrics.db)
+            self.serialize_duration.inc(
+                labels, request_metrics.phases.get('serialize', 0) +
+                request_metrics.phases.get('render', 0)
+            )
+            if size is not None:
+                self.response_size.observe(labels, size)
+
+    def record_cache_lookup(self, name, hit):
+        """
+        Count a lookup of a cached list
+        :param name: list name, see recipe.cache
+        :param hit:
+        :return:
+        """
+        labels = (('list', name), ('result', 'hit' if hit else 'miss'))
+        with self.lock:
+            self.list_cache.inc(labels)
+
+    def snapshot(self):
+        """
+        Return the values of every metric as JSON serializable data
+        :return:
+        """
+        with self.lock:
+            return {metric.name: metric.snapshot() for metric in self.metrics}
+
+    def merge(self, snapshot):
+        """
+        Add the values of a snapshot taken in another process
+        :param snapshot: Registry.snapshot() data
+        :return:
+        """
+        with self.lock:
+            for metric in self.metrics:
+                metric.merge({
+                    tuple(tuple(pair) for pair in labels): value
+                    for labels, value in snapshot.get(metric.name, ())
+                })
+
+    def clear(self):
+        with self.lock:
+            for metric in self.metrics:
+                metric.values.clear()
+
+    def exposition(self):
+        """
+        Return the metrics in the Prometheus text format
+        :return:
+        """
+        lines = []
+        with self.lock:
+            for metric in self.metrics:
+                lines.append(f'# HELP {metric.name} {metric.documentation}')
+                lines.append(f'# TYPE {metric.name} {metric.kind}')
+                for name, labels, value in metric.samples():
+                    labels = ','.join(
+                        f'{key}="{escape(label)}"' for key, label in labels
+                    )
+                    lines.append(f'{name}{{{labels}}} {value!r}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+# Name of this process's snapshot in the metrics directory, unique even if
+# the pid of an exited worker is reused
+_snapshot_name = None
+# Exited workers' snapshots are added up here by archive()
+ARCHIVE_NAME = 'archive.json'
+_flusher = None
+_flusher_lock = threading.Lock()
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write(path, data):
+    # Readers see either the previous or the new file, never a partial one
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def flush(directory, source=None):
+    """
+    Write the metrics of this process to the metrics directory
+    :param directory: settings.METRICS_DIR
+    :param source: registry to write, the process registry by default
+    :return:
+    """
+    global _snapshot_name
+    if _snapshot_name is None or \
+            not _snapshot_name.startswith(f'{os.getpid()}-'):
+        _snapshot_name = f'{os.getpid()}-{uuid.uuid4().hex}.json'
+    _write(os.path.join(directory, _snapshot_name),
+           (source or registry).snapshot())
+
+
+def collect(directory):
+    """
+    Return a registry adding up the metrics written to the directory by
+    every worker, running or exited
+    :param directory: settings.METRICS_DIR
+    :return:
+    """
+    combined = Registry()
+    snapshots = {}
+    for name in os.listdir(directory):
+        if name.endswith('.json') and name != ARCHIVE_NAME:
+            snapshots[name] = _read(os.path.join(directory, name))
+    # Read after the workers' snapshots, so that one archived meanwhile is
+    # counted once, from the archive
+    archive = _read(os.path.join(directory, ARCHIVE_NAME))
+    if archive is not None:
+        combined.merge(archive['metrics'])
+        for name in archive['files']:
+            snapshots.pop(name, None)
+    for snapshot in snapshots.values():
+        if snapshot is not None:
+            combined.merge(snapshot)
+    return combined
+
+
+def archive(directory, pid):
+    """
+    Add the snapshot of an exited worker to the archive of the metrics
+    directory, so that its counts survive it. Called by the gunicorn
+    master, see gunicorn.conf.py
+    :param directory: settings.METRICS_DIR
+    :param pid: process id of the exited worker
+    :return:
+    """
+    names = [name for name in os.listdir(directory)
+             if name.startswith(f'{pid}-') and name.endswith('.json')]
+    if not names:
+        return
+    path = os.path.join(directory, ARCHIVE_NAME)
+    data = _read(path) or {'files': [], 'metrics': {}}
+    combined = Registry()
+    combined.merge(data['metrics'])
+    for name in names:
+        snapshot = _read(os.path.join(directory, name))
+        if snapshot is not None:
+            combined.merge(snapshot)
+    _write(path, {'files': data['files'] + names,
+                  'metrics': combined.snapshot()})
+    for name in names:
+        os.remove(os.path.join(directory, name))
+
+
+def start_flusher(directory, interval):
+    """
+    Flush the metrics of this process to the directory every interval
+    seconds from a daemon thread, once per process
+    :param directory: settings.METRICS_DIR
+    :param interval: settings.METRICS_FLUSH_INTERVAL
+    :return:
+    """
+    global _flusher
+
+    def run():
+        while True:
+            time.sleep(interval)
+            flush(directory)
+
+    with _flusher_lock:
+        if _flusher is None or not _flusher.is_alive():
+            _flusher = threading.Thread(
+                target=run, name='metrics-flusher', daemon=True
+            )
+            _flusher.start()
+
+
+class RequestMetrics:
+    """
+    Timings of one request, collected by core.middleware
+    .InstrumentationMiddleware
+    """
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.total = 0
+        self.queries = 0
+        self.db = 0
+        self.phases = {}
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        """
+        connection.execute_wrapper counting queries and database time
+        """
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += time.perf_counter() - start
+            self.queries += 1
+
+    def finish(self):
+        self.total = time.perf_counter() - self.start
+
+    def server_timing(self):
+        """
+        Return the value of the Server-Timing header
+        :return:
+        """
+        timings = [f'db;dur={self.db * 1000:.1f};desc="{self.queries} '
+                   f'queries"']
+        timings += [
+            f'{name};dur={seconds * 1000:.1f}'
+            for name, seconds in self.phases.items()
+        ]
+        timings.append(f'total;dur={self.total * 1000:.1f}')
+        return ', '.join(timings)
+
+
+_local = threading.local()
+
+
+def activate(request_metrics):
+    _local.metrics = request_metrics
+
+
+def deactivate():
+    _local.metrics = None
+
+
+@contextmanager
+def timer(name):
+    """
+    Add the time spent in the block, minus database time, to a phase of
+    the current request's metrics, if any
+    :param name:
+    :return:
+    """
+    request_metrics = getattr(_local, 'metrics', None)
+    if request_metrics is None:
+        yield
+        return
+    db = request_metrics.db
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start - (request_metrics.db - db)
+        request_metrics.phases[name] = \
+            request_metrics.phases.get(name, 0) + elapsed
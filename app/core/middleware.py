@@ -0,0 +1,177 @@
+import gzip
+import io
+import re
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+from core import metrics
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+re_accept_encoding = re.compile(
+    r'(?P<coding>[\w*-]+)\s*(?:;\s*q\s*=\s*(?P<q>[0-9.]+))?'
+)
+
+
+def compress_gzip(content):
+    """
+    Gzip content at settings.COMPRESSION_GZIP_LEVEL
+    :param content:
+    :return:
+    """
+    buffer = io.BytesIO()
+    with gzip.GzipFile(mode='wb', fileobj=buffer, mtime=0,
+                       compresslevel=settings.COMPRESSION_GZIP_LEVEL) as f:
+        f.write(content)
+    return buffer.getvalue()
+
+
+def compress_brotli(content):
+    """
+    Brotli compress content at settings.COMPRESSION_BROTLI_QUALITY
+    :param content:
+    :return:
+    """
+    return brotli.compress(
+        content,
+        mode=brotli.MODE_TEXT,
+        quality=settings.COMPRESSION_BROTLI_QUALITY,
+    )
+
+
+def available_codings():
+    """
+    Return the content codings supported here, in order of preference
+    :return:
+    """
+    codings = [('gzip', compress_gzip)]
+    if brotli is not None:
+        codings.insert(0, ('br', compress_brotli))
+    return codings
+
+
+def negotiate_coding(accept_encoding):
+    """
+    Return the (coding, compress) pair the client accepts with the highest
+    q-value, preferring brotli on ties, or None
+    :param accept_encoding: value of the Accept-Encoding header
+    :return:
+    """
+    weights = {}
+    for match in re_accept_encoding.finditer(accept_encoding.lower()):
+        try:
+            q = float(match.group('q') or 1)
+        except ValueError:
+            continue
+        weights[match.group('coding')] = q
+
+    best, best_q = None, 0
+    for coding, compress in available_codings():
+        q = weights.get(coding, weights.get('*', 0))
+        if q > best_q:
+            best, best_q = (coding, compress), q
+    return best
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Compress text responses of at least settings.COMPRESSION_MIN_SIZE
+    bytes with brotli (when installed) or gzip, as negotiated through
+    Accept-Encoding
+
+    Streaming responses (media files) are left alone, their content types
+    are already compressed.
+    """
+    def process_response(self, request, response):
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        content_type = response.get('Content-Type', '').split(';')[0]
+        if content_type.strip().lower() not in \
+                settings.COMPRESSION_CONTENT_TYPES:
+            return response
+        if len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        negotiated = negotiate_coding(
+            request.META.get('HTTP_ACCEPT_ENCODING', '')
+        )
+        if negotiated is None:
+            return response
+        coding, compress = negotiated
+
+        # Return the compressed content only if it's actually shorter
+        compressed_content = compress(response.content)
+        if len(compressed_content) >= len(response.content):
+            return response
+        response.content = compressed_content
+        response['Content-Length'] = str(len(compressed_content))
+
+        # The representation changed, so a strong ETag becomes weak
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = coding
+        return response
+
+
+class InstrumentationMiddleware:
+    """
+    Record wall time, database queries and time, serialization time and
+    response size of API requests in core.metrics.registry, labelled by
+    view and viewset action
+
+    Only paths starting with one of settings.METRICS_PATH_PREFIXES are
+    instrumented. The timings are also sent in a Server-Timing header
+    when settings.METRICS_SERVER_TIMING is set.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if settings.METRICS_DIR:
+            metrics.start_flusher(
+                settings.METRICS_DIR, settings.METRICS_FLUSH_INTERVAL
+            )
+
+    def __call__(self, request):
+        if not request.path.startswith(settings.METRICS_PATH_PREFIXES):
+            return self.get_response(request)
+
+        request_metrics = metrics.RequestMetrics()
+        metrics.activate(request_metrics)
+        try:
+            with ExitStack() as stack:
+                for conn in connections.all():
+                    stack.enter_context(
+                        conn.execute_wrapper(request_metrics.execute_wrapper)
+                    )
+                response = self.get_response(request)
+        finally:
+            metrics.deactivate()
+        request_metrics.finish()
+
+        view, action = getattr(request, 'metrics_view', ('', ''))
+        metrics.registry.record(
+            (view, action, request.method, response.status_code),
+            request_metrics,
+            None if response.streaming else len(response.content),
+        )
+        if settings.METRICS_SERVER_TIMING:
+            response['Server-Timing'] = request_metrics.server_timing()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # DRF sets cls on its views and the method -> action map on viewsets
+        view_class = getattr(view_func, 'cls', view_func)
+        actions = getattr(view_func, 'actions', None) or {}
+        method = request.method.lower()
+        request.metrics_view = (
+            view_class.__name__, actions.get(method, method)
+        )
@@ -0,0 +1,64 @@
+# Generated by Django 2.1.15 on 2026-10-18 17:55
+
+import django.contrib.postgres.search
+from django.conf import settings
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations, models
+
+
+def backfill_search(apps, schema_editor):
+    Recipe = apps.get_model('core', 'Recipe')
+    postgres = schema_editor.connection.vendor == 'postgresql'
+    config = settings.RECIPE_SEARCH_CONFIG
+    for recipe in Recipe.objects.prefetch_related('tags', 'ingredients'):
+        related = ' '.join(
+            [t.name for t in recipe.tags.all()] +
+            [i.name for i in recipe.ingredients.all()]
+        )
+        values = {'search_document': f'{recipe.title} {related}'.strip()}
+        if postgres:
+            values['search_vector'] = SearchVector(
+                models.Value(recipe.title, output_field=models.TextField()),
+                weight='A', config=config
+            ) + SearchVector(
+                models.Value(related, output_field=models.TextField()),
+                weight='B', config=config
+            )
+        Recipe.objects.filter(pk=recipe.pk).update(**values)
+
+
+def create_gin_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX core_recipe_search_vector_gin '
+            'ON core_recipe USING gin (search_vector)'
+        )
+
+
+def drop_gin_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'DROP INDEX IF EXISTS core_recipe_search_vector_gin'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_user_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_search, migrations.RunPython.noop),
+        migrations.RunPython(create_gin_index, drop_gin_index),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 2.1.15 on 2026-10-18 18:20
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Max, Min, Sum
+
+
+def backfill_stats(apps, schema_editor):
+    Recipe = apps.get_model('core', 'Recipe')
+    RecipeStats = apps.get_model('core', 'RecipeStats')
+    rows = Recipe.objects.order_by().values('user_id').annotate(
+        recipe_count=Count('id'),
+        time_minutes_sum=Sum('time_minutes'),
+        time_minutes_min=Min('time_minutes'),
+        time_minutes_max=Max('time_minutes'),
+        price_sum=Sum('price'),
+        price_min=Min('price'),
+        price_max=Max('price'),
+    )
+    stats = [RecipeStats(**row) for row in rows]
+    found = {row.user_id for row in stats}
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    stats += [
+        RecipeStats(user_id=pk)
+        for pk in User.objects.values_list('pk', flat=True)
+        if pk not in found
+    ]
+    RecipeStats.objects.bulk_create(stats, batch_size=1000)
+    for name in ('Tag', 'Ingredient'):
+        model = apps.get_model('core', name)
+        counts = model.objects.annotate(n=Count('recipe')).filter(n__gt=0) \
+            .values_list('pk', 'n')
+        for pk, n in counts:
+            model.objects.filter(pk=pk).update(recipe_count=n)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_recipe_range_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='recipe_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('recipe_count', models.PositiveIntegerField(default=0)),
+                ('time_minutes_sum', models.BigIntegerField(default=0)),
+                ('time_minutes_min', models.IntegerField(null=True)),
+                ('time_minutes_max', models.IntegerField(null=True)),
+                ('price_sum', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('price_min', models.DecimalField(decimal_places=2, max_digits=5, null=True)),
+                ('price_max', models.DecimalField(decimal_places=2, max_digits=5, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='ingredient',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', '-recipe_count'], name='core_ingred_user_id_dbfae2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', '-recipe_count'], name='core_tag_user_id_a7d271_idx'),
+        ),
+        migrations.RunPython(backfill_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 2.1.15 on 2026-10-18 18:25
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def merge_duplicates(apps, schema_editor):
+    """
+    Merge tags and ingredients sharing a user and a name into the oldest
+    one, moving their recipes over
+    """
+    Recipe = apps.get_model('core', 'Recipe')
+    for name, field_name in (('Tag', 'tags'), ('Ingredient', 'ingredients')):
+        model = apps.get_model('core', name)
+        field = Recipe._meta.get_field(field_name)
+        through = field.remote_field.through
+        source = f'{field.m2m_field_name()}_id'
+        target = f'{field.m2m_reverse_field_name()}_id'
+        duplicates = model.objects.order_by().values('user_id', 'name') \
+            .annotate(keep=Min('id'), n=Count('id')).filter(n__gt=1)
+        for row in duplicates:
+            keep = row['keep']
+            others = model.objects.filter(
+                user_id=row['user_id'], name=row['name']
+            ).exclude(pk=keep)
+            seen = set(through.objects.filter(**{target: keep})
+                       .values_list(source, flat=True))
+            moved, stale = [], []
+            for pk, recipe_id in through.objects.filter(
+                    **{f'{target}__in': others}).values_list('pk', source):
+                (stale if recipe_id in seen else moved).append(pk)
+                seen.add(recipe_id)
+            through.objects.filter(pk__in=stale).delete()
+            through.objects.filter(pk__in=moved).update(**{target: keep})
+            others.delete()
+            model.objects.filter(pk=keep).update(recipe_count=len(seen))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_recipe_stats'),
+    ]
+
+    # The unique constraints are added by the next migration, in their own
+    # transaction, as PostgreSQL does not alter tables with pending
+    # deferred foreign key checks
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+    ]
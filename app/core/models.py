@@ -1,6 +1,7 @@
 import uuid
 import os
 from django.db import models
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, \
                                         PermissionsMixin
 from django.conf import settings
@@ -19,6 +20,31 @@ def recipe_image_file_path(instance, filename):
     return os.path.join('uploads/recipe/', filename)
 
 
+def recipe_image_content_path(digest, ext):
+    """
+    Generate the content addressed file path of a recipe image, identical
+    images share one file
+    :param digest:
+    :param ext:
+    :return:
+    """
+    return os.path.join('uploads/recipe/', f'{digest}.{ext}')
+
+
+RECIPE_IMAGE_UPLOAD_DIR = 'uploads/recipe/incoming/'
+
+
+def recipe_image_upload_path(digest, ext):
+    """
+    Generate the file path of an uploaded recipe image that still carries
+    its EXIF data, until recipe.images stores it under its content path
+    :param digest:
+    :param ext:
+    :return:
+    """
+    return os.path.join(RECIPE_IMAGE_UPLOAD_DIR, f'{digest}.{ext}')
+
+
 class UserManager(BaseUserManager):
     def create_user(self, email, password=None, **extra_fields):
         """
@@ -74,6 +100,13 @@ class Tag(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
     )
+    # Number of recipes using the tag, kept up to date by recipe.stats
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        # Also the (user, name) index of the list and name lookups
+        unique_together = ('user', 'name')
+        indexes = [models.Index(fields=['user', '-recipe_count'])]
 
     def __str__(self):
         return self.name
@@ -88,6 +121,13 @@ class Ingredient(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE
     )
+    # Number of recipes using the ingredient, see Tag.recipe_count
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        # Also the (user, name) index of the list and name lookups
+        unique_together = ('user', 'name')
+        indexes = [models.Index(fields=['user', '-recipe_count'])]
 
     def __str__(self):
         return self.name
@@ -108,6 +148,45 @@ class Recipe(models.Model):
     ingredients = models.ManyToManyField('Ingredient')
     tags = models.ManyToManyField('Tag')
     image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    # Resized, EXIF free variants generated by recipe.images
+    image_thumb = models.ImageField(null=True, blank=True, editable=False)
+    image_medium = models.ImageField(null=True, blank=True, editable=False)
+    image_webp = models.ImageField(null=True, blank=True, editable=False)
+    # Title, tag and ingredient names kept up to date by recipe.search
+    search_document = models.TextField(blank=True, default='', editable=False)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-id']),
+            models.Index(fields=['user', 'time_minutes']),
+            models.Index(fields=['user', 'price']),
+        ]
 
     def __str__(self):
         return self.title
+
+
+class RecipeStats(models.Model):
+    """
+    Aggregates over the recipes of a user, kept up to date by recipe.stats
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='recipe_stats',
+    )
+    recipe_count = models.PositiveIntegerField(default=0)
+    time_minutes_sum = models.BigIntegerField(default=0)
+    time_minutes_min = models.IntegerField(null=True)
+    time_minutes_max = models.IntegerField(null=True)
+    price_sum = models.DecimalField(max_digits=15, decimal_places=2,
+                                    default=0)
+    price_min = models.DecimalField(max_digits=5, decimal_places=2,
+                                    null=True)
+    price_max = models.DecimalField(max_digits=5, decimal_places=2,
+                                    null=True)
+
+    def __str__(self):
+        return f'{self.user} recipe stats'
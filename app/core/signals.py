@@ -0,0 +1,63 @@
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import connections
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from core.authentication import token_cache
+
+
+@receiver(post_delete, sender=Token)
+def evict_deleted_token(sender, instance, **kwargs):
+    """
+    Stop authenticating with a deleted token
+    """
+    token_cache.evict(instance.key)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def evict_changed_user(sender, instance, **kwargs):
+    """
+    Drop cached tokens of a changed, deactivated or deleted user
+    """
+    token_cache.evict_user(instance.pk)
+
+
+def _install_health_check(conn):
+    """
+    Make the connection check itself with is_usable() on its first use
+    after check_reused_connections marked it, like ensure_connection()
+    does with CONN_HEALTH_CHECKS since Django 4.1
+    :param conn:
+    :return:
+    """
+    ensure_connection = conn.ensure_connection
+
+    def checked_ensure_connection():
+        if conn.health_check_pending:
+            conn.health_check_pending = False
+            if conn.connection is not None and not conn.is_usable():
+                conn.close()
+        ensure_connection()
+
+    conn.health_check_pending = False
+    conn.ensure_connection = checked_ensure_connection
+
+
+@receiver(request_started)
+def check_reused_connections(**kwargs):
+    """
+    Have persistent database connections checked on their first use in
+    the request, closing those that stopped working (server restart,
+    failover, idle timeout) so Django opens a fresh one instead of failing
+    the request. Requests not using the database send no query.
+    """
+    for conn in connections.all():
+        if conn.connection is None or \
+                not conn.settings_dict.get('CONN_HEALTH_CHECKS'):
+            continue
+        if not hasattr(conn, 'health_check_pending'):
+            _install_health_check(conn)
+        conn.health_check_pending = True
@@ -0,0 +1,179 @@
+import asyncio
+import json
+from unittest.mock import Mock
+
+from django.core.wsgi import get_wsgi_application
+from django.http import StreamingHttpResponse
+from django.test import SimpleTestCase
+
+from core.asgi import ThreadPoolASGIHandler
+
+
+def run(application, scope, messages):
+    """
+    Run an ASGI application for one request, return the messages it sent
+    :param application:
+    :param scope:
+    :param messages: messages received by the application
+    :return:
+    """
+    sent = []
+    messages = list(messages)
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(application(scope, receive, send))
+    return sent
+
+
+def http_scope(path, method='GET', headers=()):
+    return {
+        'type': 'http',
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'path': path,
+        'root_path': '',
+        'query_string': b'page=1',
+        'headers': list(headers),
+        'client': ('10.0.0.1', 5000),
+        'server': ('testserver', 80),
+    }
+
+
+class ThreadPoolASGIHandlerTests(SimpleTestCase):
+    """
+    Test serving the WSGI application under ASGI
+    """
+    def test_request_body_and_environ(self):
+        """
+        Test the body is read in chunks and the environ is built from scope
+        :return:
+        """
+        def wsgi_application(environ, start_response):
+            start_response('201 Created', [('Content-Type', 'text/plain')])
+            return [environ['wsgi.input'].read(), b'|',
+                    environ['CONTENT_TYPE'].encode(), b'|',
+                    environ['QUERY_STRING'].encode(), b'|',
+                    environ['REMOTE_ADDR'].encode()]
+
+        sent = run(
+            ThreadPoolASGIHandler(wsgi_application, max_threads=2),
+            http_scope('/upload/', 'POST',
+                       [(b'content-type', b'image/jpeg')]),
+            [{'type': 'http.request', 'body': b'abc', 'more_body': True},
+             {'type': 'http.request', 'body': b'def'}],
+        )
+
+        self.assertEqual(sent[0]['status'], 201)
+        self.assertEqual(sent[0]['headers'],
+                         [(b'content-type', b'text/plain')])
+        self.assertEqual(sent[1]['body'],
+                         b'abcdef|image/jpeg|page=1|10.0.0.1')
+        self.assertEqual(len(sent), 2)
+
+    def test_streaming_response(self):
+        """
+        Test streaming responses are sent chunk by chunk and closed
+        :return:
+        """
+        response = StreamingHttpResponse(iter([b'one', b'two']))
+        response.close = Mock()
+
+        def wsgi_application(environ, start_response):
+            start_response('200 OK', list(response.items()))
+            return response
+
+        sent = run(
+            ThreadPoolASGIHandler(wsgi_application, max_threads=1),
+            http_scope('/media/image.jpg'),
+            [{'type': 'http.request'}],
+        )
+
+        self.assertEqual([message.get('body') for message in sent[1:]],
+                         [b'one', b'two', None])
+        response.close.assert_called_once_with()
+
+    def test_client_disconnect(self):
+        """
+        Test the application is not called when the client goes away
+        :return:
+        """
+        def wsgi_application(environ, start_response):
+            raise AssertionError('called')
+
+        sent = run(
+            ThreadPoolASGIHandler(wsgi_application, max_threads=1),
+            http_scope('/upload/', 'POST'),
+            [{'type': 'http.request', 'body': b'abc', 'more_body': True},
+             {'type': 'http.disconnect'}],
+        )
+
+        self.assertEqual(sent, [])
+
+    def test_body_too_large(self):
+        """
+        Test bodies over the limit are rejected by Content-Length before
+        reading, or once the bytes read cross it
+        :return:
+        """
+        def wsgi_application(environ, start_response):
+            raise AssertionError('called')
+
+        application = ThreadPoolASGIHandler(
+            wsgi_application, max_threads=1, max_body_size=4
+        )
+
+        sent = run(
+            application,
+            http_scope('/upload/', 'POST', [(b'content-length', b'5')]),
+            [],
+        )
+        self.assertEqual(sent[0]['status'], 413)
+
+        sent = run(
+            application,
+            http_scope('/upload/', 'POST'),
+            [{'type': 'http.request', 'body': b'abc', 'more_body': True},
+             {'type': 'http.request', 'body': b'de', 'more_body': True}],
+        )
+        self.assertEqual(sent[0]['status'], 413)
+        self.assertEqual(json.loads(sent[1]['body']),
+                         {'detail': 'Request body too large.'})
+
+    def test_django_application(self):
+        """
+        Test a recipe API response through the Django application
+        :return:
+        """
+        sent = run(
+            ThreadPoolASGIHandler(get_wsgi_application(), max_threads=1),
+            http_scope('/api/recipe/recipes/'),
+            [{'type': 'http.request'}],
+        )
+
+        self.assertEqual(sent[0]['status'], 401)
+        self.assertIn(
+            (b'content-type', b'application/json'), sent[0]['headers']
+        )
+        self.assertIn('detail', json.loads(sent[1]['body']))
+
+    def test_lifespan(self):
+        """
+        Test startup and shutdown are acknowledged
+        :return:
+        """
+        sent = run(
+            ThreadPoolASGIHandler(lambda *args: [], max_threads=1),
+            {'type': 'lifespan'},
+            [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}],
+        )
+
+        self.assertEqual(
+            [message['type'] for message in sent],
+            ['lifespan.startup.complete', 'lifespan.shutdown.complete']
+        )
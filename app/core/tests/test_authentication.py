@@ -0,0 +1,117 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.authentication import TokenCache, token_cache
+
+
+ME_URL = reverse('user:me')
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """
+    Test the cached token authentication
+    """
+    def setUp(self):
+        token_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            email='testtokencache@test.com',
+            password='testpass',
+            name='name'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_token_lookup_cached(self):
+        """
+        Test that a repeated request does not look the token up again
+        :return:
+        """
+        self.client.get(ME_URL)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['email'], self.user.email)
+
+    def test_deleted_token_rejected(self):
+        """
+        Test that a deleted token stops authenticating
+        :return:
+        """
+        self.client.get(ME_URL)
+        self.token.delete()
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_rejected(self):
+        """
+        Test that a deactivated user stops authenticating
+        :return:
+        """
+        self.client.get(ME_URL)
+        self.user.is_active = False
+        self.user.save()
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_user_update_refreshes_cache(self):
+        """
+        Test that updating the user through the me endpoint is visible
+        :return:
+        """
+        self.client.get(ME_URL)
+        self.client.patch(ME_URL, {'name': 'new name'})
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data['name'], 'new name')
+
+
+class TokenCacheTests(TestCase):
+    """
+    Test the token cache eviction policies
+    """
+    def setUp(self):
+        self.user = get_user_model()(pk=1, email='testlru@test.com')
+
+    def test_lru_eviction(self):
+        """
+        Test that the least recently used entry is evicted when full
+        :return:
+        """
+        cache = TokenCache(ttl=60, max_size=2)
+        cache.set('a', self.user, None)
+        cache.set('b', self.user, None)
+        cache.get('a')
+        cache.set('c', self.user, None)
+
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(len(cache), 2)
+
+    @patch('core.authentication.time.monotonic')
+    def test_ttl_expiry(self, monotonic):
+        """
+        Test that entries expire after the ttl
+        :return:
+        """
+        monotonic.return_value = 100
+        cache = TokenCache(ttl=60, max_size=2)
+        cache.set('a', self.user, None)
+
+        monotonic.return_value = 161
+
+        self.assertIsNone(cache.get('a'))
@@ -1,9 +1,14 @@
+from io import StringIO
 from unittest.mock import patch
 
 from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.db.utils import OperationalError
 from django.test import TestCase
 
+ENSURE_CONNECTION = \
+    'django.db.backends.base.base.BaseDatabaseWrapper.ensure_connection'
+
 
 class CommandTests(TestCase):
 
@@ -12,10 +17,18 @@ class CommandTests(TestCase):
         Test waiting for db when db is available
         :return:
         """
-        with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
-            gi.return_value = True
-            call_command('wait_for_db')
-            self.assertEqual(gi.call_count, 1)
+        with patch('time.sleep') as ts:
+            call_command('wait_for_db', stdout=StringIO())
+            ts.assert_not_called()
+
+    def test_wait_for_db_queries(self):
+        """
+        Test the database is probed with a query, not just looked up
+        :return:
+        """
+        with patch('django.db.backends.utils.CursorWrapper.execute') as ex:
+            call_command('wait_for_db', stdout=StringIO())
+            ex.assert_called_once_with('SELECT 1')
 
     @patch('time.sleep', return_value=True)
     def test_wait_for_db(self, ts):
@@ -23,7 +36,43 @@ class CommandTests(TestCase):
         Test waiting for db
         :return:
         """
-        with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
-            gi.side_effect = [OperationalError] * 5 + [True]
-            call_command('wait_for_db')
-            self.assertEqual(gi.call_count, 6)
\ No newline at end of file
+        with patch(ENSURE_CONNECTION) as ec:
+            ec.side_effect = [OperationalError] * 5 + [None]
+            call_command('wait_for_db', stdout=StringIO())
+            self.assertEqual(ec.call_count, 6)
+            self.assertEqual(ts.call_count, 5)
+
+    @patch('time.sleep', return_value=True)
+    def test_wait_for_db_backoff(self, ts):
+        """
+        Test retries back off exponentially with jitter up to a maximum
+        :return:
+        """
+        with patch(ENSURE_CONNECTION) as ec:
+            ec.side_effect = [OperationalError] * 8 + [None]
+            call_command('wait_for_db', '--interval=1', '--timeout=600',
+                         stdout=StringIO())
+
+        delays = [call[0][0] for call in ts.call_args_list]
+        for attempt, delay in enumerate(delays):
+            limit = min(2 ** attempt, 10)
+            self.assertGreaterEqual(delay, limit / 2)
+            self.assertLessEqual(delay, limit)
+
+    @patch('time.sleep', return_value=True)
+    def test_wait_for_db_timeout(self, ts):
+        """
+        Test the command fails once the timeout has passed
+        :return:
+        """
+        with patch(ENSURE_CONNECTION) as ec, \
+                patch('time.monotonic') as monotonic:
+            ec.side_effect = OperationalError('connection refused')
+            monotonic.side_effect = [0, 1, 2, 3]
+            with self.assertRaisesMessage(CommandError,
+                                          'connection refused'):
+                call_command('wait_for_db', '--timeout=3', '--interval=1',
+                             stdout=StringIO())
+
+        self.assertEqual(ec.call_count, 3)
+        self.assertEqual(ts.call_count, 2)
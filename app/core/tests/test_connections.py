@@ -0,0 +1,66 @@
+from unittest.mock import patch
+
+from django.db import connection
+from django.test import TestCase
+
+from core.signals import check_reused_connections
+
+
+class ConnectionHealthCheckTests(TestCase):
+    """
+    Test persistent connections are checked before being reused
+    """
+    def setUp(self):
+        connection.ensure_connection()
+
+    def tearDown(self):
+        if hasattr(connection, 'health_check_pending'):
+            connection.health_check_pending = False
+
+    def test_unusable_connection_closed(self):
+        """
+        Test a broken persistent connection is closed on its first use in
+        the request
+        :return:
+        """
+        with patch.dict(connection.settings_dict, CONN_HEALTH_CHECKS=True), \
+                patch.object(connection, 'is_usable', return_value=False), \
+                patch.object(connection, 'close') as close:
+            check_reused_connections()
+            close.assert_not_called()
+            connection.ensure_connection()
+
+        close.assert_called_once_with()
+
+    def test_checked_once_per_request(self):
+        """
+        Test a working connection is kept and checked on its first use
+        only, requests not using it send no query
+        :return:
+        """
+        with patch.dict(connection.settings_dict, CONN_HEALTH_CHECKS=True), \
+                patch.object(connection, 'is_usable',
+                             return_value=True) as is_usable, \
+                patch.object(connection, 'close') as close:
+            check_reused_connections()
+            check_reused_connections()
+            is_usable.assert_not_called()
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+
+        is_usable.assert_called_once_with()
+        close.assert_not_called()
+
+    def test_health_checks_disabled(self):
+        """
+        Test nothing is checked without CONN_HEALTH_CHECKS
+        :return:
+        """
+        with patch.dict(connection.settings_dict, CONN_HEALTH_CHECKS=False), \
+                patch.object(connection, 'is_usable') as is_usable:
+            check_reused_connections()
+            connection.ensure_connection()
+
+        is_usable.assert_not_called()
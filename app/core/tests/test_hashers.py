@@ -0,0 +1,127 @@
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import check_password, make_password
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import hashers
+from core.throttling import throttle_store
+
+TOKEN_URL = reverse('user:token')
+
+FAST_COSTS = {
+    'PASSWORD_ARGON2_TIME_COST': 1,
+    'PASSWORD_ARGON2_MEMORY_COST': 256,
+    'PASSWORD_BCRYPT_ROUNDS': 4,
+    'PASSWORD_PBKDF2_ITERATIONS': 1000,
+}
+
+
+def profile(name):
+    return settings.PASSWORD_HASHER_PROFILES[name]
+
+
+@override_settings(**FAST_COSTS)
+class HasherProfileTests(TestCase):
+    """
+    Test the password hasher profiles
+    """
+    def setUp(self):
+        throttle_store.clear()
+        self.client = APIClient()
+
+    def test_profiles(self):
+        """
+        Test each profile hashes with its hasher and tuned costs and
+        verifies the hashes of the others
+        :return:
+        """
+        encoded = {}
+        for name, prefix in (('argon2', 'argon2$argon2i$v=19$m=256,t=1'),
+                             ('bcrypt', 'bcrypt_sha256$$2b$04$'),
+                             ('pbkdf2', 'pbkdf2_sha256$1000$')):
+            with override_settings(PASSWORD_HASHERS=profile(name)):
+                encoded[name] = make_password('testpass')
+                self.assertTrue(encoded[name].startswith(prefix))
+
+        for name in encoded:
+            with override_settings(PASSWORD_HASHERS=profile(name)):
+                for other in encoded.values():
+                    self.assertTrue(check_password('testpass', other))
+                    self.assertFalse(check_password('wrongpass', other))
+
+    def test_rehash_on_login(self):
+        """
+        Test signing in upgrades the hash to the profile's hasher and costs
+        :return:
+        """
+        with override_settings(PASSWORD_HASHERS=profile('pbkdf2')):
+            user = get_user_model().objects.create_user(
+                email='testhasher@test.com', password='testpass'
+            )
+        payload = {'email': 'testhasher@test.com', 'password': 'testpass'}
+
+        with override_settings(PASSWORD_HASHERS=profile('argon2')):
+            res = self.client.post(TOKEN_URL, payload)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('argon2$argon2i$v=19$'
+                                                 'm=256,t=1'))
+
+        with override_settings(PASSWORD_HASHERS=profile('argon2'),
+                               PASSWORD_ARGON2_TIME_COST=2):
+            res = self.client.post(TOKEN_URL, payload)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        user.refresh_from_db()
+        self.assertIn('m=256,t=2', user.password)
+
+
+@override_settings(PASSWORD_HASHERS=profile('pbkdf2'), PASSWORD_HASH_WORKERS=1,
+                   **FAST_COSTS)
+class HashingPoolTests(TestCase):
+    """
+    Test hashing in the process pool
+    """
+    def tearDown(self):
+        hashers.shutdown_pool()
+
+    def test_hash_in_pool(self):
+        """
+        Test passwords are hashed and checked by the pool processes
+        :return:
+        """
+        encoded = make_password('testpass')
+
+        self.assertIsNotNone(hashers._pool)
+        self.assertTrue(encoded.startswith('pbkdf2_sha256$1000$'))
+        self.assertTrue(check_password('testpass', encoded))
+        self.assertFalse(check_password('wrongpass', encoded))
+
+    def test_workers_hash_inline(self):
+        """
+        Test pool processes do not submit to a pool of their own
+        :return:
+        """
+        pool = hashers.get_pool()
+
+        self.assertIsNone(pool.submit(hashers.get_pool).result())
+
+    def test_broken_pool_replaced(self):
+        """
+        Test a dead hashing process does not fail later sign ins
+        :return:
+        """
+        pool = hashers.get_pool()
+        with self.assertRaises(BrokenProcessPool):
+            pool.submit(os._exit, 1).result()
+
+        encoded = make_password('testpass')
+
+        self.assertTrue(check_password('testpass', encoded))
+        self.assertIsNot(hashers.get_pool(), pool)
+        self.assertTrue(check_password('testpass', encoded))
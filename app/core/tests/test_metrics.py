@@ -0,0 +1,232 @@
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core import metrics
+from core.models import Recipe
+
+RECIPES_URL = reverse('recipe:recipe-list')
+METRICS_URL = reverse('metrics')
+
+
+class RegistryTests(TestCase):
+    """
+    Test the Prometheus exposition of the metrics registry
+    """
+    def test_exposition(self):
+        """
+        Test counters and histograms are written in the text format
+        :return:
+        """
+        registry = metrics.Registry()
+        request_metrics = metrics.RequestMetrics()
+        request_metrics.total = 0.02
+        request_metrics.queries = 3
+        request_metrics.db = 0.005
+        request_metrics.phases = {'serialize': 0.004, 'render': 0.001}
+
+        registry.record(('RecipeViewSet', 'list', 'GET', 200),
+                        request_metrics, 2000)
+        registry.record(('RecipeViewSet', 'list', 'GET', 200),
+                        request_metrics, 100)
+        text = registry.exposition()
+
+        labels = 'view="RecipeViewSet",action="list",method="GET",' \
+                 'status="200"'
+        self.assertIn('# TYPE api_requests_total counter', text)
+        self.assertIn(f'api_requests_total{{{labels}}} 2\n', text)
+        self.assertIn(f'api_db_queries_total{{{labels}}} 6\n', text)
+        self.assertIn(
+            f'api_request_duration_seconds_bucket{{{labels},le="0.01"}} 0\n',
+            text
+        )
+        self.assertIn(
+            f'api_request_duration_seconds_bucket{{{labels},le="0.025"}} 2\n',
+            text
+        )
+        self.assertIn(
+            f'api_response_size_bytes_bucket{{{labels},le="256"}} 1\n', text
+        )
+        self.assertIn(
+            f'api_response_size_bytes_bucket{{{labels},le="+Inf"}} 2\n', text
+        )
+        self.assertIn(f'api_response_size_bytes_sum{{{labels}}} 2100\n', text)
+
+    def test_timer_excludes_db_time(self):
+        """
+        Test phase timers leave out the database time spent inside them
+        :return:
+        """
+        request_metrics = metrics.RequestMetrics()
+        metrics.activate(request_metrics)
+        try:
+            with metrics.timer('serialize'):
+                request_metrics.db += 10
+        finally:
+            metrics.deactivate()
+
+        self.assertLess(request_metrics.phases['serialize'], 0)
+
+        with metrics.timer('serialize'):
+            pass
+
+
+class MultiprocessTests(TestCase):
+    """
+    Test adding up the metrics written by several workers
+    """
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.labels = ('RecipeViewSet', 'list', 'GET', 200)
+
+    def worker(self, pid, requests):
+        """
+        Write the snapshot of a worker that served the given requests
+        :param pid:
+        :param requests:
+        :return:
+        """
+        registry = metrics.Registry()
+        request_metrics = metrics.RequestMetrics()
+        request_metrics.total = 0.02
+        for _ in range(requests):
+            registry.record(self.labels, request_metrics, 100)
+        metrics._write(os.path.join(self.directory, f'{pid}-a.json'),
+                       registry.snapshot())
+
+    def requests(self, registry):
+        labels = tuple(zip(metrics.Registry.labelnames, self.labels))
+        return registry.requests.values[labels], \
+            registry.duration.values[labels][2]
+
+    def test_collect_and_archive(self):
+        """
+        Test the workers' metrics are added up, including those of exited
+        workers once archived
+        :return:
+        """
+        self.worker(101, 2)
+        self.worker(102, 3)
+
+        self.assertEqual(
+            self.requests(metrics.collect(self.directory)), (5, 5)
+        )
+
+        metrics.archive(self.directory, 101)
+        self.worker(103, 1)
+
+        self.assertNotIn('101-a.json', os.listdir(self.directory))
+        self.assertEqual(
+            self.requests(metrics.collect(self.directory)), (6, 6)
+        )
+
+    def test_archived_snapshot_counted_once(self):
+        """
+        Test a snapshot still present next to the archive holding it is
+        not counted twice
+        :return:
+        """
+        self.worker(101, 2)
+        metrics.archive(self.directory, 101)
+        self.worker(101, 2)
+
+        self.assertEqual(
+            self.requests(metrics.collect(self.directory)), (2, 2)
+        )
+
+    def test_metrics_endpoint_adds_up_workers(self):
+        """
+        Test the endpoint serves the metrics of every worker
+        :return:
+        """
+        self.worker(101, 4)
+        metrics.registry.clear()
+        client = APIClient()
+
+        with override_settings(METRICS_DIR=self.directory):
+            res = client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(b'view="RecipeViewSet",action="list",method="GET",'
+                      b'status="200"} 4\n', res.content)
+
+
+class InstrumentationMiddlewareTests(TestCase):
+    """
+    Test the request instrumentation middleware
+    """
+    def setUp(self):
+        metrics.registry.clear()
+        self.user = get_user_model().objects.create_user(
+            email='testmetrics@test.com',
+            password='testpass'
+        )
+        Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=5, price=5.00
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_api_request_recorded(self):
+        """
+        Test an API request is recorded by view and action
+        :return:
+        """
+        res = self.client.get(RECIPES_URL)
+
+        timing = res['Server-Timing']
+        self.assertRegex(timing, r'^db;dur=[\d.]+;desc="\d+ queries"')
+        self.assertIn('serialize;dur=', timing)
+        self.assertIn('render;dur=', timing)
+        self.assertIn('total;dur=', timing)
+
+        labels = (('view', 'RecipeViewSet'), ('action', 'list'),
+                  ('method', 'GET'), ('status', 200))
+        self.assertEqual(metrics.registry.requests.values[labels], 1)
+        self.assertGreater(metrics.registry.db_queries.values[labels], 0)
+        self.assertEqual(
+            metrics.registry.response_size.values[labels][1],
+            len(res.content)
+        )
+
+    def test_other_paths_not_recorded(self):
+        """
+        Test paths outside METRICS_PATH_PREFIXES are not instrumented
+        :return:
+        """
+        res = self.client.get('/admin/login/')
+
+        self.assertNotIn('Server-Timing', res)
+        self.assertEqual(metrics.registry.requests.values, {})
+
+    @override_settings(METRICS_SERVER_TIMING=False)
+    def test_server_timing_disabled(self):
+        """
+        Test the Server-Timing header can be turned off
+        :return:
+        """
+        res = self.client.get(RECIPES_URL)
+
+        self.assertNotIn('Server-Timing', res)
+        self.assertEqual(len(metrics.registry.requests.values), 1)
+
+    def test_metrics_endpoint(self):
+        """
+        Test the metrics are served to allowed addresses only
+        :return:
+        """
+        self.client.get(RECIPES_URL)
+
+        res = self.client.get(METRICS_URL)
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res['Content-Type'].startswith('text/plain'))
+        self.assertIn(b'view="RecipeViewSet",action="list"', res.content)
+
+        res = self.client.get(METRICS_URL, REMOTE_ADDR='10.1.2.3')
+        self.assertEqual(res.status_code, 404)
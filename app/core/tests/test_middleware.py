@@ -0,0 +1,198 @@
+import gzip
+import os
+import tempfile
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import Http404, HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import resolve
+
+from core import middleware
+from core.middleware import CompressionMiddleware, negotiate_coding
+from core.views import serve_media
+
+
+class FakeBrotli:
+    MODE_TEXT = 1
+
+    @staticmethod
+    def compress(content, mode, quality):
+        return b'br:' + content[:10]
+
+
+@override_settings(COMPRESSION_MIN_SIZE=200, COMPRESSION_GZIP_LEVEL=6)
+class CompressionMiddlewareTests(TestCase):
+    """
+    Test the response compression middleware
+    """
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.body = b'[' + b','.join(
+            b'{"id": %d, "title": "Sample recipe"}' % i for i in range(50)
+        ) + b']'
+
+    def process(self, response, accept_encoding='gzip, deflate'):
+        request = self.factory.get(
+            '/api/recipe/recipes/', HTTP_ACCEPT_ENCODING=accept_encoding
+        )
+        return CompressionMiddleware(lambda r: response)(request)
+
+    def json_response(self, body=None):
+        return HttpResponse(
+            self.body if body is None else body,
+            content_type='application/json'
+        )
+
+    def test_gzip_json(self):
+        """
+        Test large JSON responses are gzipped
+        :return:
+        """
+        response = self.json_response()
+        response['ETag'] = '"abc"'
+        response = self.process(response)
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), self.body)
+        self.assertEqual(response['Content-Length'],
+                         str(len(response.content)))
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(response['ETag'], 'W/"abc"')
+
+    def test_small_response_not_compressed(self):
+        """
+        Test responses below the size threshold are left alone
+        :return:
+        """
+        response = self.process(self.json_response(b'{"id": 1}'))
+
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response.content, b'{"id": 1}')
+
+    def test_not_accepted(self):
+        """
+        Test nothing is compressed without a matching Accept-Encoding
+        :return:
+        """
+        for accept_encoding in ('', 'identity', 'gzip;q=0', 'deflate'):
+            response = self.process(self.json_response(), accept_encoding)
+
+            self.assertFalse(response.has_header('Content-Encoding'))
+            self.assertEqual(response.content, self.body)
+            self.assertEqual(response['Vary'], 'Accept-Encoding')
+
+    def test_binary_content_not_compressed(self):
+        """
+        Test content types outside COMPRESSION_CONTENT_TYPES are left alone
+        :return:
+        """
+        response = HttpResponse(self.body, content_type='image/jpeg')
+        response = self.process(response)
+
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    @patch.object(middleware, 'brotli', FakeBrotli)
+    def test_negotiate_brotli(self):
+        """
+        Test brotli is preferred when installed unless gzip ranks higher
+        :return:
+        """
+        self.assertEqual(negotiate_coding('gzip, deflate, br')[0], 'br')
+        self.assertEqual(negotiate_coding('br;q=0.5, gzip')[0], 'gzip')
+        self.assertEqual(negotiate_coding('*')[0], 'br')
+        self.assertIsNone(negotiate_coding('br;q=0, gzip;q=0'))
+
+        response = self.process(self.json_response(), 'gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(response.content, b'br:' + self.body[:10])
+
+    @patch.object(middleware, 'brotli', None)
+    def test_brotli_not_installed(self):
+        """
+        Test gzip is used when brotli is not installed
+        :return:
+        """
+        self.assertEqual(negotiate_coding('br, gzip')[0], 'gzip')
+        self.assertIsNone(negotiate_coding('br'))
+
+
+@override_settings(MEDIA_CACHE_MAX_AGE=3600)
+class ServeMediaTests(TestCase):
+    """
+    Test serving uploaded media files
+    """
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.media_root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.media_root, 'uploads/recipe'))
+        self.path = f'uploads/recipe/{"a" * 64}.jpg'
+        for path in (self.path, 'uploads/recipe/image.jpg'):
+            with open(os.path.join(self.media_root, path), 'wb') as f:
+                f.write(b'\xff\xd8image')
+
+    def serve(self, path, **headers):
+        request = self.factory.get('/media/' + path, **headers)
+        return serve_media(request, path, document_root=self.media_root)
+
+    def test_cache_headers(self):
+        """
+        Test media files are served with an ETag and long-lived caching
+        :return:
+        """
+        response = self.serve(self.path)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content),
+                         b'\xff\xd8image')
+        self.assertTrue(response['ETag'].startswith('"'))
+        self.assertIn('Last-Modified', response)
+        for directive in ('public', 'max-age=3600', 'immutable'):
+            self.assertIn(directive, response['Cache-Control'])
+
+    def test_cache_headers_not_content_addressed(self):
+        """
+        Test media files not named after their content are revalidated
+        :return:
+        """
+        response = self.serve('uploads/recipe/image.jpg')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertNotIn('immutable', response['Cache-Control'])
+        self.assertNotIn('max-age', response['Cache-Control'])
+
+    def test_if_none_match(self):
+        """
+        Test a matching If-None-Match is answered with 304
+        :return:
+        """
+        etag = self.serve(self.path)['ETag']
+
+        response = self.serve(self.path, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertIn('immutable', response['Cache-Control'])
+
+    def test_missing_file(self):
+        """
+        Test missing files are 404s and paths outside MEDIA_ROOT rejected
+        :return:
+        """
+        with self.assertRaises(Http404):
+            self.serve('uploads/recipe/missing.jpg')
+        with self.assertRaises(SuspiciousFileOperation):
+            self.serve('../etc/passwd')
+
+    def test_media_route_without_debug(self):
+        """
+        Test media files are routed to serve_media when DEBUG is off
+        :return:
+        """
+        match = resolve('/media/uploads/recipe/example.jpg')
+
+        self.assertFalse(settings.DEBUG)
+        self.assertEqual(match.func, serve_media)
+        self.assertEqual(match.kwargs['path'], 'uploads/recipe/example.jpg')
@@ -0,0 +1,79 @@
+import datetime
+import io
+from collections import OrderedDict
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.test import TestCase
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+
+from core.parsers import FastJSONParser
+from core.renderers import FastJSONRenderer
+
+
+class FastJSONTests(TestCase):
+    """
+    Test the fast JSON renderer and parser
+    """
+    def setUp(self):
+        self.data = [OrderedDict([
+            ('id', 1),
+            ('title', 'Crème brûlée \u2028'),
+            ('price', Decimal('5.50')),
+            ('label', _('Personal Info')),
+            ('created', datetime.datetime(
+                2021, 1, 29, 7, 53, 1, 123456, tzinfo=timezone.utc
+            )),
+            ('day', datetime.date(2021, 1, 29)),
+            ('tags', [1, 2]),
+            (3, None),
+        ])]
+
+    def test_render_matches_json_renderer(self):
+        """
+        Test that the output is identical to DRF's JSONRenderer
+        :return:
+        """
+        self.assertEqual(
+            FastJSONRenderer().render(self.data),
+            JSONRenderer().render(self.data)
+        )
+
+    def test_render_without_orjson(self):
+        """
+        Test the stdlib fallback when orjson is not installed
+        :return:
+        """
+        with patch('core.renderers.orjson', None):
+            ret = FastJSONRenderer().render(self.data)
+
+        self.assertEqual(ret, JSONRenderer().render(self.data))
+
+    def test_render_indented_falls_back(self):
+        """
+        Test that indented output is rendered by JSONRenderer
+        :return:
+        """
+        media_type = 'application/json; indent=4'
+
+        self.assertEqual(
+            FastJSONRenderer().render(self.data, media_type),
+            JSONRenderer().render(self.data, media_type)
+        )
+
+    def test_parse(self):
+        """
+        Test parsing JSON and rejecting invalid JSON
+        :return:
+        """
+        parser = FastJSONParser()
+
+        self.assertEqual(
+            parser.parse(io.BytesIO(b'{"name": "Vegan", "ids": [1]}')),
+            {'name': 'Vegan', 'ids': [1]}
+        )
+        with self.assertRaises(ParseError):
+            parser.parse(io.BytesIO(b'{"name": '))
@@ -0,0 +1,27 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryCountMixin:
+    """
+    TestCase mixin asserting how many queries an endpoint runs
+    """
+
+    def assertEndpointQueries(self, num, url, data=None):
+        """
+        Assert that a GET on the url runs exactly num queries
+        :param num:
+        :param url:
+        :param data:
+        :return:
+        """
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(url, data)
+
+        executed = len(ctx.captured_queries)
+        queries = '\n'.join(q['sql'] for q in ctx.captured_queries)
+        self.assertEqual(
+            executed, num,
+            f'{url} ran {executed} queries, expected {num}:\n{queries}'
+        )
+        return res
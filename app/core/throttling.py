@@ -0,0 +1,153 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class SlidingWindowStore:
+    """
+    Thread safe in-process LRU store of sliding window request counters
+
+    Each key keeps the counts of the current and the previous fixed window;
+    the previous count is weighted by how much of it still overlaps the
+    sliding window, so memory per key stays constant whatever the rate.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key, limit, duration, now=None):
+        """
+        Count a request on key unless it would exceed limit requests per
+        duration seconds
+        :param key:
+        :param limit:
+        :param duration:
+        :param now:
+        :return: (allowed, seconds to wait when not allowed)
+        """
+        now = time.monotonic() if now is None else now
+        window = now // duration * duration
+        with self._lock:
+            start, previous, current = self._entries.get(key, (window, 0, 0))
+            if start != window:
+                previous = current if start == window - duration else 0
+                start, current = window, 0
+            overlap = 1 - (now - window) / duration
+            if previous * overlap + current + 1 > limit:
+                self._entries.move_to_end(key)
+                # Wait until the previous window has decayed enough, or
+                # until the next window when the current one is full
+                if current + 1 > limit or not previous:
+                    wait = window + duration - now
+                else:
+                    wait = window + duration * (
+                        1 - (limit - current - 1) / previous
+                    ) - now
+                return False, max(wait, 0)
+            self._entries[key] = (start, previous, current + 1)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return True, 0
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+throttle_store = SlidingWindowStore(max_size=settings.THROTTLE_STORE_MAX_SIZE)
+
+
+class SlidingWindowThrottle(SimpleRateThrottle):
+    """
+    Throttle a view by the rate of REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']
+    named '<view.throttle_scope>_<kind>', counted per identity in
+    throttle_store
+
+    Views without throttle_scope, or without a rate for this kind, are not
+    throttled. Throttles run before the view handler, so rejected token
+    and sign up requests never reach password hashing.
+    """
+    kind = None
+    store = throttle_store
+
+    def __init__(self):
+        # The rate depends on the view, see allow_request
+        self.wait_seconds = None
+
+    def allow_request(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        if not scope:
+            return True
+        self.scope = f'{scope}_{self.kind}'
+        self.rate = self.get_rate()
+        if self.rate is None:
+            return True
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+
+        ident = self.get_ident_value(request)
+        if not ident:
+            return True
+        allowed, self.wait_seconds = self.store.hit(
+            self.cache_format % {'scope': self.scope, 'ident': ident},
+            self.num_requests, self.duration
+        )
+        return allowed
+
+    def get_rate(self):
+        return self.THROTTLE_RATES.get(self.scope)
+
+    def get_ident_value(self, request):
+        """
+        Return what the requests are counted by, or None to not throttle
+        :param request:
+        :return:
+        """
+        raise NotImplementedError
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class IPRateThrottle(SlidingWindowThrottle):
+    """
+    Throttle by client IP address, see REST_FRAMEWORK['NUM_PROXIES']
+    """
+    kind = 'ip'
+
+    def get_ident_value(self, request):
+        return self.get_ident(request)
+
+
+class EmailRateThrottle(SlidingWindowThrottle):
+    """
+    Throttle by the email the request body signs in or signs up with
+    """
+    kind = 'email'
+
+    def get_ident_value(self, request):
+        try:
+            email = request.data.get('email')
+        except AttributeError:
+            return None
+        if not isinstance(email, str):
+            return None
+        return email.strip().lower()
+
+
+class TokenRateThrottle(SlidingWindowThrottle):
+    """
+    Throttle by the authentication token of the request
+    """
+    kind = 'token'
+
+    def get_ident_value(self, request):
+        return getattr(request.auth, 'key', None)
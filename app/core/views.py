@@ -0,0 +1,99 @@
+import os
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import patch_cache_control
+from django.views import static
+from django.views.decorators.http import condition
+
+from core import metrics
+
+
+def _stat(path, document_root):
+    """
+    Return the os.stat of a file below document_root, or None
+    :param path:
+    :param document_root:
+    :return:
+    """
+    try:
+        return os.stat(safe_join(document_root, path))
+    except (OSError, SuspiciousFileOperation):
+        return None
+
+
+def media_etag(request, path, document_root=None, **kwargs):
+    """
+    Return an ETag from the modification time and size of a media file
+    :param request:
+    :param path:
+    :param document_root:
+    :return:
+    """
+    stat = _stat(path, document_root)
+    if stat is None:
+        return None
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+_conditional_serve = condition(etag_func=media_etag)(static.serve)
+
+# Content addressed recipe images and their variants, see
+# core.models.recipe_image_content_path and recipe.images.variant_name
+IMMUTABLE_MEDIA_RE = re.compile(r'^uploads/recipe/[0-9a-f]{64}(_\w+)?\.\w+$')
+
+
+def serve_media(request, path, document_root=None, show_indexes=False):
+    """
+    Serve an uploaded file like django.views.static.serve, with an ETag
+    and a Cache-Control header
+
+    Content addressed images are stored in their final form and named
+    after their content, so clients and proxies can keep them for
+    settings.MEDIA_CACHE_MAX_AGE seconds. Any other file must be
+    revalidated with its ETag.
+    :param request:
+    :param path:
+    :param document_root:
+    :param show_indexes:
+    :return:
+    """
+    response = _conditional_serve(
+        request, path, document_root=document_root,
+        show_indexes=show_indexes
+    )
+    if response.status_code not in (200, 304):
+        return response
+    if IMMUTABLE_MEDIA_RE.match(path):
+        patch_cache_control(
+            response, public=True, max_age=settings.MEDIA_CACHE_MAX_AGE,
+            immutable=True
+        )
+    else:
+        patch_cache_control(response, public=True, no_cache=True)
+    return response
+
+
+def serve_metrics(request):
+    """
+    Return the request metrics in the Prometheus text format, to clients
+    in settings.METRICS_ALLOWED_IPS only
+
+    With settings.METRICS_DIR set these add up every worker of the server,
+    otherwise they are the metrics of this process.
+    :param request:
+    :return:
+    """
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        raise Http404
+    registry = metrics.registry
+    if settings.METRICS_DIR:
+        metrics.flush(settings.METRICS_DIR)
+        registry = metrics.collect(settings.METRICS_DIR)
+    return HttpResponse(
+        registry.exposition(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
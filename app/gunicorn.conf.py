@@ -0,0 +1,82 @@
+"""
+Gunicorn configuration of the production server
+
+    gunicorn -c gunicorn.conf.py app.wsgi:application
+
+Every setting is read from the environment. SIGHUP reloads the
+configuration and replaces the workers gracefully, SIGTERM stops the
+server after letting in-flight requests finish within GUNICORN_GRACEFUL.
+Set GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker and serve
+app.asgi:application to run under ASGI, where request bodies and responses
+are handled by the event loop and views by ASGI_THREADS threads.
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+
+# Threaded sync workers: requests waiting on Postgres or slow clients
+# release the GIL, so a few threads per process raise throughput without
+# the memory of extra processes
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+workers = int(os.environ.get(
+    'WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1
+))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+# Tell the workers how many processes serve the app, see
+# RECIPE_CACHE_SINGLE_PROCESS
+os.environ['WEB_CONCURRENCY'] = str(workers)
+# Scrapes of /internal/metrics/ reach an arbitrary worker through the
+# shared socket, so workers write their metrics to a directory that the
+# serving worker adds up, see METRICS_DIR
+if not os.environ.get('METRICS_DIR'):
+    os.environ['METRICS_DIR'] = tempfile.mkdtemp(prefix='metrics-')
+    # Survives the configuration reload on SIGHUP, unlike a global
+    os.environ['METRICS_DIR_TEMPORARY'] = '1'
+
+# Each worker or ASGI thread keeps one persistent database connection
+# (CONN_MAX_AGE), so workers * threads must stay below max_connections
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+# Recycle workers now and then to bound memory growth, with jitter so they
+# do not all restart at once
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 5000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 500))
+
+# Workers import the app themselves so that SIGHUP picks up new code
+preload_app = False
+reload = os.environ.get('GUNICORN_RELOAD', '0') == '1'
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+forwarded_allow_ips = os.environ.get('FORWARDED_ALLOW_IPS', '127.0.0.1')
+
+
+def worker_exit(server, worker):
+    """
+    Write the last metrics of an exiting worker
+    """
+    from core import metrics
+    metrics.flush(os.environ['METRICS_DIR'])
+
+
+def child_exit(server, worker):
+    """
+    Keep the counts of an exited worker in the metrics archive, so that
+    counters do not go back when workers are recycled
+    """
+    from core import metrics
+    metrics.archive(os.environ['METRICS_DIR'], worker.pid)
+
+
+def on_exit(server):
+    """
+    Remove the metrics directory created for this server
+    """
+    if os.environ.get('METRICS_DIR_TEMPORARY') == '1':
+        shutil.rmtree(os.environ['METRICS_DIR'], ignore_errors=True)
@@ -0,0 +1,125 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+
+from core import metrics
+
+
+def get_cache():
+    """
+    Return the cache backend configured for the recipe API
+    :return:
+    """
+    return caches[settings.RECIPE_CACHE_ALIAS]
+
+
+def is_shared():
+    """
+    Return whether every process serving the API sees the same cache, a
+    local memory cache is only shared by the threads of one process
+    :return:
+    """
+    return settings.RECIPE_CACHE_SINGLE_PROCESS or \
+        not isinstance(get_cache(), LocMemCache)
+
+
+def _version_key(name, user_id):
+    return f'recipe:version:{name}:{user_id}'
+
+
+def _initial_version():
+    # Start from the clock so versions never repeat after a cache flush,
+    # they are also used as ETag validators
+    return int(time.time() * 1000)
+
+
+def get_version(name, user_id):
+    """
+    Return the current version of a user's objects of the given name
+    :param name:
+    :param user_id:
+    :return:
+    """
+    cache = get_cache()
+    key = _version_key(name, user_id)
+    version = cache.get(key)
+    if version is None:
+        version = _initial_version()
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_version(user_id, *names):
+    """
+    Invalidate every cached entry of the user for the given names
+    :param user_id:
+    :param names:
+    :return:
+    """
+    cache = get_cache()
+    for name in names:
+        key = _version_key(name, user_id)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _initial_version(), timeout=None)
+
+
+def list_cache_key(name, user_id, assigned_only):
+    """
+    Return the cache key of a user's list, bound to the current version
+    :param name:
+    :param user_id:
+    :param assigned_only:
+    :return:
+    """
+    version = get_version(name, user_id)
+    return f'recipe:list:{name}:{user_id}:{int(assigned_only)}:v{version}'
+
+
+def get_or_build(key, build, name):
+    """
+    Return the cached value for key, building and storing it on a miss
+    :param key:
+    :param build: callable returning the value to cache
+    :param name: list name the hit or miss is counted under in the
+    api_list_cache_lookups_total metric
+    :return:
+    """
+    if not is_shared():
+        # Another worker's writes would not invalidate this copy
+        return build()
+    cache = get_cache()
+    value = cache.get(key)
+    metrics.registry.record_cache_lookup(name, value is not None)
+    if value is None:
+        value = build()
+        cache.set(key, value, settings.RECIPE_CACHE_TIMEOUT)
+    return value
+
+
+def stats():
+    """
+    Return the hit/miss counts of this process, over all lists
+    :return:
+    """
+    counts = {'hits': 0, 'misses': 0}
+    registry = metrics.registry
+    with registry.lock:
+        for labels, value in registry.list_cache.values.items():
+            counts['hits' if dict(labels)['result'] == 'hit'
+                   else 'misses'] += value
+    return counts
+
+
+def reset_stats():
+    """
+    Reset the hit/miss counts
+    :return:
+    """
+    registry = metrics.registry
+    with registry.lock:
+        registry.list_cache.values.clear()
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+
+from recipe import cache
+
+
+@register()
+def check_cache_shared(app_configs, **kwargs):
+    """
+    Warn when several processes serve the API with a local memory cache,
+    which disables the list cache and the ETags
+    :param app_configs:
+    :param kwargs:
+    :return:
+    """
+    if cache.is_shared():
+        return []
+    return [Warning(
+        f'RECIPE_CACHE_ALIAS {settings.RECIPE_CACHE_ALIAS!r} is a local '
+        f'memory cache but several processes serve the API.',
+        hint='Set CACHE_BACKEND and CACHE_LOCATION to a shared cache '
+             '(e.g. memcached) to enable the list cache and the ETags.',
+        id='recipe.W001',
+    )]
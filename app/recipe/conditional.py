@@ -0,0 +1,54 @@
+import hashlib
+from functools import wraps
+
+from django.http import HttpResponseNotModified
+from django.utils.cache import get_conditional_response
+
+from recipe import cache
+
+
+def get_etag(view, request):
+    """
+    Build a strong ETag from the user, their versions of
+    view.etag_versions, the full path and the negotiated media type
+    :param view:
+    :param request:
+    :return:
+    """
+    versions = [
+        f'{name}={cache.get_version(name, request.user.id)}'
+        for name in view.etag_versions
+    ]
+    raw = '|'.join([
+        str(request.user.id),
+        request.get_full_path(),
+        request.accepted_media_type or '',
+        *versions,
+    ])
+    return '"%s"' % hashlib.md5(raw.encode()).hexdigest()
+
+
+def conditional_get(view_method):
+    """
+    Answer a matching If-None-Match with 304 before the wrapped handler
+    runs, so no serialization or queryset work is done
+
+    No ETag is sent when the versions are not shared by all the workers,
+    a write on one worker would not change the ETags of the others.
+    :param view_method:
+    :return:
+    """
+    @wraps(view_method)
+    def wrapper(view, request, *args, **kwargs):
+        if not cache.is_shared():
+            return view_method(view, request, *args, **kwargs)
+        etag = get_etag(view, request)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = view_method(view, request, *args, **kwargs)
+        if response.status_code == 200 or \
+                isinstance(response, HttpResponseNotModified):
+            response['ETag'] = etag
+        return response
+
+    return wrapper
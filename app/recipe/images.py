@@ -0,0 +1,193 @@
+import hashlib
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+
+from core.models import RECIPE_IMAGE_UPLOAD_DIR, Recipe, \
+    recipe_image_content_path
+from recipe import cache
+
+
+logger = logging.getLogger(__name__)
+
+# Variant name -> (Recipe field, bounding box, format, extension, quality)
+VARIANTS = {
+    'thumb': ('image_thumb', (200, 200), 'JPEG', 'jpg', 80),
+    'medium': ('image_medium', (800, 800), 'JPEG', 'jpg', 85),
+    'webp': ('image_webp', (1600, 1600), 'WEBP', 'webp', 80),
+}
+
+EXIF_ORIENTATION = 0x0112
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    Return the process wide image worker pool, created on first use
+    :return:
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.RECIPE_IMAGE_WORKERS,
+                thread_name_prefix='recipe-image',
+            )
+    return _executor
+
+
+def variant_name(image_name, variant):
+    """
+    Return the storage name of a variant of the original image
+    :param image_name:
+    :param variant:
+    :return:
+    """
+    root, _ = os.path.splitext(image_name)
+    ext = VARIANTS[variant][3]
+    return f'{root}_{variant}.{ext}'
+
+
+def variant_urls(names, request=None):
+    """
+    Return variant -> URL of a recipe's stored variants, None until every
+    variant has been generated
+    :param names: Recipe variant field name -> stored file name
+    :param request: used to build absolute URLs when given
+    :return:
+    """
+    storage = Recipe._meta.get_field('image').storage
+    urls = {}
+    for variant, (field, *spec) in VARIANTS.items():
+        if not names.get(field):
+            return None
+        url = storage.url(names[field])
+        urls[variant] = request.build_absolute_uri(url) \
+            if request is not None else url
+    return urls
+
+
+def _encode(image, fmt, quality):
+    buffer = io.BytesIO()
+    # Nothing but the pixels is written, this drops EXIF and other metadata
+    image.save(buffer, format=fmt, quality=quality, optimize=True)
+    return ContentFile(buffer.getvalue())
+
+
+def has_metadata(upload):
+    """
+    Return whether the uploaded image carries EXIF data, from its headers
+    only without decoding the pixels
+    :param upload:
+    :return:
+    """
+    try:
+        with Image.open(upload) as image:
+            return 'exif' in image.info
+    finally:
+        upload.seek(0)
+
+
+def _strip_metadata(image):
+    """
+    Return the original image re-encoded without its EXIF data, keeping
+    the JPEG quantization tables and the colour profile
+    :param image:
+    :return:
+    """
+    upright, quality = image, 'keep' if image.format == 'JPEG' else 90
+    # A rotated image is a new image, its source tables no longer apply
+    if image.getexif().get(EXIF_ORIENTATION, 1) != 1:
+        upright, quality = ImageOps.exif_transpose(image), 90
+    buffer = io.BytesIO()
+    upright.save(buffer, format=image.format, quality=quality,
+                 icc_profile=image.info.get('icc_profile'))
+    return upright, buffer.getvalue()
+
+
+def generate_variants(recipe_id):
+    """
+    Decode the recipe image once and store every variant of it
+
+    An original uploaded with EXIF data is stored without it under its own
+    content hash, and the recipe is pointed at it.
+    :param recipe_id:
+    :return:
+    """
+    recipe = Recipe.objects.filter(pk=recipe_id).first()
+    if recipe is None or not recipe.image:
+        return
+
+    storage = recipe.image.storage
+    name = original = recipe.image.name
+    with storage.open(name, 'rb') as f:
+        image = Image.open(f)
+        image.load()
+        if 'exif' in image.info:
+            image, data = _strip_metadata(image)
+            _, ext = os.path.splitext(name)
+            original = recipe_image_content_path(
+                hashlib.sha256(data).hexdigest(), ext.lstrip('.')
+            )
+            if not storage.exists(original):
+                original = storage.save(original, ContentFile(data))
+
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+
+    updates = {'image': original}
+    for variant, (field, size, vfmt, _, quality) in VARIANTS.items():
+        updates[field] = variant_name(original, variant)
+        # Variants of a content addressed image are shared, keep them
+        if storage.exists(updates[field]):
+            continue
+        resized = image.copy()
+        resized.thumbnail(size, Image.LANCZOS)
+        updates[field] = storage.save(
+            updates[field], _encode(resized, vfmt, quality)
+        )
+
+    # The recipe may have been given another image meanwhile
+    updated = Recipe.objects.filter(pk=recipe_id, image=name).update(
+        **updates
+    )
+    # Uploads with EXIF data are stored once per upload, see
+    # RecipeImageSerializer.update, nothing else refers to this one
+    if original != name and name.startswith(RECIPE_IMAGE_UPLOAD_DIR):
+        storage.delete(name)
+    if updated:
+        cache.bump_version(recipe.user_id, 'recipe')
+
+
+def _run(recipe_id):
+    try:
+        generate_variants(recipe_id)
+    except Exception:
+        logger.exception('Generating image variants of recipe %s failed',
+                         recipe_id)
+    finally:
+        connections.close_all()
+
+
+def schedule_variants(recipe):
+    """
+    Generate the recipe image variants in the worker pool once the
+    current transaction commits, or inline if RECIPE_IMAGE_ASYNC is off
+    :param recipe:
+    :return:
+    """
+    if not settings.RECIPE_IMAGE_ASYNC:
+        generate_variants(recipe.id)
+        return
+    transaction.on_commit(
+        lambda: get_executor().submit(_run, recipe.id)
+    )
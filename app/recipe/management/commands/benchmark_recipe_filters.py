@@ -0,0 +1,59 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Recipe
+
+
+class Command(BaseCommand):
+    """
+    Django command printing the plans and timings of the recipe range
+    filters and orderings for one user
+    """
+    help = 'Explain and time the recipe range filter queries of a user'
+
+    def add_arguments(self, parser):
+        parser.add_argument('email')
+        parser.add_argument('--iterations', type=int, default=20)
+
+    def scenarios(self, user):
+        """
+        Return (name, queryset) pairs shaped like the RecipeViewSet
+        filters, the *_only ones select indexed columns only so they can
+        be answered from the composite indexes alone
+        :param user:
+        :return:
+        """
+        recipes = Recipe.objects.filter(user=user)
+        quick = recipes.filter(time_minutes__lte=30)
+        cheap = recipes.filter(price__gte=1, price__lte=10)
+        return (
+            ('max_time=30&ordering=time_minutes',
+             quick.order_by('time_minutes', '-id')),
+            ('max_time=30 index only',
+             quick.order_by('time_minutes').values_list('time_minutes')),
+            ('min_price=1&max_price=10&ordering=-price',
+             cheap.order_by('-price', '-id')),
+            ('min_price=1&max_price=10 index only',
+             cheap.order_by('-price').values_list('price')),
+        )
+
+    def handle(self, *args, **options):
+        user = get_user_model().objects.filter(email=options['email']).first()
+        if user is None:
+            raise CommandError(f'No user with email {options["email"]}')
+
+        for name, queryset in self.scenarios(user):
+            timings = []
+            for _ in range(options['iterations']):
+                start = time.perf_counter()
+                list(queryset.all())
+                timings.append((time.perf_counter() - start) * 1000)
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(queryset.explain())
+            self.stdout.write(
+                f'median {statistics.median(timings):.2f} ms, '
+                f'max {max(timings):.2f} ms over {len(timings)} runs\n'
+            )
@@ -0,0 +1,49 @@
+import timeit
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Prefetch
+
+from core.models import Ingredient, Recipe, Tag
+from recipe.readers import RecipeReader
+from recipe.serializers import RecipeSerializer
+
+
+class Command(BaseCommand):
+    """
+    Django command comparing RecipeSerializer with RecipeReader on the
+    recipes of one user
+    """
+    help = "Benchmark serializing a user's recipe list"
+
+    def add_arguments(self, parser):
+        parser.add_argument('email')
+        parser.add_argument('--iterations', type=int, default=20)
+
+    def handle(self, *args, **options):
+        user = get_user_model().objects.filter(email=options['email']).first()
+        if user is None:
+            raise CommandError(f'No user with email {options["email"]}')
+        queryset = Recipe.objects.filter(user=user).order_by('-id')
+        iterations = options['iterations']
+
+        def serializer():
+            recipes = queryset.prefetch_related(
+                Prefetch('tags', queryset=Tag.objects.only('id')),
+                Prefetch('ingredients',
+                         queryset=Ingredient.objects.only('id')),
+            )
+            return RecipeSerializer(recipes, many=True).data
+
+        def reader():
+            recipe_reader = RecipeReader(RecipeSerializer)
+            return recipe_reader.render(list(recipe_reader.values(queryset)))
+
+        self.stdout.write(f'{queryset.count()} recipes')
+        slow = min(timeit.repeat(serializer, number=iterations, repeat=3))
+        fast = min(timeit.repeat(reader, number=iterations, repeat=3))
+        self.stdout.write(
+            f'RecipeSerializer {iterations / slow:.1f} lists/s\n'
+            f'RecipeReader     {iterations / fast:.1f} lists/s\n'
+            f'speedup          {slow / fast:.1f}x'
+        )
@@ -0,0 +1,34 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import RecipeStats
+from recipe import cache, stats
+
+
+class Command(BaseCommand):
+    """
+    Django command recomputing the recipe stats and the tag and ingredient
+    usage counts from the recipes, of one user or of everyone
+    """
+    help = 'Rebuild the recipe statistics from scratch'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', metavar='EMAIL',
+                            help='Rebuild the stats of this user only')
+
+    def handle(self, *args, **options):
+        user_ids = None
+        if options['user']:
+            user = get_user_model().objects \
+                .filter(email=options['user']).first()
+            if user is None:
+                raise CommandError(f'No user with email {options["user"]}')
+            user_ids = [user.id]
+
+        count = stats.rebuild(user_ids)
+        # Invalidate the stats responses and the tag and ingredient lists
+        # validated by the old aggregates and counts
+        for user_id in user_ids or RecipeStats.objects \
+                .values_list('user_id', flat=True).iterator():
+            cache.bump_version(user_id, 'recipe', 'tag', 'ingredient')
+        self.stdout.write(f'Rebuilt the recipe stats of {count} users')
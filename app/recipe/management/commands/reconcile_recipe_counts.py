@@ -0,0 +1,51 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipe import cache, stats
+
+
+class Command(BaseCommand):
+    """
+    Django command fixing the recipe_count of tags and ingredients that
+    drifted from the recipes using them, leaving the others untouched
+    """
+    help = 'Fix tag and ingredient recipe counts that drifted'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', metavar='EMAIL',
+                            help='Only check the objects of this user')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report the drifted counts without fixing')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            user = get_user_model().objects \
+                .filter(email=options['user']).first()
+            if user is None:
+                raise CommandError(f'No user with email {options["user"]}')
+
+        for name, model in stats.RELATIONS.items():
+            queryset = model.objects.all()
+            if user is not None:
+                queryset = queryset.filter(user=user)
+            with transaction.atomic():
+                rows = list(
+                    stats.drifted(model, queryset.select_for_update())
+                    .values_list('pk', 'user_id', 'recipe_count', 'actual')
+                )
+                for pk, user_id, count, actual in rows:
+                    self.stdout.write(
+                        f'{name} {pk}: recipe_count {count}, actually {actual}'
+                    )
+                if not options['dry_run']:
+                    ids = [pk for pk, *_ in rows]
+                    stats.recount(model, model.objects.filter(pk__in=ids))
+            if not options['dry_run']:
+                for user_id in {row[1] for row in rows}:
+                    cache.bump_version(user_id, model._meta.model_name)
+            self.stdout.write(
+                f'{len(rows)} {name} drifted'
+                f'{"" if options["dry_run"] else ", fixed"}'
+            )
@@ -0,0 +1,66 @@
+from django.conf import settings
+from rest_framework.pagination import BasePagination, CursorPagination, \
+    PageNumberPagination
+
+
+class RecipePageNumberPagination(PageNumberPagination):
+    """
+    Page number pagination with a client supplied, capped page size
+    """
+    page_size_query_param = 'limit'
+    max_page_size = settings.API_MAX_PAGE_SIZE
+
+
+class RecipeCursorPagination(CursorPagination):
+    """
+    Keyset pagination, deep pages cost the same as the first one
+    """
+    page_size_query_param = 'limit'
+    max_page_size = settings.API_MAX_PAGE_SIZE
+    ordering = '-id'
+
+
+class OptInPagination(BasePagination):
+    """
+    Paginate only when the client asks for it, so the unpaginated list
+    response stays the default
+
+    ?pagination=cursor or ?cursor= selects keyset pagination ordered by the
+    view's get_cursor_ordering(), ?pagination=page, ?page= or ?limit=
+    select page number pagination.
+    """
+    mode_query_param = 'pagination'
+
+    def __init__(self):
+        self.paginator = None
+
+    def get_paginator(self, request, view=None):
+        """
+        Return the paginator requested by the client or None
+        :param request:
+        :param view:
+        :return:
+        """
+        params = request.query_params
+        mode = params.get(self.mode_query_param)
+
+        if mode == 'cursor' or \
+                RecipeCursorPagination.cursor_query_param in params:
+            paginator = RecipeCursorPagination()
+            if hasattr(view, 'get_cursor_ordering'):
+                paginator.ordering = view.get_cursor_ordering()
+            return paginator
+        if mode == 'page' or \
+                RecipePageNumberPagination.page_query_param in params or \
+                RecipePageNumberPagination.page_size_query_param in params:
+            return RecipePageNumberPagination()
+        return None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.paginator = self.get_paginator(request, view)
+        if self.paginator is None:
+            return None
+        return self.paginator.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
@@ -0,0 +1,97 @@
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, \
+    SearchVector
+from django.db import connection
+from django.db.models import Aggregate, Case, F, IntegerField, OuterRef, \
+    Subquery, TextField, Value, When
+from django.db.models.functions import Coalesce, Concat
+
+from core.models import Recipe
+
+
+def _is_postgres():
+    return connection.vendor == 'postgresql'
+
+
+class _JoinNames(Aggregate):
+    """
+    Concatenate the names of a group, each preceded by a space
+    """
+    function = 'GROUP_CONCAT'
+    template = "%(function)s(%(expressions)s, '')"
+
+    def __init__(self, expression, **extra):
+        super().__init__(
+            Concat(Value(' '), expression), output_field=TextField(), **extra
+        )
+
+    def as_postgresql(self, compiler, connection):
+        return self.as_sql(compiler, connection, function='STRING_AGG')
+
+
+def _related_names(field_name):
+    """
+    Return the tag or ingredient names of the outer recipe, as a subquery
+    over the through table
+    :param field_name: tags or ingredients
+    :return:
+    """
+    field = Recipe._meta.get_field(field_name)
+    through = field.remote_field.through
+    source = f'{field.m2m_field_name()}_id'
+    target = f'{field.m2m_reverse_field_name()}__name'
+    names = through.objects.filter(**{source: OuterRef('pk')}) \
+        .order_by().values(source).annotate(names=_JoinNames(target)) \
+        .values('names')
+    return Coalesce(Subquery(names, output_field=TextField()), Value(''))
+
+
+def update_search_documents(recipe_ids):
+    """
+    Recompute the stored search document, and on PostgreSQL the weighted
+    search vector, of the given recipes with one UPDATE
+    :param recipe_ids: ids, or a queryset of ids
+    :return:
+    """
+    related = Concat(
+        _related_names('tags'), _related_names('ingredients'),
+        output_field=TextField()
+    )
+    values = {'search_document': Concat(
+        'title', related, output_field=TextField()
+    )}
+    if _is_postgres():
+        config = settings.RECIPE_SEARCH_CONFIG
+        values['search_vector'] = SearchVector(
+            'title', weight='A', config=config
+        ) + SearchVector(related, weight='B', config=config)
+    Recipe.objects.filter(pk__in=recipe_ids).update(**values)
+
+
+def search(queryset, q):
+    """
+    Filter queryset to recipes matching q, annotated with a relevance
+    rank. PostgreSQL uses the GIN indexed search vector, other backends
+    match every term against the stored search document
+    :param queryset:
+    :param q:
+    :return:
+    """
+    if _is_postgres():
+        query = SearchQuery(q, config=settings.RECIPE_SEARCH_CONFIG)
+        return queryset.annotate(
+            rank=SearchRank(F('search_vector'), query)
+        ).filter(search_vector=query)
+
+    terms = q.split()
+    for term in terms:
+        queryset = queryset.filter(search_document__icontains=term)
+    # Terms found in the title weigh more than tag or ingredient names
+    rank = Value(0, output_field=IntegerField())
+    for term in terms:
+        rank = rank + Case(
+            When(title__icontains=term, then=Value(2)),
+            default=Value(1),
+            output_field=IntegerField(),
+        )
+    return queryset.annotate(rank=rank)
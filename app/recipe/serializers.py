@@ -1,8 +1,293 @@
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q, prefetch_related_objects
+from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
-from core.models import Ingredient, Tag, Recipe
+from rest_framework.relations import MANY_RELATION_KWARGS
+from core.models import Ingredient, Tag, Recipe, \
+    recipe_image_content_path, recipe_image_upload_path
+from recipe import cache, images
 
 
-class TagSerializer(serializers.ModelSerializer):
+def get_or_create_by_name(model, user_id, names):
+    """
+    Return the user's objects with the given names by name, creating the
+    missing ones with one batched INSERT
+
+    An object created concurrently makes the INSERT fail on the unique
+    (user, name) constraint, the lookup is then retried.
+    :param model: Tag or Ingredient
+    :param user_id:
+    :param names:
+    :return:
+    """
+    queryset = model.objects.filter(user_id=user_id)
+    for attempt in range(3):
+        objs = {obj.name: obj for obj in queryset.filter(name__in=names)}
+        missing = [name for name in names if name not in objs]
+        if not missing:
+            return objs
+        try:
+            with transaction.atomic():
+                created = model.objects.bulk_create(
+                    [model(user_id=user_id, name=name) for name in missing],
+                    batch_size=settings.API_BULK_BATCH_SIZE
+                )
+        except IntegrityError:
+            if attempt == 2:
+                raise
+            continue
+        # bulk_create skips the signals invalidating the cached lists
+        cache.bump_version(user_id, model._meta.model_name)
+        if not connection.features.can_return_ids_from_bulk_insert:
+            continue
+        objs.update((obj.name, obj) for obj in created)
+        return objs
+    return {obj.name: obj for obj in queryset.filter(name__in=names)}
+
+
+class BulkListSerializer(serializers.ListSerializer):
+    """
+    Create and update many objects of the child serializer's model with
+    batched INSERTs, including the many to many through tables
+    """
+
+    def _split_relations(self, attrs):
+        model = self.child.Meta.model
+        return {
+            field.name: attrs.pop(field.name)
+            for field in model._meta.many_to_many if field.name in attrs
+        }
+
+    def _set_relations(self, objs, relations):
+        """
+        Replace the many to many relations of objs in one DELETE and one
+        batched INSERT per field
+        :param objs:
+        :param relations: per object dict of field name -> related objects
+        :return:
+        """
+        model = self.child.Meta.model
+        for field in model._meta.many_to_many:
+            through = field.remote_field.through
+            source = f'{field.m2m_field_name()}_id'
+            target = f'{field.m2m_reverse_field_name()}_id'
+            pairs = [
+                (obj, related[field.name])
+                for obj, related in zip(objs, relations)
+                if field.name in related
+            ]
+            if not pairs:
+                continue
+            through.objects.filter(
+                **{f'{source}__in': [obj.pk for obj, _ in pairs]}
+            ).delete()
+            through.objects.bulk_create([
+                through(**{source: obj.pk, target: value.pk})
+                for obj, values in pairs for value in values
+            ], batch_size=settings.API_BULK_BATCH_SIZE)
+        names = [field.name for field in model._meta.many_to_many]
+        prefetch_related_objects(objs, *names)
+
+    def _save_new_relations(self, validated_data):
+        save_new_relations = getattr(self.child, 'save_new_relations', None)
+        if save_new_relations is not None:
+            save_new_relations(validated_data)
+
+    def create(self, validated_data):
+        model = self.child.Meta.model
+
+        with transaction.atomic():
+            self._save_new_relations(validated_data)
+            relations = [
+                self._split_relations(attrs) for attrs in validated_data
+            ]
+            objs = [model(**attrs) for attrs in validated_data]
+            if connection.features.can_return_ids_from_bulk_insert:
+                model.objects.bulk_create(
+                    objs, batch_size=settings.API_BULK_BATCH_SIZE
+                )
+            else:
+                # Backends that cannot return the new ids insert one by one
+                for obj in objs:
+                    obj.save(force_insert=True)
+            self._set_relations(objs, relations)
+        return objs
+
+    def update(self, instances, validated_data):
+        with transaction.atomic():
+            self._save_new_relations(validated_data)
+            relations = [
+                self._split_relations(attrs) for attrs in validated_data
+            ]
+            for obj, attrs in zip(instances, validated_data):
+                for attr, value in attrs.items():
+                    setattr(obj, attr, value)
+                if attrs:
+                    obj.save(update_fields=list(attrs))
+            self._set_relations(instances, relations)
+        return instances
+
+
+class UserManyRelatedField(serializers.ManyRelatedField):
+    """
+    Resolve a list of primary keys and names with a single query, unknown
+    names become unsaved objects created by the serializer on save
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+
+        child = self.child_relation
+        pks, names, digits = [], [], []
+        for item in data:
+            if isinstance(item, bool):
+                child.fail('incorrect_type', data_type=type(item).__name__)
+            if isinstance(item, str):
+                # Forms and older clients send ids as strings of digits,
+                # they are names only if no such object exists
+                if item.strip().isdigit():
+                    digits.append(item)
+                else:
+                    names.append(child.to_name(item))
+                continue
+            try:
+                pks.append(int(item))
+            except (TypeError, ValueError):
+                child.fail('incorrect_type', data_type=type(item).__name__)
+
+        lookup_names = names + [child.to_name(item) for item in digits]
+        if lookup_names:
+            found = child.get_queryset().filter(
+                Q(pk__in=pks + [int(item) for item in digits]) |
+                Q(name__in=lookup_names)
+            )
+            objs = {obj.pk: obj for obj in found}
+        else:
+            objs = child.get_queryset().in_bulk(pks)
+        missing = [pk for pk in pks if pk not in objs]
+        if missing:
+            child.fail(
+                'does_not_exist_many',
+                pk_values=', '.join(str(pk) for pk in missing)
+            )
+        for item in digits:
+            if int(item) in objs:
+                pks.append(int(item))
+            else:
+                names.append(child.to_name(item))
+        pks = list(dict.fromkeys(pks))
+        names = list(dict.fromkeys(names))
+
+        by_name = {obj.name: obj for obj in objs.values()}
+        result = [objs[pk] for pk in pks]
+        for name in names:
+            obj = by_name.get(name)
+            if obj is None:
+                result.append(child.new_object(name))
+            elif obj.pk not in pks:
+                result.append(obj)
+        return result
+
+
+class UserPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Primary key related field limited to objects of the requesting user,
+    with many=True all keys are resolved in one query
+    """
+    default_error_messages = {
+        'does_not_exist_many': _(
+            'Invalid pks "{pk_values}" - objects do not exist.'
+        ),
+        'invalid_name': _(
+            'Invalid name "{name}" - names are 1 to {max_length} characters.'
+        ),
+    }
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return UserManyRelatedField(**list_kwargs)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        request = self.context.get('request')
+        if request is not None and request.user.is_authenticated:
+            queryset = queryset.filter(user=request.user)
+        return queryset
+
+    def to_name(self, data):
+        """
+        Validate a name given instead of a primary key
+        :param data:
+        :return:
+        """
+        name = data.strip()
+        max_length = self.queryset.model._meta.get_field('name').max_length
+        if not name or len(name) > max_length:
+            self.fail('invalid_name', name=data, max_length=max_length)
+        return name
+
+    def new_object(self, name):
+        """
+        Return an unsaved object of the requesting user, see
+        RecipeSerializer.save_new_relations
+        :param name:
+        :return:
+        """
+        return self.queryset.model(user=self.context['request'].user,
+                                   name=name)
+
+
+class RecipeAttrSerializer(serializers.ModelSerializer):
+    """
+    Serializer of user owned recipe attributes, which renders the number
+    of recipes using each object on request
+    """
+
+    def __init__(self, *args, recipe_count=False, **kwargs):
+        """
+        :param recipe_count: add the read only recipe_count field
+        """
+        super().__init__(*args, **kwargs)
+        if recipe_count:
+            self.fields['recipe_count'] = serializers.IntegerField(
+                read_only=True
+            )
+
+    def create(self, validated_data):
+        try:
+            with transaction.atomic():
+                return super().create(validated_data)
+        except IntegrityError:
+            raise serializers.ValidationError({'name': [
+                _('This name is already used.')
+            ]})
+
+
+class RecipeAttrListSerializer(BulkListSerializer):
+    """
+    Bulk serializer of recipe attributes, reporting names that are
+    already used
+    """
+
+    def create(self, validated_data):
+        try:
+            with transaction.atomic():
+                return super().create(validated_data)
+        except IntegrityError:
+            raise serializers.ValidationError({'non_field_errors': [
+                _('Names must be unique and not already used.')
+            ]})
+
+
+class TagSerializer(RecipeAttrSerializer):
     """
     Serializer for tag objects
     """
@@ -11,9 +296,10 @@ class TagSerializer(serializers.ModelSerializer):
         fields = ('id', 'name')
         # read_only_fields = ('id',)
         extra_kwargs = {'id': {'read_only': True}}
+        list_serializer_class = RecipeAttrListSerializer
 
 
-class IngredientSerializer(serializers.ModelSerializer, ):
+class IngredientSerializer(RecipeAttrSerializer):
     """
     Serializer for ingredient objects
     """
@@ -21,6 +307,7 @@ class IngredientSerializer(serializers.ModelSerializer, ):
         model = Ingredient
         fields = ('id', 'name')
         extra_kwargs = {'id': {'read_only': True}}
+        list_serializer_class = RecipeAttrListSerializer
 
 
 class RecipeSerializer(serializers.ModelSerializer):
@@ -28,11 +315,11 @@ class RecipeSerializer(serializers.ModelSerializer):
     Serialize a recipe
     """
     # Foreign key fields
-    ingredients = serializers.PrimaryKeyRelatedField(
+    ingredients = UserPrimaryKeyRelatedField(
         many=True,
         queryset=Ingredient.objects.all()
     )
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = UserPrimaryKeyRelatedField(
         many=True,
         queryset=Tag.objects.all()
     )
@@ -42,6 +329,62 @@ class RecipeSerializer(serializers.ModelSerializer):
         fields = ('id', 'title', 'ingredients', 'tags',
                   'time_minutes', 'price', 'link')
         extra_kwargs = {'id': {'read_only': True}}
+        list_serializer_class = BulkListSerializer
+
+    # Relations that can be rendered as nested objects instead of ids
+    expandable_fields = {
+        'tags': TagSerializer,
+        'ingredients': IngredientSerializer,
+    }
+
+    def __init__(self, *args, fields=None, expand=(), **kwargs):
+        """
+        :param fields: names of the fields to keep, all if None
+        :param expand: relations to nest instead of listing their ids
+        """
+        super().__init__(*args, **kwargs)
+        for name in expand:
+            self.fields[name] = self.expandable_fields[name](
+                many=True, read_only=True
+            )
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    def save_new_relations(self, attrs_list):
+        """
+        Create the tags and ingredients given by new names, in one query
+        per type, and replace them in the validated data
+        :param attrs_list: validated data of each recipe
+        :return:
+        """
+        for field in self.Meta.model._meta.many_to_many:
+            new = [
+                obj for attrs in attrs_list
+                for obj in attrs.get(field.name, ()) if obj.pk is None
+            ]
+            if not new:
+                continue
+            saved = get_or_create_by_name(
+                field.related_model, new[0].user_id,
+                list(dict.fromkeys(obj.name for obj in new))
+            )
+            for attrs in attrs_list:
+                if field.name in attrs:
+                    attrs[field.name] = [
+                        saved[obj.name] if obj.pk is None else obj
+                        for obj in attrs[field.name]
+                    ]
+
+    def create(self, validated_data):
+        with transaction.atomic():
+            self.save_new_relations([validated_data])
+            return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        with transaction.atomic():
+            self.save_new_relations([validated_data])
+            return super().update(instance, validated_data)
 
 
 class RecipeDetailSerializer(RecipeSerializer):
@@ -50,6 +393,25 @@ class RecipeDetailSerializer(RecipeSerializer):
     """
     ingredients = IngredientSerializer(many=True, read_only=True)
     tags = TagSerializer(many=True, read_only=True)
+    image_variants = serializers.SerializerMethodField()
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ('image_variants',)
+
+    def get_image_variants(self, obj):
+        """
+        Return the URLs of the generated image variants, None until the
+        image has been processed
+        :param obj:
+        :return:
+        """
+        return images.variant_urls(
+            {
+                field: getattr(obj, field).name
+                for field, *spec in images.VARIANTS.values()
+            },
+            self.context.get('request')
+        )
 
 
 class RecipeImageSerializer(serializers.ModelSerializer):
@@ -60,3 +422,33 @@ class RecipeImageSerializer(serializers.ModelSerializer):
         model = Recipe
         fields = ('id', 'image')
         extra_kwargs = {'id': {'read_only': True}}
+
+    def update(self, instance, validated_data):
+        """
+        Store streamed uploads under their content hash, reusing the file
+        if the same image was uploaded before
+
+        Uploads carrying EXIF data are kept apart, once per upload, until
+        recipe.images stores them without it under their own hash.
+        :param instance:
+        :param validated_data:
+        :return:
+        """
+        upload = validated_data.get('image')
+        if getattr(upload, 'sha256', None) is None:
+            return super().update(instance, validated_data)
+
+        storage = instance.image.storage
+        if images.has_metadata(upload):
+            name = storage.save(recipe_image_upload_path(
+                upload.sha256, upload.image_extension
+            ), upload)
+        else:
+            name = recipe_image_content_path(
+                upload.sha256, upload.image_extension
+            )
+            if not storage.exists(name):
+                name = storage.save(name, upload)
+        instance.image = name
+        instance.save()
+        return instance
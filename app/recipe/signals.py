@@ -0,0 +1,254 @@
+import threading
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models.signals import m2m_changed, post_delete, post_save, \
+    pre_delete, pre_save
+from django.dispatch import receiver
+
+from core.models import Ingredient, Recipe, RecipeStats, Tag
+from recipe import cache, search, stats
+
+_bulk = threading.local()
+
+
+@contextmanager
+def bulk_recipe_delete():
+    """
+    Skip the per-recipe delete receivers within the block, the caller
+    accounts for the deleted recipes as a whole
+    :return:
+    """
+    _bulk.deleting = True
+    try:
+        yield
+    finally:
+        _bulk.deleting = False
+
+
+def _bulk_deleting():
+    return getattr(_bulk, 'deleting', False)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_tags(sender, instance, **kwargs):
+    """
+    Invalidate the cached tag lists of the tag owner
+    """
+    cache.bump_version(instance.user_id, 'tag')
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredients(sender, instance, **kwargs):
+    """
+    Invalidate the cached ingredient lists of the ingredient owner
+    """
+    cache.bump_version(instance.user_id, 'ingredient')
+
+
+@receiver(post_save, sender=Recipe)
+def invalidate_recipes(sender, instance, **kwargs):
+    """
+    Invalidate the recipe validators of the recipe owner
+    """
+    cache.bump_version(instance.user_id, 'recipe')
+
+
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe_attrs(sender, instance, **kwargs):
+    """
+    Deleting a recipe may unassign its tags and ingredients
+    """
+    if _bulk_deleting():
+        return
+    cache.bump_version(instance.user_id, 'recipe', 'tag', 'ingredient')
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags(sender, instance, action, **kwargs):
+    """
+    Invalidate assigned tag lists when recipe tags change
+    """
+    if action.startswith('post_'):
+        cache.bump_version(instance.user_id, 'recipe', 'tag')
+
+
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def invalidate_recipe_ingredients(sender, instance, action, **kwargs):
+    """
+    Invalidate assigned ingredient lists when recipe ingredients change
+    """
+    if action.startswith('post_'):
+        cache.bump_version(instance.user_id, 'recipe', 'ingredient')
+
+
+@receiver(post_save, sender=Recipe)
+def index_recipe(sender, instance, update_fields=None, **kwargs):
+    """
+    Refresh the search document of a saved recipe
+    """
+    if update_fields is None or 'title' in update_fields:
+        search.update_search_documents([instance.pk])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def index_recipe_relations(sender, instance, action, reverse, pk_set,
+                           **kwargs):
+    """
+    Refresh the search documents of recipes whose tags or ingredients
+    changed
+    """
+    if action == 'pre_clear' and reverse:
+        # The cleared recipes are unknown once the rows are gone
+        instance._search_recipe_ids = list(
+            instance.recipe_set.values_list('id', flat=True)
+        )
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        recipe_ids = [instance.pk]
+    elif action == 'post_clear':
+        recipe_ids = getattr(instance, '_search_recipe_ids', [])
+    else:
+        recipe_ids = list(pk_set or ())
+    search.update_search_documents(recipe_ids)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def index_renamed_attr(sender, instance, created, **kwargs):
+    """
+    Refresh the search documents of recipes using a renamed tag or
+    ingredient
+    """
+    if not created:
+        search.update_search_documents(
+            instance.recipe_set.values_list('id', flat=True)
+        )
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def collect_deleted_attr_recipes(sender, instance, **kwargs):
+    instance._search_recipe_ids = list(
+        instance.recipe_set.values_list('id', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def index_deleted_attr(sender, instance, **kwargs):
+    """
+    Drop the name of a deleted tag or ingredient from the search documents
+    """
+    search.update_search_documents(
+        getattr(instance, '_search_recipe_ids', [])
+    )
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def create_recipe_stats(sender, instance, created, raw=False, **kwargs):
+    """
+    Give new users an empty stats row, so their first recipe only updates
+    it
+    """
+    if created and not raw:
+        RecipeStats.objects.get_or_create(user=instance)
+
+
+@receiver(pre_save, sender=Recipe)
+def collect_recipe_stats_values(sender, instance, update_fields=None,
+                                **kwargs):
+    """
+    Remember the time and price a recipe had before it is updated
+    """
+    if instance._state.adding or (
+            update_fields is not None and
+            not {'time_minutes', 'price'} & set(update_fields)):
+        return
+    instance._stats_values = Recipe.objects.filter(pk=instance.pk) \
+        .values_list('time_minutes', 'price').first()
+
+
+@receiver(post_save, sender=Recipe)
+def update_recipe_stats(sender, instance, created, **kwargs):
+    """
+    Account for a created recipe or a changed time or price in the stats
+    of the recipe owner
+    """
+    values = (instance.time_minutes, Decimal(str(instance.price)))
+    if created:
+        stats.add_recipes(instance.user_id, [values])
+        return
+    old = getattr(instance, '_stats_values', None)
+    instance._stats_values = None
+    if old is not None and tuple(old) != values:
+        stats.change_recipe(instance.user_id, old, values)
+
+
+@receiver(pre_delete, sender=Recipe)
+def collect_recipe_relations(sender, instance, **kwargs):
+    if _bulk_deleting():
+        return
+    instance._stats_relations = {
+        model: list(model.objects.filter(recipe=instance)
+                    .values_list('id', flat=True))
+        for model in stats.RELATIONS.values()
+    }
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_recipe_stats(sender, instance, **kwargs):
+    """
+    Take a deleted recipe out of the stats and the usage counts, its
+    through rows are deleted without m2m_changed
+    """
+    if _bulk_deleting():
+        return
+    stats.remove_recipes(
+        instance.user_id, [(instance.time_minutes, instance.price)]
+    )
+    for model, ids in getattr(instance, '_stats_relations', {}).items():
+        stats.change_counts(model, ids, -1)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def count_recipe_relations(sender, instance, action, reverse, model, pk_set,
+                           **kwargs):
+    """
+    Keep recipe_count of tags and ingredients up to date when recipes
+    gain or lose them, from either side of the relation
+    """
+    if action == 'pre_remove':
+        # post_remove gets every pk passed to remove(), linked or not
+        related = instance.recipe_set if reverse else \
+            model.objects.filter(recipe=instance)
+        instance._stats_removed = list(
+            related.filter(pk__in=pk_set).values_list('id', flat=True)
+        )
+        return
+    removed = getattr(instance, '_stats_removed', [])
+    if reverse:
+        # instance is a tag or ingredient, pk_set holds recipe ids
+        if action == 'post_add':
+            stats.change_counts(type(instance), [instance.pk], len(pk_set))
+        elif action == 'post_remove':
+            stats.change_counts(type(instance), [instance.pk], -len(removed))
+        elif action == 'post_clear':
+            type(instance).objects.filter(pk=instance.pk) \
+                .update(recipe_count=0)
+    elif action == 'pre_clear':
+        instance._stats_cleared = list(
+            model.objects.filter(recipe=instance).values_list('id', flat=True)
+        )
+    elif action == 'post_add':
+        stats.change_counts(model, pk_set, 1)
+    elif action == 'post_remove':
+        stats.change_counts(model, removed, -1)
+    elif action == 'post_clear':
+        stats.change_counts(model, getattr(instance, '_stats_cleared', []), -1)
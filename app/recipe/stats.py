@@ -0,0 +1,247 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, Max, Min, OuterRef, \
+    Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from core.models import Ingredient, Recipe, RecipeStats, Tag
+
+# Model of each recipe relation whose recipe_count is maintained here
+RELATIONS = {'tags': Tag, 'ingredients': Ingredient}
+# RecipeStats values of a user without recipes
+EMPTY_STATS = {
+    'recipe_count': 0,
+    'time_minutes_sum': 0,
+    'time_minutes_min': None,
+    'time_minutes_max': None,
+    'price_sum': 0,
+    'price_min': None,
+    'price_max': None,
+}
+
+
+def add_recipes(user_id, values):
+    """
+    Account for new recipes of a user
+    :param user_id:
+    :param values: (time_minutes, price) of each recipe
+    :return:
+    """
+    if not values:
+        return
+    times = [time_minutes for time_minutes, _ in values]
+    prices = [Decimal(str(price)) for _, price in values]
+    with transaction.atomic():
+        # The lock serializes concurrent updates of the extremes
+        stats, _ = RecipeStats.objects.select_for_update() \
+            .get_or_create(user_id=user_id)
+        RecipeStats.objects.filter(user_id=user_id).update(
+            recipe_count=F('recipe_count') + len(values),
+            time_minutes_sum=F('time_minutes_sum') + sum(times),
+            price_sum=F('price_sum') + sum(prices),
+            time_minutes_min=_extreme(min, stats.time_minutes_min, times),
+            time_minutes_max=_extreme(max, stats.time_minutes_max, times),
+            price_min=_extreme(min, stats.price_min, prices),
+            price_max=_extreme(max, stats.price_max, prices),
+        )
+
+
+def _extreme(function, current, values):
+    if current is None:
+        return function(values)
+    return function(current, *values)
+
+
+def remove_recipes(user_id, values):
+    """
+    Account for deleted recipes of a user
+    :param user_id:
+    :param values: (time_minutes, price) of each recipe
+    :return:
+    """
+    if not values:
+        return
+    RecipeStats.objects.filter(user_id=user_id).update(
+        recipe_count=F('recipe_count') - len(values),
+        time_minutes_sum=F('time_minutes_sum') - sum(
+            time_minutes for time_minutes, _ in values
+        ),
+        price_sum=F('price_sum') - sum(
+            Decimal(str(price)) for _, price in values
+        ),
+    )
+    refresh_extremes(user_id)
+
+
+def change_recipe(user_id, old, new):
+    """
+    Account for a recipe whose time or price changed
+    :param user_id:
+    :param old: previous (time_minutes, price)
+    :param new: current (time_minutes, price)
+    :return:
+    """
+    RecipeStats.objects.filter(user_id=user_id).update(
+        time_minutes_sum=F('time_minutes_sum') + new[0] - old[0],
+        price_sum=F('price_sum') + Decimal(str(new[1])) -
+        Decimal(str(old[1])),
+    )
+    refresh_extremes(user_id)
+
+
+def refresh_extremes(user_id):
+    """
+    Recompute the min and max of a user's recipes, which are index lookups
+    on (user, time_minutes) and (user, price)
+    :param user_id:
+    :return:
+    """
+    recipes = Recipe.objects.filter(user_id=user_id).order_by()
+    RecipeStats.objects.filter(user_id=user_id).update(**recipes.aggregate(
+        time_minutes_min=Min('time_minutes'),
+        time_minutes_max=Max('time_minutes'),
+        price_min=Min('price'),
+        price_max=Max('price'),
+    ))
+
+
+def change_counts(model, ids, delta):
+    """
+    Add delta to the recipe_count of the given tags or ingredients
+    :param model: Tag or Ingredient
+    :param ids:
+    :param delta:
+    :return:
+    """
+    if ids and delta:
+        model.objects.filter(pk__in=ids).update(
+            recipe_count=F('recipe_count') + delta
+        )
+
+
+def _usage_count(model):
+    """
+    Return the number of recipes using the outer tag or ingredient, as a
+    subquery over the through table
+    :param model: Tag or Ingredient
+    :return:
+    """
+    field = Recipe._meta.get_field(
+        'tags' if model is Tag else 'ingredients'
+    )
+    through = field.remote_field.through
+    target = f'{field.m2m_reverse_field_name()}_id'
+    counts = through.objects.filter(**{target: OuterRef('pk')}) \
+        .order_by().values(target).annotate(n=Count('*')).values('n')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def recount(model, queryset=None):
+    """
+    Recompute recipe_count of tags or ingredients from the through table
+    :param model: Tag or Ingredient
+    :param queryset: rows to recount, all by default
+    :return: number of rows updated
+    """
+    if queryset is None:
+        queryset = model.objects.all()
+    return queryset.update(recipe_count=_usage_count(model))
+
+
+def drifted(model, queryset=None):
+    """
+    Return the tags or ingredients whose recipe_count differs from the
+    through table, annotated with the actual count
+    :param model: Tag or Ingredient
+    :param queryset: rows to check, all by default
+    :return:
+    """
+    if queryset is None:
+        queryset = model.objects.all()
+    return queryset.annotate(actual=_usage_count(model)) \
+        .exclude(recipe_count=F('actual'))
+
+
+def rebuild(user_ids=None):
+    """
+    Recompute the stats and the tag and ingredient usage counts of the
+    given users, or of everyone
+    :param user_ids:
+    :return: number of users with recipes
+    """
+    recipes = Recipe.objects.order_by()
+    stats = RecipeStats.objects.all()
+    if user_ids is not None:
+        recipes = recipes.filter(user_id__in=user_ids)
+        stats = stats.filter(user_id__in=user_ids)
+    rows = recipes.values('user_id').annotate(
+        recipe_count=Count('id'),
+        time_minutes_sum=Sum('time_minutes'),
+        time_minutes_min=Min('time_minutes'),
+        time_minutes_max=Max('time_minutes'),
+        price_sum=Sum('price'),
+        price_min=Min('price'),
+        price_max=Max('price'),
+    )
+
+    with transaction.atomic():
+        found = set()
+        for row in rows:
+            user_id = row.pop('user_id')
+            found.add(user_id)
+            RecipeStats.objects.update_or_create(
+                user_id=user_id, defaults=row
+            )
+        # Users without recipes keep an empty row
+        empty = get_user_model().objects.exclude(pk__in=found)
+        if user_ids is not None:
+            empty = empty.filter(pk__in=user_ids)
+        stats.filter(user__in=empty).update(**EMPTY_STATS)
+        RecipeStats.objects.bulk_create(
+            RecipeStats(user_id=pk) for pk in empty
+            .filter(recipe_stats__isnull=True).values_list('pk', flat=True)
+        )
+        for model in RELATIONS.values():
+            queryset = model.objects.all()
+            if user_ids is not None:
+                queryset = queryset.filter(user_id__in=user_ids)
+            recount(model, queryset)
+    return len(found)
+
+
+def get_stats(user, top=5):
+    """
+    Return the recipe statistics of a user
+    :param user:
+    :param top: number of most used tags and ingredients
+    :return:
+    """
+    stats = RecipeStats.objects.filter(user=user).first() or \
+        RecipeStats(user=user)
+    count = stats.recipe_count
+    price_avg = stats.price_sum / count if count else None
+    data = {
+        'recipe_count': count,
+        'time_minutes': {
+            'avg': round(stats.time_minutes_sum / count, 1) if count else None,
+            'min': stats.time_minutes_min,
+            'max': stats.time_minutes_max,
+        },
+        # Prices are strings, as in the recipe serializers
+        'price': {
+            name: None if value is None else
+            str(Decimal(value).quantize(Decimal('0.01')))
+            for name, value in (('avg', price_avg),
+                                ('min', stats.price_min),
+                                ('max', stats.price_max))
+        },
+    }
+    for name, model in RELATIONS.items():
+        data[f'top_{name}'] = list(
+            model.objects.filter(user=user, recipe_count__gt=0)
+            .order_by('-recipe_count', 'name')
+            .values('id', 'name', 'recipe_count')[:top]
+        )
+    return data
@@ -0,0 +1,204 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+
+
+RECIPES_BULK_URL = reverse('recipe:recipe-bulk')
+TAGS_BULK_URL = reverse('recipe:tag-bulk')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+class BulkApiTests(TestCase):
+    """
+    Test the bulk endpoints of the recipe API
+    """
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="testbulk@test.com",
+            password="testpass"
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_bulk_create_tags(self):
+        """
+        Test creating many tags in one request
+        :return:
+        """
+        payload = [{'name': f'Tag {i}'} for i in range(10)]
+
+        res = self.client.post(TAGS_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([t['name'] for t in res.data],
+                         [t['name'] for t in payload])
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 10)
+
+    def test_bulk_create_recipes_with_relations(self):
+        """
+        Test creating recipes with their tags and ingredients in bulk
+        :return:
+        """
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        ingredient = Ingredient.objects.create(user=self.user, name='Salt')
+        payload = [{
+            'title': f'Recipe {i}',
+            'time_minutes': 10,
+            'price': '5.00',
+            'tags': [tag.id],
+            'ingredients': [ingredient.id],
+        } for i in range(3)]
+
+        res = self.client.post(RECIPES_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(res.data), 3)
+        for item in res.data:
+            recipe = Recipe.objects.get(id=item['id'], user=self.user)
+            self.assertEqual(list(recipe.tags.all()), [tag])
+            self.assertEqual(list(recipe.ingredients.all()), [ingredient])
+            self.assertEqual(item['tags'], [tag.id])
+
+    def test_bulk_create_recipes_with_names(self):
+        """
+        Test that names shared by recipes of a batch are created once
+        :return:
+        """
+        payload = [{
+            'title': f'Recipe {i}',
+            'time_minutes': 10,
+            'price': '5.00',
+            'tags': ['Vegan', f'Tag {i}'],
+            'ingredients': ['Salt'],
+        } for i in range(3)]
+
+        res = self.client.post(RECIPES_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        vegan = Tag.objects.get(user=self.user, name='Vegan')
+        salt = Ingredient.objects.get(user=self.user, name='Salt')
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 4)
+        for item in res.data:
+            self.assertIn(vegan.id, item['tags'])
+            self.assertEqual(item['ingredients'], [salt.id])
+
+    def test_bulk_create_duplicate_tags_rejected(self):
+        """
+        Test that a batch repeating a tag name fails as a whole
+        :return:
+        """
+        payload = [{'name': 'Vegan'}, {'name': 'Vegan'}]
+
+        res = self.client.post(TAGS_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Tag.objects.exists())
+
+    def test_bulk_create_all_or_nothing(self):
+        """
+        Test that one invalid item fails the batch with per-item errors
+        :return:
+        """
+        payload = [{'name': 'Valid'}, {'name': ''}]
+
+        res = self.client.post(TAGS_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertIn('name', res.data[1])
+        self.assertFalse(Tag.objects.exists())
+
+    def test_bulk_update_recipes(self):
+        """
+        Test partially updating many recipes
+        :return:
+        """
+        recipes = [Recipe.objects.create(
+            user=self.user, title=f'Recipe {i}', time_minutes=5, price=1
+        ) for i in range(2)]
+        tag = Tag.objects.create(user=self.user, name='Quick')
+        payload = [
+            {'id': recipes[0].id, 'title': 'Renamed'},
+            {'id': recipes[1].id, 'tags': [tag.id]},
+        ]
+
+        res = self.client.patch(RECIPES_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        recipes[0].refresh_from_db()
+        self.assertEqual(recipes[0].title, 'Renamed')
+        self.assertEqual(list(recipes[1].tags.all()), [tag])
+
+    def test_bulk_update_foreign_id_rejected(self):
+        """
+        Test that objects of other users cannot be bulk updated
+        :return:
+        """
+        user2 = get_user_model().objects.create_user(
+            email="testbulk2@test.com",
+            password="testpass"
+        )
+        tag = Tag.objects.create(user=user2, name='Theirs')
+
+        res = self.client.patch(
+            TAGS_BULK_URL, [{'id': tag.id, 'name': 'Mine'}], format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        tag.refresh_from_db()
+        self.assertEqual(tag.name, 'Theirs')
+
+    def test_bulk_delete_tags(self):
+        """
+        Test deleting many tags, reporting ids that were not found
+        :return:
+        """
+        tags = [Tag.objects.create(user=self.user, name=f'Tag {i}')
+                for i in range(3)]
+        self.client.get(TAGS_URL)
+
+        res = self.client.delete(
+            TAGS_BULK_URL, [tags[0].id, tags[1].id, 0], format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['deleted'] for r in res.data],
+                         [True, True, False])
+        res = self.client.get(TAGS_URL)
+        self.assertEqual([t['name'] for t in res.data], ['Tag 2'])
+
+    def test_bulk_invalid_ids_rejected(self):
+        """
+        Test that ids which are not integers, booleans included, fail the
+        batch with per-item errors
+        :return:
+        """
+        recipe = Recipe.objects.create(
+            user=self.user, title='Keep', time_minutes=5, price='1.00'
+        )
+
+        res = self.client.patch(RECIPES_BULK_URL, [
+            {'id': recipe.id, 'title': 'Renamed'},
+            {'id': True, 'title': 'x'},
+            {'id': [recipe.id]},
+        ], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertIn('id', res.data[1])
+        self.assertIn('id', res.data[2])
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.title, 'Keep')
+
+        res = self.client.delete(
+            RECIPES_BULK_URL, [{'id': recipe.id}, True], format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(res.data), 2)
+        self.assertTrue(Recipe.objects.filter(id=recipe.id).exists())
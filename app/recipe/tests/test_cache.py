@@ -0,0 +1,126 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache as default_cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core import metrics
+from core.models import Ingredient, Recipe, Tag
+from recipe import cache
+
+
+TAGS_URL = reverse('recipe:tag-list')
+INGREDIENTS_URL = reverse('recipe:ingredient-list')
+
+
+class RecipeAttrCacheTests(TestCase):
+    """
+    Test the per-user cache of tag and ingredient lists
+    """
+    def setUp(self):
+        default_cache.clear()
+        cache.reset_stats()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="testcache@test.com",
+            password="testpass"
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_list_served_from_cache(self):
+        """
+        Test that a repeated list is a cache hit without any query
+        :return:
+        """
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.client.get(TAGS_URL)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res.data, [{'id': tag.id, 'name': 'Vegan'}])
+        self.assertEqual(cache.stats(), {'hits': 1, 'misses': 1})
+        self.assertIn(
+            'api_list_cache_lookups_total{list="tag",result="hit"} 1',
+            metrics.registry.exposition()
+        )
+
+    def test_create_invalidates(self):
+        """
+        Test that creating a tag invalidates the cached list
+        :return:
+        """
+        self.client.get(TAGS_URL)
+        self.client.post(TAGS_URL, {'name': 'Dessert'})
+
+        res = self.client.get(TAGS_URL)
+
+        self.assertEqual([t['name'] for t in res.data], ['Dessert'])
+
+    def test_delete_invalidates(self):
+        """
+        Test that deleting an ingredient invalidates the cached list
+        :return:
+        """
+        ingredient = Ingredient.objects.create(user=self.user, name='Salt')
+        self.client.get(INGREDIENTS_URL)
+        ingredient.delete()
+
+        res = self.client.get(INGREDIENTS_URL)
+
+        self.assertEqual(res.data, [])
+
+    def test_recipe_m2m_change_invalidates_assigned_only(self):
+        """
+        Test that assigning a tag to a recipe refreshes assigned_only lists
+        :return:
+        """
+        tag = Tag.objects.create(user=self.user, name='Lunch')
+        recipe = Recipe.objects.create(
+            user=self.user, title='Toast', time_minutes=5, price=1.00
+        )
+        res = self.client.get(TAGS_URL, {'assigned_only': 1})
+        self.assertEqual(res.data, [])
+
+        recipe.tags.add(tag)
+        res = self.client.get(TAGS_URL, {'assigned_only': 1})
+        self.assertEqual([t['name'] for t in res.data], ['Lunch'])
+
+        recipe.delete()
+        res = self.client.get(TAGS_URL, {'assigned_only': 1})
+        self.assertEqual(res.data, [])
+
+    def test_cache_per_user(self):
+        """
+        Test that cached lists are not shared between users
+        :return:
+        """
+        Tag.objects.create(user=self.user, name='Vegan')
+        self.client.get(TAGS_URL)
+
+        user2 = get_user_model().objects.create_user(
+            email="testcache2@test.com",
+            password="testpass"
+        )
+        self.client.force_authenticate(user2)
+        res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res.data, [])
+
+    @override_settings(RECIPE_CACHE_SINGLE_PROCESS=False)
+    def test_process_local_cache_bypassed(self):
+        """
+        Test that lists are not cached when other processes could not
+        invalidate them
+        :return:
+        """
+        self.client.get(TAGS_URL)
+        Tag.objects.filter(pk=Tag.objects.create(
+            user=self.user, name='Vegan'
+        ).pk).update(name='Vegetarian')
+
+        res = self.client.get(TAGS_URL)
+
+        self.assertEqual([t['name'] for t in res.data], ['Vegetarian'])
+        self.assertEqual(cache.stats(), {'hits': 0, 'misses': 0})
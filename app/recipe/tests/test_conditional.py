@@ -0,0 +1,124 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+from recipe import checks
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+def detail_url(recipe_id):
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+class ConditionalGetTests(TestCase):
+    """
+    Test ETag / If-None-Match handling of the recipe API
+    """
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="testconditional@test.com",
+            password="testpass"
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Toast', time_minutes=5, price=1.00
+        )
+
+    def test_not_modified_without_queries(self):
+        """
+        Test that a matching If-None-Match returns 304 without DB work
+        :return:
+        """
+        res = self.client.get(RECIPES_URL)
+        etag = res['ETag']
+
+        with self.assertNumQueries(0):
+            res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], etag)
+
+    def test_detail_etag_changes_on_update(self):
+        """
+        Test that updating a recipe changes its ETag
+        :return:
+        """
+        url = detail_url(self.recipe.id)
+        etag = self.client.get(url)['ETag']
+
+        self.client.patch(url, {'title': 'Cheese toast'})
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+        self.assertEqual(res.data['title'], 'Cheese toast')
+
+    def test_detail_etag_changes_on_tag_rename(self):
+        """
+        Test that renaming a nested tag changes the recipe detail ETag
+        :return:
+        """
+        tag = Tag.objects.create(user=self.user, name='Snack')
+        self.recipe.tags.add(tag)
+        url = detail_url(self.recipe.id)
+        etag = self.client.get(url)['ETag']
+
+        tag.name = 'Breakfast'
+        tag.save()
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['tags'][0]['name'], 'Breakfast')
+
+    def test_tag_list_etag(self):
+        """
+        Test conditional GET of the tag list
+        :return:
+        """
+        etag = self.client.get(TAGS_URL)['ETag']
+        res = self.client.get(TAGS_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        Tag.objects.create(user=self.user, name='Vegan')
+        res = self.client.get(TAGS_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_etag_per_user(self):
+        """
+        Test that ETags of different users never match
+        :return:
+        """
+        etag = self.client.get(RECIPES_URL)['ETag']
+        user2 = get_user_model().objects.create_user(
+            email="testconditional2@test.com",
+            password="testpass"
+        )
+        self.client.force_authenticate(user2)
+
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    @override_settings(RECIPE_CACHE_SINGLE_PROCESS=False)
+    def test_no_etag_with_process_local_cache(self):
+        """
+        Test that no ETag is sent when several processes would each keep
+        their own versions in a local memory cache
+        :return:
+        """
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('ETag', res)
+        self.assertEqual(
+            [error.id for error in checks.check_cache_shared(None)],
+            ['recipe.W001']
+        )
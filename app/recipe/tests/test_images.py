@@ -0,0 +1,103 @@
+import io
+import tempfile
+from concurrent.futures import Future
+from unittest.mock import patch
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.test import TransactionTestCase, override_settings
+
+from core.models import Recipe
+from recipe import images
+
+
+class SynchronousExecutor:
+    """
+    Executor running submitted calls at once in the calling thread
+    """
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, fn, *args):
+        self.submitted.append(args)
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+
+@override_settings(RECIPE_IMAGE_ASYNC=True, MEDIA_ROOT=tempfile.mkdtemp())
+class ScheduleVariantsTests(TransactionTestCase):
+    """
+    Test generating image variants in the background worker pool
+    """
+    def setUp(self):
+        user = get_user_model().objects.create_user(
+            email='testimages@test.com',
+            password='testpass'
+        )
+        self.recipe = Recipe.objects.create(
+            user=user, title='Toast', time_minutes=5, price='1.00'
+        )
+        buffer = io.BytesIO()
+        Image.new('RGB', (400, 300)).save(buffer, format='JPEG')
+        self.recipe.image.save('toast.jpg', ContentFile(buffer.getvalue()))
+
+        self.executor = SynchronousExecutor()
+        patches = (
+            patch('recipe.images.get_executor', return_value=self.executor),
+            patch.object(images.connections, 'close_all'),
+        )
+        self.get_executor, self.close_all = [p.start() for p in patches]
+        for p in patches:
+            self.addCleanup(p.stop)
+
+    def tearDown(self):
+        self.recipe.image.delete(save=False)
+
+    def test_submitted_on_commit(self):
+        """
+        Test that the variants are generated by the pool once the
+        transaction commits, and the worker closes its connections
+        :return:
+        """
+        with transaction.atomic():
+            images.schedule_variants(self.recipe)
+            self.assertEqual(self.executor.submitted, [])
+
+        self.assertEqual(self.executor.submitted, [(self.recipe.id,)])
+        self.close_all.assert_called_once_with()
+        self.recipe.refresh_from_db()
+        with Image.open(self.recipe.image_thumb.path) as thumb:
+            self.assertEqual(thumb.size, (200, 150))
+
+    def test_not_submitted_on_rollback(self):
+        """
+        Test that nothing is submitted when the transaction rolls back
+        :return:
+        """
+        with self.assertRaises(ValueError):
+            with transaction.atomic():
+                images.schedule_variants(self.recipe)
+                raise ValueError
+
+        self.assertEqual(self.executor.submitted, [])
+
+    def test_worker_failure_logged(self):
+        """
+        Test that a failing worker logs the error and still closes its
+        connections
+        :return:
+        """
+        with patch('recipe.images.generate_variants',
+                   side_effect=OSError('disk full')), \
+                self.assertLogs('recipe.images', level='ERROR') as logs:
+            images.schedule_variants(self.recipe)
+
+        self.assertIn(f'recipe {self.recipe.id} failed', logs.output[0])
+        self.assertIn('disk full', logs.output[0])
+        self.close_all.assert_called_once_with()
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image_thumb)
@@ -123,3 +123,27 @@ class PrivateIngredientsApiTests(TestCase):
 
         self.assertIn(serializer1.data, res.data)
         self.assertNotIn(serializer2.data, res.data)
+
+    def test_ingredient_recipe_count(self):
+        """
+        Test that recipe counts follow recipes being deleted
+        :return:
+        """
+        ingredient = Ingredient.objects.create(user=self.user, name='Salt')
+        recipe = Recipe.objects.create(
+            title='Chips',
+            time_minutes=20,
+            price=3.00,
+            user=self.user
+        )
+        recipe.ingredients.add(ingredient)
+
+        res = self.client.get(INGREDIENT_URL, {'recipe_count': 1})
+        self.assertEqual(res.data[0]['recipe_count'], 1)
+
+        recipe.delete()
+        res = self.client.get(INGREDIENT_URL, {'recipe_count': 1})
+        self.assertEqual(res.data[0]['recipe_count'], 0)
+        self.assertEqual(
+            self.client.get(INGREDIENT_URL, {'assigned_only': 1}).data, []
+        )
@@ -0,0 +1,134 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+from recipe.pagination import RecipePageNumberPagination
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+class PaginationApiTests(TestCase):
+    """
+    Test opt-in pagination of the recipe API lists
+    """
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="testpagination@test.com",
+            password="testpass"
+        )
+        self.client.force_authenticate(self.user)
+
+        for i in range(5):
+            Recipe.objects.create(
+                user=self.user,
+                title=f'Recipe {i}',
+                time_minutes=10,
+                price=5.00
+            )
+            Tag.objects.create(user=self.user, name=f'Tag {i}')
+
+    def test_unpaginated_by_default(self):
+        """
+        Test that lists are returned whole without pagination params
+        :return:
+        """
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 5)
+
+    def test_page_number_pagination(self):
+        """
+        Test paginating recipes by page number with a limit
+        :return:
+        """
+        res = self.client.get(RECIPES_URL, {'page': 2, 'limit': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['count'], 5)
+        self.assertEqual(
+            [r['title'] for r in res.data['results']],
+            ['Recipe 2', 'Recipe 1']
+        )
+
+    def test_limit_capped(self):
+        """
+        Test that the page size cannot exceed the configured maximum
+        :return:
+        """
+        with patch.object(RecipePageNumberPagination, 'max_page_size', 3):
+            res = self.client.get(RECIPES_URL, {'limit': 100})
+
+        self.assertEqual(len(res.data['results']), 3)
+
+    def test_cursor_pagination(self):
+        """
+        Test walking recipes with keyset pagination
+        :return:
+        """
+        res = self.client.get(
+            RECIPES_URL, {'pagination': 'cursor', 'limit': 3}
+        )
+        self.assertEqual(len(res.data['results']), 3)
+        self.assertIsNone(res.data['previous'])
+
+        res = self.client.get(res.data['next'])
+
+        self.assertEqual(
+            [r['title'] for r in res.data['results']],
+            ['Recipe 1', 'Recipe 0']
+        )
+        self.assertIsNone(res.data['next'])
+
+    def test_cursor_pagination_follows_ordering(self):
+        """
+        Test that keyset pagination walks the requested ordering
+        :return:
+        """
+        Recipe.objects.filter(title='Recipe 3').update(price=1)
+        params = {'ordering': 'price,title', 'fields': 'id'}
+        expected = [r['id'] for r in
+                    self.client.get(RECIPES_URL, params).data]
+
+        ids = []
+        res = self.client.get(
+            RECIPES_URL, {**params, 'pagination': 'cursor', 'limit': 2}
+        )
+        while True:
+            ids += [r['id'] for r in res.data['results']]
+            if not res.data['next']:
+                break
+            res = self.client.get(res.data['next'])
+
+        self.assertEqual(ids, expected)
+
+    def test_cursor_pagination_search_needs_ordering(self):
+        """
+        Test that search relevance cannot be cursor paginated
+        :return:
+        """
+        res = self.client.get(RECIPES_URL, {'pagination': 'cursor', 'q': 'x'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('pagination', res.data)
+
+    def test_tags_cursor_pagination_by_name(self):
+        """
+        Test that tags are keyset paginated by name descending
+        :return:
+        """
+        res = self.client.get(TAGS_URL, {'pagination': 'cursor', 'limit': 2})
+
+        self.assertEqual(
+            [t['name'] for t in res.data['results']],
+            ['Tag 4', 'Tag 3']
+        )
@@ -0,0 +1,104 @@
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.db.models import Prefetch
+from django.test import TestCase, override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from core.models import Ingredient, Recipe, Tag
+from recipe.readers import RecipeReader
+from recipe.serializers import RecipeDetailSerializer, RecipeSerializer
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class RecipeReaderTests(TestCase):
+    """
+    Test that RecipeReader renders exactly like the recipe serializers
+    """
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="testreader@test.com",
+            password="testpass"
+        )
+        self.request = APIRequestFactory().get('/api/recipe/recipes/')
+        tags = [Tag.objects.create(user=self.user, name=f'Tag {i}')
+                for i in range(3)]
+        ingredients = [
+            Ingredient.objects.create(user=self.user, name=f'Ingredient {i}')
+            for i in range(3)
+        ]
+        for i in range(4):
+            recipe = Recipe.objects.create(
+                user=self.user,
+                title=f'Recipe {i}',
+                time_minutes=i * 7,
+                price='%d.5' % i,
+                link='https://example.com' if i % 2 else '',
+            )
+            recipe.tags.add(*tags[i:])
+            recipe.ingredients.add(*ingredients[:i])
+        Recipe.objects.filter(title='Recipe 1').update(
+            image='uploads/recipe/a.jpg',
+            image_thumb='uploads/recipe/a_thumb.jpg',
+            image_medium='uploads/recipe/a_medium.jpg',
+            image_webp='uploads/recipe/a_webp.webp',
+        )
+        self.queryset = Recipe.objects.filter(user=self.user).order_by('-id')
+
+    def assertRendersLike(self, serializer_data, reader, queryset):
+        rows = list(reader.values(queryset))
+        self.assertEqual(
+            JSONRenderer().render(reader.render(rows)),
+            JSONRenderer().render(serializer_data)
+        )
+
+    def _instances(self):
+        return self.queryset.prefetch_related(
+            Prefetch('tags', queryset=Tag.objects.order_by('id')),
+            Prefetch('ingredients',
+                     queryset=Ingredient.objects.order_by('id')),
+        )
+
+    def test_list_identical(self):
+        """
+        Test the list representation
+        :return:
+        """
+        serializer = RecipeSerializer(self._instances(), many=True)
+
+        self.assertRendersLike(
+            serializer.data, RecipeReader(RecipeSerializer), self.queryset
+        )
+
+    def test_sparse_expanded_list_identical(self):
+        """
+        Test the list representation with fields and expand
+        :return:
+        """
+        options = {'fields': ['id', 'tags', 'price'], 'expand': ['tags']}
+        serializer = RecipeSerializer(
+            self._instances(), many=True, **options
+        )
+
+        self.assertRendersLike(
+            serializer.data, RecipeReader(RecipeSerializer, **options),
+            self.queryset
+        )
+
+    def test_detail_identical(self):
+        """
+        Test the detail representation, including image variant URLs
+        :return:
+        """
+        for recipe in self._instances():
+            serializer = RecipeDetailSerializer(
+                recipe, context={'request': self.request}
+            )
+            reader = RecipeReader(
+                RecipeDetailSerializer, request=self.request
+            )
+
+            self.assertRendersLike(
+                [serializer.data], reader, self.queryset.filter(pk=recipe.pk)
+            )
@@ -1,11 +1,21 @@
+import hashlib
+import os
+import tempfile
+
+from PIL import Image, ImageCms
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
 from core.models import Recipe, Tag, Ingredient
+from core.tests.utils import QueryCountMixin
 from recipe.serializers import RecipeSerializer, RecipeDetailSerializer
 
 
@@ -23,6 +33,15 @@ def detail_url(recipe_id):
     return reverse('recipe:recipe-detail', args=[recipe_id])
 
 
+def image_upload_url(recipe_id):
+    """
+    Return URL for recipe image upload
+    :param recipe_id:
+    :return:
+    """
+    return reverse('recipe:recipe-upload-image', args=[recipe_id])
+
+
 def sample_tag(user, name='Main course'):
     """
     Create and return a sample tag
@@ -76,7 +95,7 @@ class PublicRecipeApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
-class PrivateRecipeApiTests(TestCase):
+class PrivateRecipeApiTests(QueryCountMixin, TestCase):
     """
     Test unauthenticated recipe API access
     """
@@ -206,6 +225,188 @@ class PrivateRecipeApiTests(TestCase):
         self.assertIn(ingredient1, ingredients)
         self.assertIn(ingredient2, ingredients)
 
+    def test_create_recipe_related_queries_constant(self):
+        """
+        Test that the number of queries does not grow with the ingredients
+        :return:
+        """
+        ingredients = [
+            sample_ingredient(user=self.user, name=f'Ingredient {i}')
+            for i in range(40)
+        ]
+
+        def create(count):
+            payload = {
+                'title': 'Big stew',
+                'ingredients': [i.id for i in ingredients[:count]],
+                'tags': [],
+                'time_minutes': 90,
+                'price': '12.00'
+            }
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.client.post(RECIPES_URL, payload, format='json')
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(create(1), create(40))
+
+    def test_create_recipe_with_names(self):
+        """
+        Test creating a recipe with tags and ingredients given by name,
+        reusing existing ones and creating the others
+        :return:
+        """
+        vegan = sample_tag(user=self.user, name='Vegan')
+        ginger = sample_ingredient(user=self.user, name='Ginger')
+        other = get_user_model().objects.create_user(
+            email='othernames@test.com',
+            password='testpass'
+        )
+        sample_ingredient(user=other, name='Tofu')
+        payload = {
+            'title': 'Ginger tofu',
+            'tags': ['Vegan', 'Quick', vegan.id, 'Quick'],
+            'ingredients': [ginger.id, ' Tofu ', 'Lime'],
+            'time_minutes': 15,
+            'price': '6.00'
+        }
+
+        res = self.client.post(RECIPES_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=res.data['id'])
+        self.assertEqual(
+            sorted(t.name for t in recipe.tags.all()), ['Quick', 'Vegan']
+        )
+        self.assertIn(vegan, recipe.tags.all())
+        self.assertEqual(
+            sorted(i.name for i in recipe.ingredients.all()),
+            ['Ginger', 'Lime', 'Tofu']
+        )
+        self.assertTrue(all(
+            i.user == self.user for i in recipe.ingredients.all()
+        ))
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+
+    def test_create_recipe_new_names_queries_constant(self):
+        """
+        Test that new names are created with a constant number of queries
+        :return:
+        """
+        def create(count):
+            payload = {
+                'title': 'Big stew',
+                'ingredients': [f'Ingredient {count} {i}'
+                                for i in range(count)],
+                'tags': [f'Tag {count} {i}' for i in range(count)],
+                'time_minutes': 90,
+                'price': '12.00'
+            }
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.client.post(RECIPES_URL, payload, format='json')
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(create(1), create(30))
+        self.assertEqual(Ingredient.objects.filter(user=self.user).count(),
+                         31)
+
+    def test_create_recipe_digit_strings(self):
+        """
+        Test that strings of digits are ids when such an object exists and
+        names otherwise
+        :return:
+        """
+        tag = sample_tag(user=self.user, name='Vegan')
+        other = get_user_model().objects.create_user(
+            email='otherdigits@test.com',
+            password='testpass'
+        )
+        foreign = sample_tag(user=other, name='Theirs')
+        payload = {
+            'title': 'Party food',
+            'tags': [str(tag.id), str(foreign.id), '2024'],
+            'ingredients': [],
+            'time_minutes': 15,
+            'price': '6.00'
+        }
+
+        res = self.client.post(RECIPES_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=res.data['id'])
+        self.assertEqual(sorted(t.name for t in recipe.tags.all()),
+                         sorted(['Vegan', str(foreign.id), '2024']))
+        self.assertEqual(Tag.objects.filter(name='Vegan').count(), 1)
+
+        payload['tags'] = [str(tag.id)]
+        res = self.client.post(RECIPES_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=res.data['id'])
+        self.assertEqual(list(recipe.tags.all()), [tag])
+
+    def test_update_recipe_with_names(self):
+        """
+        Test replacing the tags of a recipe by name
+        :return:
+        """
+        recipe = sample_recipe(user=self.user)
+        recipe.tags.add(sample_tag(user=self.user))
+
+        res = self.client.patch(
+            detail_url(recipe.id), {'tags': ['Spicy']}, format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([t.name for t in recipe.tags.all()], ['Spicy'])
+
+    def test_create_recipe_invalid_name_rejected(self):
+        """
+        Test that blank and too long names are rejected without creating
+        anything
+        :return:
+        """
+        for name in ('  ', 'x' * 256):
+            payload = {
+                'title': 'Nameless',
+                'tags': ['Fine', name],
+                'ingredients': [],
+                'time_minutes': 5,
+                'price': '1.00'
+            }
+            res = self.client.post(RECIPES_URL, payload, format='json')
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('tags', res.data)
+        self.assertFalse(Tag.objects.exists())
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_create_recipe_foreign_ids_rejected(self):
+        """
+        Test that ids of other users' objects are all reported
+        :return:
+        """
+        user2 = get_user_model().objects.create_user(
+            email="othertestprivaterecipe@test.com",
+            password="testpass"
+        )
+        own = sample_tag(user=self.user, name='Own')
+        foreign = sample_tag(user=user2, name='Foreign')
+        payload = {
+            'title': 'Mixed tags',
+            'tags': [own.id, foreign.id, 9999],
+            'ingredients': [],
+            'time_minutes': 10,
+            'price': '2.00'
+        }
+
+        res = self.client.post(RECIPES_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(f'{foreign.id}, 9999', res.data['tags'][0])
+        self.assertFalse(Recipe.objects.filter(title='Mixed tags').exists())
+
     def test_partial_update_recipe(self):
         """Test updating a recipe with patch"""
         recipe = sample_recipe(user=self.user)
@@ -299,3 +500,309 @@ class PrivateRecipeApiTests(TestCase):
         self.assertIn(serializer1.data, res.data)
         self.assertIn(serializer2.data, res.data)
         self.assertNotIn(serializer3.data, res.data)
+
+    def test_list_recipes_query_count(self):
+        """
+        Test that listing recipes runs a fixed number of queries
+        :return:
+        """
+        for i in range(5):
+            recipe = sample_recipe(user=self.user, title=f'Recipe {i}')
+            recipe.tags.add(sample_tag(user=self.user, name=f'Tag {i}'))
+            recipe.ingredients.add(
+                sample_ingredient(user=self.user, name=f'Ingredient {i}')
+            )
+
+        res = self.assertEndpointQueries(3, RECIPES_URL)
+
+        self.assertEqual(len(res.data), 5)
+
+    def test_view_recipe_detail_query_count(self):
+        """
+        Test that viewing a recipe detail runs a fixed number of queries
+        :return:
+        """
+        recipe = sample_recipe(user=self.user)
+        for i in range(5):
+            recipe.tags.add(sample_tag(user=self.user, name=f'Tag {i}'))
+            recipe.ingredients.add(
+                sample_ingredient(user=self.user, name=f'Ingredient {i}')
+            )
+
+        res = self.assertEndpointQueries(3, detail_url(recipe.id))
+
+        self.assertEqual(len(res.data['tags']), 5)
+        self.assertEqual(len(res.data['ingredients']), 5)
+
+    def test_filter_recipes_by_tags_distinct(self):
+        """
+        Test that a recipe matching several tags is returned once
+        :return:
+        """
+        recipe = sample_recipe(user=self.user, title='Vegan curry')
+        tag1 = sample_tag(user=self.user, name='Vegan')
+        tag2 = sample_tag(user=self.user, name='Curry')
+        recipe.tags.add(tag1, tag2)
+
+        res = self.client.get(RECIPES_URL, {'tags': f'{tag1.id},{tag2.id}'})
+
+        self.assertEqual(len(res.data), 1)
+
+    def test_filter_recipes_match_all(self):
+        """
+        Test returning recipes having all of the given ingredients
+        :return:
+        """
+        recipe1 = sample_recipe(user=self.user, title='Cheese omelette')
+        recipe2 = sample_recipe(user=self.user, title='Boiled eggs')
+        eggs = sample_ingredient(user=self.user, name='Eggs')
+        cheese = sample_ingredient(user=self.user, name='Cheese')
+        recipe1.ingredients.add(eggs, cheese)
+        recipe2.ingredients.add(eggs)
+
+        res = self.client.get(
+            RECIPES_URL,
+            {'ingredients': f'{eggs.id},{cheese.id}', 'match': 'all'}
+        )
+
+        self.assertEqual([r['id'] for r in res.data], [recipe1.id])
+
+    def test_filter_recipes_by_time_and_price(self):
+        """
+        Test range filtering recipes by time and price
+        :return:
+        """
+        sample_recipe(user=self.user, title='Quick cheap', time_minutes=10,
+                      price=4.00)
+        sample_recipe(user=self.user, title='Slow cheap', time_minutes=90,
+                      price=4.00)
+        sample_recipe(user=self.user, title='Quick pricey', time_minutes=10,
+                      price=40.00)
+
+        res = self.client.get(
+            RECIPES_URL, {'max_time': 30, 'max_price': '10.00'}
+        )
+
+        self.assertEqual([r['title'] for r in res.data], ['Quick cheap'])
+
+    def test_order_recipes(self):
+        """
+        Test ordering recipes by price then time
+        :return:
+        """
+        sample_recipe(user=self.user, title='B', time_minutes=20, price=5.00)
+        sample_recipe(user=self.user, title='A', time_minutes=10, price=5.00)
+        sample_recipe(user=self.user, title='C', time_minutes=5, price=9.00)
+
+        res = self.client.get(RECIPES_URL, {'ordering': '-price,time_minutes'})
+
+        self.assertEqual([r['title'] for r in res.data], ['C', 'A', 'B'])
+
+    def test_invalid_range_and_ordering_rejected(self):
+        """
+        Test that bad range values and ordering fields return 400
+        :return:
+        """
+        for params in ({'min_price': 'cheap'}, {'max_time': 'nan'},
+                       {'ordering': 'user'}):
+            res = self.client.get(RECIPES_URL, params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_range_filters_use_composite_indexes(self):
+        """
+        Test that the range filters are planned on the (user, field) indexes
+        :return:
+        """
+        indexes = {
+            tuple(index.fields): index.name
+            for index in Recipe._meta.indexes
+        }
+        recipes = Recipe.objects.filter(user=self.user)
+
+        plan = recipes.filter(time_minutes__lte=30).values_list(
+            'time_minutes').explain()
+        self.assertIn(indexes[('user', 'time_minutes')], plan)
+
+        plan = recipes.filter(price__lte=10).values_list('price').explain()
+        self.assertIn(indexes[('user', 'price')], plan)
+
+    def test_list_recipes_sparse_fields(self):
+        """
+        Test that ?fields= limits the rendered fields and the queries
+        :return:
+        """
+        recipe = sample_recipe(user=self.user)
+        recipe.tags.add(sample_tag(user=self.user))
+
+        res = self.assertEndpointQueries(
+            1, RECIPES_URL, {'fields': 'id,title'}
+        )
+
+        self.assertEqual(res.data, [{'id': recipe.id, 'title': recipe.title}])
+
+    def test_list_recipes_expand_tags(self):
+        """
+        Test that ?expand=tags nests tag objects with one extra query
+        :return:
+        """
+        recipe = sample_recipe(user=self.user)
+        tag = sample_tag(user=self.user)
+        recipe.tags.add(tag)
+
+        res = self.assertEndpointQueries(
+            2, RECIPES_URL, {'fields': 'id,tags', 'expand': 'tags'}
+        )
+
+        self.assertEqual(
+            res.data[0]['tags'], [{'id': tag.id, 'name': tag.name}]
+        )
+
+    def test_invalid_fields_and_expand_rejected(self):
+        """
+        Test that unknown fields or relations return 400
+        :return:
+        """
+        for params in ({'fields': 'id,user'}, {'expand': 'image'}):
+            res = self.client.get(RECIPES_URL, params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(RECIPE_IMAGE_ASYNC=False, MEDIA_ROOT=tempfile.mkdtemp())
+class RecipeImageUploadTests(TestCase):
+    """
+    Test uploading recipe images and generating their variants
+    """
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="testimageupload@test.com",
+            password="testpass"
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = sample_recipe(user=self.user)
+
+    def tearDown(self):
+        self.recipe.image.delete()
+
+    def _upload(self, **save_kwargs):
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+            img = Image.new('RGB', (1200, 900))
+            img.save(ntf, format='JPEG', **save_kwargs)
+            ntf.seek(0)
+            return self.client.post(
+                image_upload_url(self.recipe.id),
+                {'image': ntf},
+                format='multipart'
+            )
+
+    def test_upload_image_to_recipe(self):
+        """
+        Test uploading an image generates its resized variants
+        :return:
+        """
+        res = self._upload()
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('image', res.data)
+        self.assertTrue(os.path.exists(self.recipe.image.path))
+
+        with Image.open(self.recipe.image_thumb.path) as thumb:
+            self.assertEqual(thumb.size, (200, 150))
+        with Image.open(self.recipe.image_webp.path) as webp:
+            self.assertEqual(webp.format, 'WEBP')
+
+        res = self.client.get(detail_url(self.recipe.id))
+        self.assertEqual(
+            set(res.data['image_variants']), {'thumb', 'medium', 'webp'}
+        )
+
+    def test_upload_image_strips_exif(self):
+        """
+        Test that the worker stores the original without its EXIF data
+        under its own hash, and removes the upload
+        :return:
+        """
+        exif = Image.Exif()
+        exif[0x010e] = 'Taken at home'
+        icc_profile = ImageCms.ImageCmsProfile(
+            ImageCms.createProfile('sRGB')
+        ).tobytes()
+        res = self._upload(exif=exif.tobytes(), icc_profile=icc_profile)
+
+        self.recipe.refresh_from_db()
+        self.assertIn('/uploads/recipe/incoming/', res.data['image'])
+        self.assertFalse(os.listdir(os.path.join(
+            os.path.dirname(self.recipe.image.path), 'incoming'
+        )))
+        for field in ('image', 'image_thumb', 'image_medium'):
+            with Image.open(getattr(self.recipe, field).path) as img:
+                self.assertNotIn('exif', img.info)
+        with Image.open(self.recipe.image.path) as img:
+            self.assertEqual(img.info['icc_profile'], icc_profile)
+        with open(self.recipe.image.path, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        self.assertEqual(self.recipe.image.name,
+                         f'uploads/recipe/{digest}.jpg')
+        self.assertEqual(self.recipe.image_thumb.name,
+                         f'uploads/recipe/{digest}_thumb.jpg')
+
+    def test_upload_image_bad_request(self):
+        """
+        Test uploading an invalid image
+        :return:
+        """
+        res = self.client.post(
+            image_upload_url(self.recipe.id),
+            {'image': 'notimage'},
+            format='multipart'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_upload_image_stored_by_content_hash(self):
+        """
+        Test that identical uploads are stored once under their hash
+        :return:
+        """
+        other = sample_recipe(user=self.user, title='Other recipe')
+        self._upload()
+        self.recipe, first = other, self.recipe
+        self._upload()
+
+        first.refresh_from_db()
+        other.refresh_from_db()
+        with open(first.image.path, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        self.assertEqual(first.image.name, f'uploads/recipe/{digest}.jpg')
+        self.assertEqual(first.image.name, other.image.name)
+
+    def test_upload_non_image_rejected(self):
+        """
+        Test that non-image content is rejected from its first bytes
+        :return:
+        """
+        upload = SimpleUploadedFile('image.jpg', b'#!/bin/sh\necho hi\n')
+        res = self.client.post(
+            image_upload_url(self.recipe.id),
+            {'image': upload},
+            format='multipart'
+        )
+
+        self.assertEqual(
+            res.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+        )
+
+    @override_settings(RECIPE_IMAGE_MAX_UPLOAD_SIZE=1024)
+    def test_upload_oversize_rejected(self):
+        """
+        Test that uploads above the size limit are rejected
+        :return:
+        """
+        res = self._upload()
+
+        self.assertEqual(
+            res.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+        )
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
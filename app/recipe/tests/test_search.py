@@ -0,0 +1,128 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+class RecipeSearchTests(TestCase):
+    """
+    Test searching recipes by title, tag and ingredient names
+    """
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="testsearch@test.com",
+            password="testpass"
+        )
+        self.client.force_authenticate(self.user)
+
+    def _recipe(self, title):
+        return Recipe.objects.create(
+            user=self.user, title=title, time_minutes=10, price=5.00
+        )
+
+    def _search(self, q):
+        res = self.client.get(RECIPES_URL, {'q': q})
+        return [r['title'] for r in res.data]
+
+    def test_search_title_ranked_first(self):
+        """
+        Test that title matches rank above tag or ingredient matches
+        :return:
+        """
+        self._recipe('Lentil soup')
+        salad = self._recipe('Green salad')
+        salad.ingredients.add(
+            Ingredient.objects.create(user=self.user, name='Lentil')
+        )
+        self._recipe('Pancakes')
+
+        self.assertEqual(
+            self._search('lentil'), ['Lentil soup', 'Green salad']
+        )
+
+    def test_search_updated_on_tag_rename_and_delete(self):
+        """
+        Test that tag renames and deletions reach the search documents
+        :return:
+        """
+        recipe = self._recipe('Chili')
+        tag = Tag.objects.create(user=self.user, name='Spicy')
+        recipe.tags.add(tag)
+        self.assertEqual(self._search('spicy'), ['Chili'])
+
+        tag.name = 'Hot'
+        tag.save()
+        self.assertEqual(self._search('spicy'), [])
+        self.assertEqual(self._search('hot'), ['Chili'])
+
+        tag.delete()
+        self.assertEqual(self._search('hot'), [])
+
+    def test_search_documents_set_based(self):
+        """
+        Test that documents hold the title and the related names, and that
+        a rename updates them with a query count independent of the
+        number of recipes
+        :return:
+        """
+        recipe = self._recipe('Chili')
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Spicy'))
+        recipe.ingredients.add(
+            Ingredient.objects.create(user=self.user, name='Beans')
+        )
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.search_document, 'Chili Spicy Beans')
+
+        def rename(count):
+            tag = Tag.objects.create(user=self.user, name=f'Tag {count}')
+            tag.recipe_set.add(*[self._recipe('Stew') for _ in range(count)])
+            tag.name = f'Renamed {count}'
+            with CaptureQueriesContext(connection) as ctx:
+                tag.save()
+            return len(ctx.captured_queries)
+
+        self.assertEqual(rename(2), rename(20))
+        self.assertEqual(len(self._search('renamed')), 22)
+
+    def test_search_updated_on_relation_removed(self):
+        """
+        Test that removing an ingredient from a recipe updates its document
+        :return:
+        """
+        recipe = self._recipe('Omelette')
+        cheese = Ingredient.objects.create(user=self.user, name='Cheese')
+        recipe.ingredients.add(cheese)
+        cheese.recipe_set.clear()
+
+        self.assertEqual(self._search('cheese'), [])
+
+    def test_search_all_terms_required(self):
+        """
+        Test that every search term has to match
+        :return:
+        """
+        self._recipe('Tomato soup')
+        self._recipe('Tomato salad')
+
+        self.assertEqual(self._search('tomato soup'), ['Tomato soup'])
+
+    def test_search_bulk_created(self):
+        """
+        Test that recipes created in bulk are searchable
+        :return:
+        """
+        self.client.post(reverse('recipe:recipe-bulk'), [{
+            'title': 'Banana bread', 'time_minutes': 60, 'price': '3.00',
+            'tags': [], 'ingredients': [],
+        }], format='json')
+
+        self.assertEqual(self._search('banana'), ['Banana bread'])
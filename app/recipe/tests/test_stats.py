@@ -0,0 +1,359 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, RecipeStats, Tag
+from recipe import cache, stats
+
+
+STATS_URL = reverse('recipe:stats')
+RECIPES_BULK_URL = reverse('recipe:recipe-bulk')
+
+
+def sample_recipe(user, **params):
+    """
+    Create and return a sample recipe
+    :param user:
+    :param params:
+    :return:
+    """
+    defaults = {
+        'title': 'Sample recipe',
+        'time_minutes': 10,
+        'price': '5.00',
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class RecipeStatsTests(TestCase):
+    """
+    Test the incrementally maintained recipe stats
+    """
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='stats@test.com',
+            password='testpass'
+        )
+
+    def assertStatsRebuilt(self):
+        """
+        Assert that the maintained aggregates match a full rebuild
+        :return:
+        """
+        current = stats.get_stats(self.user)
+        stats.rebuild([self.user.id])
+        self.assertEqual(current, stats.get_stats(self.user))
+
+    def test_create_recipes(self):
+        """
+        Test that created recipes are added to the stats
+        :return:
+        """
+        sample_recipe(self.user, time_minutes=10, price='5.00')
+        sample_recipe(self.user, time_minutes=30, price='2.50')
+
+        data = stats.get_stats(self.user)
+        self.assertEqual(data['recipe_count'], 2)
+        self.assertEqual(data['time_minutes'],
+                         {'avg': 20.0, 'min': 10, 'max': 30})
+        self.assertEqual(data['price'],
+                         {'avg': '3.75', 'min': '2.50', 'max': '5.00'})
+        self.assertStatsRebuilt()
+
+    def test_update_recipe(self):
+        """
+        Test that a changed time or price updates the stats
+        :return:
+        """
+        recipe = sample_recipe(self.user, time_minutes=10, price='5.00')
+        sample_recipe(self.user, time_minutes=20, price='3.00')
+
+        recipe.time_minutes = 40
+        recipe.price = '1.00'
+        recipe.save()
+
+        data = stats.get_stats(self.user)
+        self.assertEqual(data['time_minutes'],
+                         {'avg': 30.0, 'min': 20, 'max': 40})
+        self.assertEqual(data['price'],
+                         {'avg': '2.00', 'min': '1.00', 'max': '3.00'})
+        self.assertStatsRebuilt()
+
+    def test_delete_recipe(self):
+        """
+        Test that deleting recipes removes them and their tag usage
+        :return:
+        """
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe = sample_recipe(self.user, time_minutes=5, price='1.00')
+        recipe.tags.add(tag)
+        sample_recipe(self.user, time_minutes=15, price='9.00')
+
+        recipe.delete()
+
+        data = stats.get_stats(self.user)
+        self.assertEqual(data['recipe_count'], 1)
+        self.assertEqual(data['time_minutes'],
+                         {'avg': 15.0, 'min': 15, 'max': 15})
+        self.assertEqual(data['top_tags'], [])
+        tag.refresh_from_db()
+        self.assertEqual(tag.recipe_count, 0)
+        self.assertStatsRebuilt()
+
+    def test_relation_counts(self):
+        """
+        Test that tag and ingredient counts follow m2m changes made from
+        either side
+        :return:
+        """
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+        quick = Tag.objects.create(user=self.user, name='Quick')
+        salt = Ingredient.objects.create(user=self.user, name='Salt')
+        first = sample_recipe(self.user)
+        second = sample_recipe(self.user)
+        third = sample_recipe(self.user)
+
+        first.tags.add(vegan, quick)
+        second.tags.add(vegan)
+        quick.recipe_set.add(second, third)
+        salt.recipe_set.add(first, second, third)
+        first.tags.remove(quick)
+        third.ingredients.clear()
+
+        data = stats.get_stats(self.user)
+        self.assertEqual(
+            [(t['name'], t['recipe_count']) for t in data['top_tags']],
+            [('Quick', 2), ('Vegan', 2)]
+        )
+        self.assertEqual(
+            [(i['name'], i['recipe_count']) for i in data['top_ingredients']],
+            [('Salt', 2)]
+        )
+
+        vegan.recipe_set.clear()
+        vegan.refresh_from_db()
+        self.assertEqual(vegan.recipe_count, 0)
+        self.assertStatsRebuilt()
+
+    def test_remove_unrelated(self):
+        """
+        Test that removing tags a recipe does not have leaves the counts
+        alone, from either side of the relation
+        :return:
+        """
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+        quick = Tag.objects.create(user=self.user, name='Quick')
+        first = sample_recipe(self.user)
+        second = sample_recipe(self.user)
+        first.tags.add(vegan)
+
+        first.tags.remove(vegan, quick)
+        second.tags.remove(vegan)
+        quick.recipe_set.remove(first, second)
+
+        for tag in (vegan, quick):
+            tag.refresh_from_db()
+            self.assertEqual(tag.recipe_count, 0)
+        self.assertFalse(stats.drifted(Tag).exists())
+
+    def test_bulk_create_recipes(self):
+        """
+        Test that recipes saved through the bulk endpoint are accounted
+        :return:
+        """
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        client = APIClient()
+        client.force_authenticate(self.user)
+        payload = [{
+            'title': f'Recipe {i}',
+            'time_minutes': 10 * (i + 1),
+            'price': '5.00',
+            'tags': [tag.id],
+            'ingredients': [],
+        } for i in range(3)]
+
+        res = client.post(RECIPES_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        data = stats.get_stats(self.user)
+        self.assertEqual(data['recipe_count'], 3)
+        self.assertEqual(data['time_minutes']['max'], 30)
+        self.assertEqual(data['top_tags'][0]['recipe_count'], 3)
+
+    def test_bulk_delete_recipes(self):
+        """
+        Test that recipes deleted through the bulk endpoint are accounted
+        with a number of queries independent of the batch size
+        :return:
+        """
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        def delete(count):
+            recipes = [sample_recipe(self.user, time_minutes=i + 1)
+                       for i in range(count)]
+            tag.recipe_set.add(*recipes)
+            with CaptureQueriesContext(connection) as ctx:
+                res = client.delete(RECIPES_BULK_URL,
+                                    [r.id for r in recipes], format='json')
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            return len(ctx.captured_queries)
+
+        sample_recipe(self.user, time_minutes=90, price='2.00')
+        self.assertEqual(delete(2), delete(20))
+
+        data = stats.get_stats(self.user)
+        self.assertEqual(data['recipe_count'], 1)
+        self.assertEqual(data['time_minutes'],
+                         {'avg': 90.0, 'min': 90, 'max': 90})
+        tag.refresh_from_db()
+        self.assertEqual(tag.recipe_count, 0)
+        self.assertStatsRebuilt()
+
+    def test_delete_user(self):
+        """
+        Test that deleting a user with recipes deletes their stats
+        :return:
+        """
+        sample_recipe(self.user)
+
+        self.user.delete()
+
+        self.assertFalse(RecipeStats.objects.exists())
+
+    def test_rebuild_command(self):
+        """
+        Test that the rebuild command repairs drifted aggregates
+        :return:
+        """
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        sample_recipe(self.user).tags.add(tag)
+        RecipeStats.objects.update(recipe_count=7, price_sum=0)
+        Tag.objects.update(recipe_count=3)
+        names = ('recipe', 'tag', 'ingredient')
+        versions = [cache.get_version(name, self.user.id) for name in names]
+        out = StringIO()
+
+        call_command('rebuild_recipe_stats', user=self.user.email,
+                     stdout=out)
+
+        self.assertIn('1 users', out.getvalue())
+        for name, version in zip(names, versions):
+            self.assertNotEqual(cache.get_version(name, self.user.id),
+                                version)
+        data = stats.get_stats(self.user)
+        self.assertEqual(data['recipe_count'], 1)
+        self.assertEqual(data['price']['avg'], '5.00')
+        self.assertEqual(data['top_tags'][0]['recipe_count'], 1)
+
+    def test_reconcile_command(self):
+        """
+        Test that the reconcile command only fixes drifted counts
+        :return:
+        """
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+        quick = Tag.objects.create(user=self.user, name='Quick')
+        recipe = sample_recipe(self.user)
+        recipe.tags.add(vegan, quick)
+        Tag.objects.filter(pk=vegan.pk).update(recipe_count=5)
+        out = StringIO()
+
+        call_command('reconcile_recipe_counts', dry_run=True, stdout=out)
+        vegan.refresh_from_db()
+        self.assertEqual(vegan.recipe_count, 5)
+        self.assertIn(f'tags {vegan.id}: recipe_count 5, actually 1',
+                      out.getvalue())
+
+        call_command('reconcile_recipe_counts', stdout=out)
+        vegan.refresh_from_db()
+        self.assertEqual(vegan.recipe_count, 1)
+        self.assertIn('1 tags drifted, fixed', out.getvalue())
+        self.assertFalse(stats.drifted(Tag).exists())
+
+
+class RecipeStatsApiTests(TestCase):
+    """
+    Test the recipe stats endpoint
+    """
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='statsapi@test.com',
+            password='testpass'
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_login_required(self):
+        """
+        Test that authentication is required
+        :return:
+        """
+        res = APIClient().get(STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_empty_stats(self):
+        """
+        Test the stats of a user without recipes
+        :return:
+        """
+        res = self.client.get(STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json(), {
+            'recipe_count': 0,
+            'time_minutes': {'avg': None, 'min': None, 'max': None},
+            'price': {'avg': None, 'min': None, 'max': None},
+            'top_tags': [],
+            'top_ingredients': [],
+        })
+
+    def test_stats_limited_to_user(self):
+        """
+        Test that only the recipes of the authenticated user are counted
+        :return:
+        """
+        other = get_user_model().objects.create_user(
+            email='other@test.com',
+            password='testpass'
+        )
+        sample_recipe(other, time_minutes=100)
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        sample_recipe(self.user, time_minutes=20, price='4.00').tags.add(tag)
+
+        res = self.client.get(STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json()['recipe_count'], 1)
+        self.assertEqual(res.json()['time_minutes']['max'], 20)
+        self.assertEqual(res.json()['top_tags'], [
+            {'id': tag.id, 'name': 'Vegan', 'recipe_count': 1}
+        ])
+
+    def test_stats_etag_changes_with_recipes(self):
+        """
+        Test that the stats are revalidated after a recipe change
+        :return:
+        """
+        res = self.client.get(STATS_URL)
+        etag = res['ETag']
+
+        self.assertEqual(
+            self.client.get(STATS_URL, HTTP_IF_NONE_MATCH=etag).status_code,
+            status.HTTP_304_NOT_MODIFIED
+        )
+        sample_recipe(self.user)
+        res = self.client.get(STATS_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json()['recipe_count'], 1)
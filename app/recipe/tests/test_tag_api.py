@@ -125,4 +125,81 @@ class PrivateTagApiTests(TestCase):
         serializer2 = TagSerializer(tag2)
 
         self.assertIn(serializer1.data, res.data)
-        self.assertNotIn(serializer2.data, res.data)
\ No newline at end of file
+        self.assertNotIn(serializer2.data, res.data)
+
+    def test_retrieve_tags_assigned_unique(self):
+        """
+        Test filtering tags by assigned returns unique items
+        :return:
+        """
+        tag = Tag.objects.create(user=self.user, name='Breakfast')
+        Tag.objects.create(user=self.user, name='Lunch')
+        recipe1 = Recipe.objects.create(
+            title='Pancakes',
+            time_minutes=5,
+            price=3.00,
+            user=self.user
+        )
+        recipe1.tags.add(tag)
+        recipe2 = Recipe.objects.create(
+            title='Porridge',
+            time_minutes=3,
+            price=2.00,
+            user=self.user
+        )
+        recipe2.tags.add(tag)
+
+        res = self.client.get(TAGS_URL, {'assigned_only': 1})
+
+        self.assertEqual(len(res.data), 1)
+
+    def test_order_tags_by_recipe_count(self):
+        """
+        Test sorting tags by popularity with their recipe counts
+        :return:
+        """
+        popular = Tag.objects.create(user=self.user, name='Dinner')
+        rare = Tag.objects.create(user=self.user, name='Brunch')
+        unused = Tag.objects.create(user=self.user, name='Snack')
+        for title in ('Stew', 'Curry'):
+            recipe = Recipe.objects.create(
+                title=title,
+                time_minutes=30,
+                price=8.00,
+                user=self.user
+            )
+            recipe.tags.add(popular)
+        recipe.tags.add(rare)
+
+        res = self.client.get(
+            TAGS_URL, {'ordering': '-recipe_count', 'recipe_count': 1}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [
+            {'id': popular.id, 'name': 'Dinner', 'recipe_count': 2},
+            {'id': rare.id, 'name': 'Brunch', 'recipe_count': 1},
+            {'id': unused.id, 'name': 'Snack', 'recipe_count': 0},
+        ])
+
+    def test_invalid_ordering_rejected(self):
+        """
+        Test that unknown ordering fields return 400
+        :return:
+        """
+        res = self.client.get(TAGS_URL, {'ordering': 'user'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_create_duplicate_tag_rejected(self):
+        """
+        Test that a user cannot create two tags with the same name
+        :return:
+        """
+        Tag.objects.create(user=self.user, name='Vegan')
+
+        res = self.client.post(TAGS_URL, {'name': 'Vegan'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('name', res.data)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 1)
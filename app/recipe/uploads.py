@@ -0,0 +1,116 @@
+import hashlib
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions, status
+
+
+# Leading bytes of the accepted image formats -> file extension
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+)
+SIGNATURE_LENGTH = 12
+
+
+class RequestEntityTooLarge(exceptions.APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = _('Uploaded image is too large.')
+    default_code = 'too_large'
+
+
+class NotAnImage(exceptions.UnsupportedMediaType):
+    default_detail = _('Uploaded file is not a supported image.')
+
+    def __init__(self, media_type=None):
+        super().__init__(media_type, detail=self.default_detail)
+
+
+def detect_image_extension(header):
+    """
+    Return the extension of the image format the header starts with, or
+    None if it is not a supported image
+    :param header:
+    :return:
+    """
+    for signature, ext in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return ext
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+
+class HashedTemporaryUploadedFile(TemporaryUploadedFile):
+    """
+    Upload on disk carrying the SHA-256 of its content and its detected
+    image extension
+    """
+    sha256 = None
+    image_extension = None
+
+
+class StreamingImageUploadHandler(FileUploadHandler):
+    """
+    Stream uploaded images to disk in fixed-size chunks, hashing them on
+    the fly and rejecting oversize or non-image content as soon as it is
+    seen, before the rest of the body is read
+    """
+    chunk_size = settings.RECIPE_IMAGE_UPLOAD_CHUNK_SIZE
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.max_size = settings.RECIPE_IMAGE_MAX_UPLOAD_SIZE
+
+    def handle_raw_input(self, input_data, META, content_length, boundary,
+                         encoding=None):
+        if content_length > self.max_size:
+            raise RequestEntityTooLarge()
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.file = HashedTemporaryUploadedFile(
+            self.file_name, self.content_type, 0, self.charset,
+            self.content_type_extra
+        )
+        self.hash = hashlib.sha256()
+        self.header = b''
+        self.size = 0
+
+    def _abort(self, exc):
+        self.file.close()
+        raise exc
+
+    def receive_data_chunk(self, raw_data, start):
+        self.size += len(raw_data)
+        if self.size > self.max_size:
+            self._abort(RequestEntityTooLarge())
+
+        if len(self.header) < SIGNATURE_LENGTH:
+            self.header += raw_data[:SIGNATURE_LENGTH]
+            if len(self.header) >= SIGNATURE_LENGTH:
+                self._check_header()
+
+        self.hash.update(raw_data)
+        self.file.write(raw_data)
+
+    def _check_header(self):
+        self.file.image_extension = detect_image_extension(self.header)
+        if self.file.image_extension is None:
+            self._abort(NotAnImage(self.content_type))
+
+    def file_complete(self, file_size):
+        if len(self.header) < SIGNATURE_LENGTH:
+            self._check_header()
+        self.file.seek(0)
+        self.file.size = file_size
+        self.file.sha256 = self.hash.hexdigest()
+        return self.file
+
+    def upload_interrupted(self):
+        if hasattr(self, 'file'):
+            self.file.close()
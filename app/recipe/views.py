@@ -1,30 +1,252 @@
-from django.shortcuts import render
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils.translation import gettext_lazy as _
 from rest_framework import viewsets, mixins, status
-from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import ValidationError
+from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from recipe import serializers
+from rest_framework.views import APIView
+from core import metrics
+from core.authentication import CachedTokenAuthentication
+from recipe import cache, images, search, serializers, signals, stats
+from recipe.uploads import StreamingImageUploadHandler
+from recipe.conditional import conditional_get
+from recipe.readers import RecipeReader
 from core.models import Tag, Ingredient, Recipe
 
 
-class BaseRecipeAttrViewSet(viewsets.GenericViewSet, mixins.ListModelMixin, mixins.CreateModelMixin):
+def related_exists(field_name, outer, **lookups):
+    """
+    Return an EXISTS subquery over the through table of Recipe.<field_name>
+    with the given side joined to the outer query's pk
+    :param field_name: 'tags' or 'ingredients'
+    :param outer: 'recipe' or 'related', the side matching the outer pk
+    :param lookups: extra filters on the through table
+    :return:
+    """
+    field = Recipe._meta.get_field(field_name)
+    column = field.m2m_field_name() if outer == 'recipe' \
+        else field.m2m_reverse_field_name()
+    return Exists(field.remote_field.through.objects.filter(
+        **{column: OuterRef('pk')}, **lookups
+    ))
+
+
+class OrderingMixin:
+    """
+    Validate the comma separated ?ordering= query param against the
+    view's ordering_fields
+    """
+    ordering_fields = ()
+
+    def _get_ordering(self):
+        """
+        Return the order_by() terms of the ?ordering= query param
+        :return:
+        """
+        param = self.request.query_params.get('ordering')
+        if not param:
+            return []
+        terms = [term.strip() for term in param.split(',') if term.strip()]
+        invalid = [
+            term for term in terms
+            if term.lstrip('-') not in self.ordering_fields
+        ]
+        if invalid:
+            raise ValidationError({'ordering': [
+                _('Invalid ordering fields: %s.') % ', '.join(invalid)
+            ]})
+        return terms
+
+    def get_cursor_ordering(self):
+        """
+        Return the ordering of cursor pagination, the ?ordering= terms with
+        -id to break ties, or the view's cursor_ordering
+        :return:
+        """
+        terms = self._get_ordering()
+        if not terms:
+            return self.cursor_ordering
+        if not any(term.lstrip('-') == 'id' for term in terms):
+            terms.append('-id')
+        return tuple(terms)
+
+
+class BulkModelMixin:
+    """
+    Create (POST), partially update (PATCH) or delete (DELETE) many of the
+    user's objects in one request and one transaction via {prefix}/bulk/
+    """
+
+    def _bulk_items(self, request):
+        items = request.data
+        if not isinstance(items, list):
+            raise ValidationError(
+                {'non_field_errors': [_('Expected a list of items.')]}
+            )
+        limit = settings.API_MAX_BULK_SIZE
+        if len(items) > limit:
+            raise ValidationError({'non_field_errors': [
+                _('At most %d items are allowed.') % limit
+            ]})
+        return items
+
+    @action(methods=['POST', 'PATCH', 'DELETE'], detail=False,
+            url_path='bulk')
+    def bulk(self, request):
+        """
+        Apply a batch of changes, returning one result per item
+        :param request:
+        :return:
+        """
+        items = self._bulk_items(request)
+        with transaction.atomic():
+            if request.method == 'POST':
+                response = self._bulk_create(items)
+            elif request.method == 'PATCH':
+                response = self._bulk_update(items)
+            else:
+                response = self._bulk_delete(items)
+        # Batched writes bypass the model signals
+        cache.bump_version(request.user.id, *self.etag_versions)
+        return response
+
+    def _bulk_create(self, items):
+        serializer = self.get_serializer(data=items, many=True)
+        serializer.is_valid(raise_exception=True)
+        self.perform_bulk_save(serializer, user=self.request.user)
+        return Response(serializer.data, status.HTTP_201_CREATED)
+
+    def _validate_ids(self, ids):
+        """
+        Raise per-item errors unless every id is an integer, booleans
+        included in JSON are not ids
+        :param ids:
+        :return:
+        """
+        errors = [
+            {} if isinstance(pk, int) and not isinstance(pk, bool)
+            else {'id': [_('A valid integer is required.')]}
+            for pk in ids
+        ]
+        if any(errors):
+            raise ValidationError(errors)
+
+    def _bulk_update(self, items):
+        ids = [item.get('id') if isinstance(item, dict) else None
+               for item in items]
+        self._validate_ids(ids)
+        objs = self.get_queryset().in_bulk(ids)
+        missing = [{} if pk in objs else {'id': [_('Not found.')]}
+                   for pk in ids]
+        if any(missing):
+            raise ValidationError(missing)
+
+        serializer = self.get_serializer(
+            [objs[pk] for pk in ids], data=items, many=True, partial=True
+        )
+        serializer.is_valid(raise_exception=True)
+        self.perform_bulk_save(serializer)
+        return Response(serializer.data, status.HTTP_200_OK)
+
+    def perform_bulk_save(self, serializer, **kwargs):
+        """
+        Save a validated bulk serializer
+        :param serializer:
+        :param kwargs:
+        :return:
+        """
+        return serializer.save(**kwargs)
+
+    def perform_bulk_delete(self, queryset):
+        """
+        Delete the objects of a bulk request
+        :param queryset:
+        :return:
+        """
+        queryset.delete()
+
+    def _bulk_delete(self, items):
+        self._validate_ids(items)
+        queryset = self.get_queryset()
+        found = set(
+            queryset.filter(id__in=items).values_list('id', flat=True)
+        )
+        self.perform_bulk_delete(queryset.filter(id__in=found))
+        return Response(
+            [{'id': pk, 'deleted': pk in found} for pk in items],
+            status.HTTP_200_OK
+        )
+
+
+class BaseRecipeAttrViewSet(OrderingMixin, BulkModelMixin,
+                            viewsets.GenericViewSet, mixins.ListModelMixin,
+                            mixins.CreateModelMixin):
     """
     Base view set for user owned recipe attributes
     """
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    throttle_scope = 'recipe'
+    cursor_ordering = ('-name', '-id')
+    # Recipe many to many field pointing at the model
+    recipe_field = None
+    # Name of the per-user list cache, see recipe.cache
+    cache_name = None
+    # Cache versions the ETag validators are built from
+    etag_versions = ()
+    ordering_fields = ('name', 'recipe_count')
+
+    def _assigned_only(self):
+        return bool(self.request.query_params.get('assigned_only'))
 
     def get_queryset(self):
         """
         Return objects for the current authenticated user only
         :return:
         """
-        assigned_only = bool(self.request.query_params.get('assigned_only'))
-        queryset = self.queryset
-        if assigned_only:
-            queryset = queryset.filter(recipe__isnull=False)
-        return queryset.filter(user=self.request.user).order_by('-name')
+        queryset = self.queryset.filter(user=self.request.user)
+        if self._assigned_only():
+            # recipe_count is maintained by recipe.stats, no join needed
+            queryset = queryset.filter(recipe_count__gt=0)
+        ordering = self._get_ordering()
+        if ordering:
+            return queryset.order_by(*ordering, '-id')
+        return queryset.order_by('-name')
+
+    def get_serializer(self, *args, **kwargs):
+        """
+        Render recipe_count when ?recipe_count= is set
+        :return:
+        """
+        if self.request is not None and \
+                self.request.query_params.get('recipe_count'):
+            kwargs.setdefault('recipe_count', True)
+        return super().get_serializer(*args, **kwargs)
+
+    @conditional_get
+    def list(self, request, *args, **kwargs):
+        """
+        List objects, unpaginated lists are served from the per-user cache
+        :param request:
+        :return:
+        """
+        if set(request.query_params) - {'assigned_only'}:
+            return super().list(request, *args, **kwargs)
+
+        key = cache.list_cache_key(
+            self.cache_name, request.user.id, self._assigned_only()
+        )
+        with metrics.timer('serialize'):
+            data = cache.get_or_build(key, lambda: list(
+                self.get_serializer(self.get_queryset(), many=True).data
+            ), self.cache_name)
+        return Response(data)
 
     def perform_create(self, serializer):
         """
@@ -41,6 +263,9 @@ class TagViewSet(BaseRecipeAttrViewSet):
     """
     serializer_class = serializers.TagSerializer
     queryset = Tag.objects.all()
+    recipe_field = 'tags'
+    cache_name = 'tag'
+    etag_versions = ('tag',)
 
 
 class IngredientViewSet(BaseRecipeAttrViewSet):
@@ -49,16 +274,30 @@ class IngredientViewSet(BaseRecipeAttrViewSet):
     """
     serializer_class = serializers.IngredientSerializer
     queryset = Ingredient.objects.all()
+    recipe_field = 'ingredients'
+    cache_name = 'ingredient'
+    etag_versions = ('ingredient',)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(OrderingMixin, BulkModelMixin, viewsets.ModelViewSet):
     """
     Manage recipes in the database
     """
     serializer_class = serializers.RecipeSerializer
     queryset = Recipe.objects.all()
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    throttle_scope = 'recipe'
+    cursor_ordering = '-id'
+    etag_versions = ('recipe', 'tag', 'ingredient')
+    # Query param -> (lookup, conversion) of the range filters
+    range_filters = {
+        'min_time': ('time_minutes__gte', int),
+        'max_time': ('time_minutes__lte', int),
+        'min_price': ('price__gte', Decimal),
+        'max_price': ('price__lte', Decimal),
+    }
+    ordering_fields = ('id', 'title', 'time_minutes', 'price')
 
     def _params_to_ints(self, qs):
         """
@@ -79,12 +318,165 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
         if tags:
             tag_id = self._params_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tag_id)  # __:筛选
+            queryset = self._filter_related(queryset, 'tags', tag_id)
         if ingredients:
             ingredient_id = self._params_to_ints(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ingredient_id)
+            queryset = self._filter_related(
+                queryset, 'ingredients', ingredient_id
+            )
+
+        queryset = self._filter_ranges(queryset)
+        queryset = queryset.filter(user=self.request.user)
+
+        ordering = self._get_ordering()
+        q = self.request.query_params.get('q', '').strip()
+        if q:
+            queryset = search.search(queryset, q)
+            ordering = ordering or ['-rank']
+        return queryset.order_by(*ordering, '-id')
+
+    def get_cursor_ordering(self):
+        """
+        Reject search relevance ordering, which cursors cannot page through
+        :return:
+        """
+        if self.request.query_params.get('q', '').strip() and \
+                not self.request.query_params.get('ordering'):
+            raise ValidationError({'pagination': [
+                _('Cursor pagination needs an ordering with q.')
+            ]})
+        return super().get_cursor_ordering()
+
+    def _filter_ranges(self, queryset):
+        """
+        Apply the min/max time and price query params
+        :param queryset:
+        :return:
+        """
+        filters = {}
+        for param, (lookup, convert) in self.range_filters.items():
+            value = self.request.query_params.get(param)
+            if value is None:
+                continue
+            try:
+                filters[lookup] = convert(value)
+                if not Decimal(filters[lookup]).is_finite():
+                    raise ValueError(value)
+            except (ValueError, InvalidOperation):
+                raise ValidationError(
+                    {param: [_('A valid number is required.')]}
+                )
+        return queryset.filter(**filters)
+
+    def _filter_related(self, queryset, field_name, ids):
+        """
+        Keep recipes related to any (default) or, with ?match=all, all of
+        the ids through EXISTS subqueries, so no row is duplicated
+        :param queryset:
+        :param field_name:
+        :param ids:
+        :return:
+        """
+        target = Recipe._meta.get_field(field_name).m2m_reverse_field_name()
+        if self.request.query_params.get('match') == 'all':
+            conditions = {
+                f'has_{field_name}_{pk}': related_exists(
+                    field_name, 'recipe', **{f'{target}_id': pk}
+                )
+                for pk in set(ids)
+            }
+        else:
+            conditions = {
+                f'has_{field_name}': related_exists(
+                    field_name, 'recipe', **{f'{target}_id__in': ids}
+                )
+            }
+        return queryset.annotate(**conditions).filter(
+            **{name: True for name in conditions}
+        )
+
+    def _requested_fields(self):
+        """
+        Return the field names of the ?fields= query param, or None
+        :return:
+        """
+        param = self.request.query_params.get('fields')
+        if not param:
+            return None
+        fields = [name.strip() for name in param.split(',') if name.strip()]
+        allowed = self.get_serializer_class().Meta.fields
+        invalid = [name for name in fields if name not in allowed]
+        if invalid:
+            raise ValidationError({'fields': [
+                _('Invalid fields: %s.') % ', '.join(invalid)
+            ]})
+        return fields
+
+    def _requested_expand(self):
+        """
+        Return the relations the ?expand= query param asks to nest on list
+        :return:
+        """
+        param = self.request.query_params.get('expand')
+        if not param or self.action != 'list':
+            return ()
+        expand = [name.strip() for name in param.split(',') if name.strip()]
+        allowed = serializers.RecipeSerializer.expandable_fields
+        invalid = [name for name in expand if name not in allowed]
+        if invalid:
+            raise ValidationError({'expand': [
+                _('Invalid relations: %s.') % ', '.join(invalid)
+            ]})
+        return expand
+
+    def get_reader(self):
+        """
+        Return the RecipeReader rendering the current read action
+        :return:
+        """
+        return RecipeReader(
+            self.get_serializer_class(),
+            fields=self._requested_fields(),
+            expand=self._requested_expand(),
+            request=self.request,
+        )
+
+    @conditional_get
+    def list(self, request, *args, **kwargs):
+        """
+        List recipes from values() rows, see recipe.readers
+        :param request:
+        :return:
+        """
+        reader = self.get_reader()
+        # Cursor pagination reads its position from the ordering columns
+        rows = reader.values(
+            self.filter_queryset(self.get_queryset()),
+            extra=[term.lstrip('-') for term in self._get_ordering()]
+        )
 
-        return queryset.filter(user=self.request.user)
+        page = self.paginate_queryset(rows)
+        with metrics.timer('serialize'):
+            data = reader.render(list(rows) if page is None else page)
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+    @conditional_get
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Retrieve a recipe from a values() row, see recipe.readers
+        :param request:
+        :return:
+        """
+        reader = self.get_reader()
+        row = get_object_or_404(
+            reader.values(self.get_queryset()), pk=kwargs['pk']
+        )
+        self.check_object_permissions(request, row)
+        with metrics.timer('serialize'):
+            data = reader.render([row])[0]
+        return Response(data)
 
     def get_serializer_class(self):
         """
@@ -105,6 +497,30 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """
         serializer.save(user=self.request.user)
 
+    def perform_bulk_save(self, serializer, **kwargs):
+        """
+        Save recipes in bulk and index them, batched writes bypass the
+        signals that normally keep the search documents up to date
+        :param serializer:
+        :param kwargs:
+        :return:
+        """
+        recipes = super().perform_bulk_save(serializer, **kwargs)
+        search.update_search_documents([recipe.pk for recipe in recipes])
+        stats.rebuild([self.request.user.id])
+        return recipes
+
+    def perform_bulk_delete(self, queryset):
+        """
+        Delete recipes in bulk without the per-recipe stats receivers, the
+        stats of the user are rebuilt once instead
+        :param queryset:
+        :return:
+        """
+        with signals.bulk_recipe_delete():
+            super().perform_bulk_delete(queryset)
+        stats.rebuild([self.request.user.id])
+
     @action(methods=['POST'], detail=True, url_path='upload-image')  # detail: specific items
     def upload_image(self, request, pk=None):
         """
@@ -114,6 +530,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
         :return:
         """
         recipe = self.get_object()  # get object based on the id in the url
+        request.upload_handlers = [StreamingImageUploadHandler(request)]
         serializer = self.get_serializer(
             recipe,
             data=request.data
@@ -121,7 +538,8 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
         # validation pass
         if serializer.is_valid():
-            serializer.save()
+            recipe = serializer.save()
+            images.schedule_variants(recipe)
             return Response(
                 serializer.data,
                 status.HTTP_200_OK
@@ -132,3 +550,26 @@ class RecipeViewSet(viewsets.ModelViewSet):
             serializer.errors,
             status.HTTP_400_BAD_REQUEST
         )
+
+
+class RecipeStatsView(APIView):
+    """
+    Recipe statistics of the authenticated user, read from the aggregates
+    maintained by recipe.stats
+    """
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+    throttle_scope = 'recipe'
+    etag_versions = ('recipe', 'tag', 'ingredient')
+
+    @conditional_get
+    def get(self, request, *args, **kwargs):
+        """
+        Return the recipe count, the time and price average and range and
+        the most used tags and ingredients
+        :param request:
+        :return:
+        """
+        return Response(
+            stats.get_stats(request.user, settings.RECIPE_STATS_TOP_SIZE)
+        )
@@ -1,6 +1,7 @@
-from rest_framework import generics, authentication, permissions
+from rest_framework import generics, permissions
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.settings import api_settings
+from core.authentication import CachedTokenAuthentication
 from .serializers import UserSerializer, AuthTokenSerializer
 
 class CreateUserView(generics.CreateAPIView):
@@ -9,6 +10,8 @@ class CreateUserView(generics.CreateAPIView):
     """
     #用于验证和反序列化的serializer，必须设置serializer_class或使用get_serializer_class()
     serializer_class = UserSerializer
+    authentication_classes = ()
+    throttle_scope = 'create'
 
 class CreateTokenView(ObtainAuthToken):
     """
@@ -16,13 +19,17 @@ class CreateTokenView(ObtainAuthToken):
     """
     serializer_class = AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
+    authentication_classes = ()
+    # ObtainAuthToken turns throttling off
+    throttle_classes = api_settings.DEFAULT_THROTTLE_CLASSES
+    throttle_scope = 'token'
 
 class ManageUserView(generics.RetrieveUpdateAPIView):
     """
     Manage the authenticated user
     """
     serializer_class = UserSerializer
-    authentication_classes = (authentication.TokenAuthentication, )
+    authentication_classes = (CachedTokenAuthentication, )
     permission_classes = (permissions.IsAuthenticated, )
 
     def get_object(self):